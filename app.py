@@ -53,6 +53,7 @@ ingestion_stack = IngestionStack(
     error_topic=sns_topic,
     pandas_layer=lambda_layer_stack.pandas_layer,
     common_layer=lambda_layer_stack.common_layer,
+    runtime_layer=lambda_layer_stack.runtime_layer,
     env=env,
     description="Stack de ingesta para el sistema de analítica médica"
 )
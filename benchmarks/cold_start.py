@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Presupuesto de arranque en frío de las Lambdas de ingesta.
+
+Dos fuentes de medición:
+- imports: ejecuta "python -X importtime -c 'import index'" en un subproceso limpio por
+  Lambda (con la capa de runtime en el PYTHONPATH, como en /opt/python) y reporta el
+  tiempo total de imports y los imports directos de index más costosos.
+- reportes: lee las líneas REPORT de CloudWatch Logs (o de un archivo exportado) y
+  resume el "Init Duration" de los arranques en frío (p50, p95, máximo).
+
+Con --budget el script termina con código 1 si algún tiempo supera el presupuesto, de
+modo que puede usarse como verificación en CI.
+
+Uso:
+    python benchmarks/cold_start.py imports --budget file_processor=300 api_ingestion=300
+    python benchmarks/cold_start.py reports --log-group /aws/lambda/medical-analytics-file-processor --hours 24
+    python benchmarks/cold_start.py reports --file report-lines.txt --budget init=800
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNTIME_LAYER = os.path.join(ROOT_DIR, "layers", "runtime_layer", "python")
+FUNCTIONS = ("api_ingestion", "file_processor", "excel_converter")
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+INIT_DURATION = re.compile(r"Init Duration:\s+([\d.]+)\s+ms")
+
+
+def import_profile(function, runs=3):
+    """
+    Perfil de imports de lambda/{function}/index.py.
+
+    Returns:
+        dict: total_ms (mediana del proceso completo) y top (import directo de index -> ms acumulados)
+    """
+    function_dir = os.path.join(ROOT_DIR, "lambda", function)
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([function_dir, RUNTIME_LAYER]),
+        PYTHONDONTWRITEBYTECODE="1",
+        AWS_DEFAULT_REGION=os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+    )
+    totals, top = [], {}
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import index"],
+            cwd=function_dir, env=env, capture_output=True, text=True, check=True
+        )
+        totals.append((time.perf_counter() - started) * 1000)
+        top = parse_importtime(result.stderr)
+    return {"total_ms": statistics.median(totals), "top": top}
+
+
+def parse_importtime(output, root="index"):
+    """
+    Tiempo acumulado (ms) de cada import directo de root.
+    -X importtime escribe los hijos antes que el padre, con dos espacios más de sangría.
+    """
+    children = {}
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3))
+        if depth == 1:
+            if match.group(4) == root:
+                return dict(sorted(children.items(), key=lambda item: item[1], reverse=True))
+            children = {}
+        elif depth == 3:
+            children[match.group(4)] = int(match.group(2)) / 1000
+    return {}
+
+
+def init_durations(lines):
+    """
+    Valores de Init Duration (ms) de las líneas REPORT; las invocaciones calientes no lo incluyen.
+    """
+    return [float(match.group(1)) for match in map(INIT_DURATION.search, lines) if match]
+
+
+def fetch_report_lines(log_group, hours):
+    import boto3
+
+    logs = boto3.client("logs")
+    start = int((time.time() - hours * 3600) * 1000)
+    paginator = logs.get_paginator("filter_log_events")
+    for page in paginator.paginate(logGroupName=log_group, startTime=start, filterPattern='"Init Duration"'):
+        for event in page["events"]:
+            yield event["message"]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def parse_budgets(items):
+    budgets = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        budgets[name] = float(value)
+    return budgets
+
+
+def run_imports(args, budgets):
+    over = []
+    print(f"{'lambda':<18}{'imports ms':>12}  módulos más costosos")
+    for function in args.functions:
+        profile = import_profile(function, args.runs)
+        top = ", ".join(f"{name} {ms:.0f}" for name, ms in list(profile["top"].items())[:args.top])
+        print(f"{function:<18}{profile['total_ms']:>12.0f}  {top}")
+        if function in budgets and profile["total_ms"] > budgets[function]:
+            over.append(f"{function}: {profile['total_ms']:.0f} ms > {budgets[function]:.0f} ms")
+    return over
+
+
+def run_reports(args, budgets):
+    if args.file:
+        with open(args.file) as f:
+            lines = f.readlines()
+    else:
+        lines = list(fetch_report_lines(args.log_group, args.hours))
+    durations = init_durations(lines)
+    if not durations:
+        print("No se encontraron arranques en frío (líneas REPORT con Init Duration)")
+        return []
+
+    p50, p95 = percentile(durations, 0.5), percentile(durations, 0.95)
+    print(f"arranques en frío: {len(durations)}  p50 {p50:.0f} ms  p95 {p95:.0f} ms  máx {max(durations):.0f} ms")
+    if "init" in budgets and p95 > budgets["init"]:
+        return [f"Init Duration p95: {p95:.0f} ms > {budgets['init']:.0f} ms"]
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    imports = subparsers.add_parser("imports", help="Tiempo de imports medido con -X importtime")
+    imports.add_argument("--functions", nargs="+", default=list(FUNCTIONS), choices=FUNCTIONS)
+    imports.add_argument("--runs", type=int, default=3, help="Ejecuciones por Lambda (se reporta la mediana)")
+    imports.add_argument("--top", type=int, default=5, help="Módulos a mostrar por Lambda")
+
+    reports = subparsers.add_parser("reports", help="Init Duration de las líneas REPORT")
+    source = reports.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log-group", help="Grupo de CloudWatch Logs de la Lambda")
+    source.add_argument("--file", help="Archivo con líneas REPORT exportadas")
+    reports.add_argument("--hours", type=float, default=24, help="Ventana de búsqueda en CloudWatch")
+
+    for subparser in (imports, reports):
+        subparser.add_argument("--budget", nargs="+", metavar="NOMBRE=MS",
+                               help="Presupuesto por Lambda (imports) o 'init' para el p95 (reports)")
+    args = parser.parse_args()
+
+    budgets = parse_budgets(args.budget)
+    over = run_imports(args, budgets) if args.command == "imports" else run_reports(args, budgets)
+    for message in over:
+        print(f"Presupuesto excedido: {message}", file=sys.stderr)
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Mide la memoria pico de la carga Base64 de file_processor.
+
+Compara la ruta anterior (json.loads del cuerpo completo + base64.b64decode + put_object)
+con la decodificación en streaming hacia una carga multiparte. Cada combinación se ejecuta
+en un subproceso limpio y se reporta el pico de tracemalloc durante la carga más el cuerpo
+del evento (que la Lambda mantiene en memoria de todos modos) frente al límite de 256 MB
+configurado en la Lambda.
+
+Uso:
+    python benchmarks/decode_memory.py --sizes 4 20 50
+"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "lambda", "file_processor"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "layers", "runtime_layer", "python"))
+
+from base64_stream import iter_decoded_chunks, split_file_field  # noqa: E402
+from medical_analytics_runtime.multipart import S3MultipartWriter  # noqa: E402
+
+LAMBDA_MEMORY_MB = 256
+PART_SIZE = 5 * 1024 * 1024
+
+
+class NullS3:
+    """Cliente S3 que consume y descarta los cuerpos, sin red."""
+
+    def put_object(self, Body, **kwargs):
+        len(Body)
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "local"}
+
+    def upload_part(self, Body, PartNumber, **kwargs):
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, **kwargs):
+        pass
+
+    def abort_multipart_upload(self, **kwargs):
+        pass
+
+
+def legacy_upload(body, s3):
+    """Ruta anterior: el archivo existe como string JSON, string Base64 y bytes decodificados."""
+    payload = json.loads(body)
+    file_bytes = base64.b64decode(payload["file"])
+    s3.put_object(Bucket="bench", Key="k", Body=file_bytes)
+
+
+def streaming_upload(body, s3):
+    """Ruta actual: decodificación por bloques hacia una carga multiparte."""
+    _, start, end = split_file_field(body)
+    with S3MultipartWriter(s3, "bench", "k", part_size=PART_SIZE) as writer:
+        for chunk in iter_decoded_chunks(body, start, end):
+            writer.write(chunk)
+
+
+def measure(mode, size_mb):
+    """Ejecuta una medición en el proceso actual y devuelve el resultado."""
+    content = os.urandom(int(size_mb * 1024 * 1024))
+    body = json.dumps({"filename": "bench.xlsx", "file": base64.b64encode(content).decode()})
+    del content
+
+    upload = legacy_upload if mode == "legacy" else streaming_upload
+    tracemalloc.start()
+    upload(body, NullS3())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "mode": mode,
+        "file_mb": size_mb,
+        "body_mb": round(len(body) / 1024 / 1024, 1),
+        "peak_alloc_mb": round(peak / 1024 / 1024, 1),
+        "total_mb": round((len(body) + peak) / 1024 / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[4.5, 20, 50], help="Tamaños de archivo en MB")
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(measure(args.run[0], float(args.run[1]))))
+        return
+
+    print(f"{'modo':<10}{'archivo MB':>12}{'cuerpo MB':>12}{'pico carga MB':>16}{'total MB':>10}{'% de 256 MB':>14}")
+    for size in args.sizes:
+        for mode in ("legacy", "streaming"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", mode, str(size)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            r = json.loads(output)
+            share = r["total_mb"] / LAMBDA_MEMORY_MB * 100
+            print(f"{r['mode']:<10}{r['file_mb']:>12}{r['body_mb']:>12}{r['peak_alloc_mb']:>16}{r['total_mb']:>10}{share:>13.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Mide la memoria pico de la conversión de Excel a Parquet de excel_converter.
+
+Compara pandas.read_excel (la hoja completa en un DataFrame) con el lector por lotes
+de workbook_reader (openpyxl read_only -> RecordBatch -> ParquetWriter). Los libros
+sintéticos se generan una vez en --workdir. Cada combinación se ejecuta en un
+subproceso limpio; se reporta el RSS después de los imports, el RSS pico y el
+incremento frente al límite de memoria de la Lambda.
+
+Uso:
+    python benchmarks/excel_reader_memory.py --rows 10000 100000 500000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+import zipfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "lambda", "excel_converter"))
+
+LAMBDA_MEMORY_MB = 256
+HEADERS = ("NUMDOC_PACIENTE", "FECHA_FOLIO", "NOMBRE_PACIENTE", "DIAGNÓSTICO", "OBSERVACIONES", "SEDE")
+DIAGNOSES = ("J45 Asma", "I10 Hipertensión esencial", "E11 Diabetes mellitus tipo 2", "N18 Enfermedad renal crónica")
+
+
+def rss_mb():
+    # ru_maxrss está en KiB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def generate_workbook(path, rows):
+    """Genera un libro con filas de campaña sintéticas (incluye columnas que no se proyectan)."""
+    import openpyxl
+
+    rng = random.Random(rows)
+    workbook = openpyxl.Workbook(write_only=True)
+    tmp_path = path + ".tmp"
+    sheet = workbook.create_sheet()
+    sheet.append(HEADERS)
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(rows):
+        sheet.append((
+            str(10_000_000 + rng.randrange(rows)),
+            start + datetime.timedelta(minutes=rng.randrange(525_600)),
+            f"Paciente {rng.randrange(rows)}",
+            rng.choice(DIAGNOSES),
+            f"Observación de seguimiento {i}",
+            f"Sede {rng.randrange(20)}",
+        ))
+    workbook.save(tmp_path)
+    add_dimension(tmp_path, path, f"A1:F{rows + 1}")
+    os.remove(tmp_path)
+
+
+def add_dimension(source, target, ref):
+    """
+    Agrega el elemento <dimension> que Excel escribe al inicio de cada hoja.
+    El modo write_only de openpyxl lo omite, y sin él openpyxl read_only recorre la
+    hoja completa al abrir el libro, lo que no representa a los libros de campaña.
+    """
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            if not item.filename.startswith("xl/worksheets/"):
+                dst.writestr(item, src.read(item))
+                continue
+            with src.open(item) as fin, dst.open(item.filename, "w", force_zip64=True) as fout:
+                head = fin.read(64 * 1024).replace(b"</sheetPr>", b'</sheetPr><dimension ref="%s" />' % ref.encode(), 1)
+                fout.write(head)
+                shutil.copyfileobj(fin, fout)
+
+
+def pandas_convert(path, output):
+    """Ruta anterior: la hoja completa en un DataFrame antes de escribir Parquet."""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = pd.read_excel(path, sheet_name=0, dtype=str)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), output, compression="zstd")
+    return len(df)
+
+
+def streaming_convert(path, output):
+    """Ruta actual: lotes de filas proyectados hacia un ParquetWriter."""
+    import pyarrow.parquet as pq
+    from index import COLUMN_ALIASES, WORKBOOK_SCHEMA
+    from schema_registry import infer_mapping, normalize_header
+    from workbook_reader import iter_record_batches
+
+    def resolve_columns(header):
+        return infer_mapping([normalize_header(name) if name is not None else "" for name in header], COLUMN_ALIASES)
+
+    rows = 0
+    with pq.ParquetWriter(output, WORKBOOK_SCHEMA, compression="zstd") as writer:
+        for batch in iter_record_batches(path, WORKBOOK_SCHEMA, resolve_columns):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+def measure(mode, path):
+    """Ejecuta una conversión en el proceso actual y devuelve el resultado."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    sys.path.insert(0, os.path.join(ROOT_DIR, "layers", "runtime_layer", "python"))
+    # Imports fuera de la medición. pyarrow importa pandas en la primera conversión de
+    # objetos Python, así que ambos modos lo cargan por adelantado para comparar solo los datos
+    import pandas  # noqa: F401
+    import pyarrow.parquet  # noqa: F401
+    import openpyxl  # noqa: F401
+    import index  # noqa: F401
+    baseline = rss_mb()
+
+    convert = pandas_convert if mode == "pandas" else streaming_convert
+    started = time.perf_counter()
+    rows = convert(path, path + f".{mode}.parquet")
+    elapsed = time.perf_counter() - started
+    os.remove(path + f".{mode}.parquet")
+
+    return {
+        "mode": mode,
+        "rows": rows,
+        "seconds": round(elapsed, 1),
+        "baseline_mb": round(baseline, 1),
+        "peak_mb": round(rss_mb(), 1),
+        "delta_mb": round(rss_mb() - baseline, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 500_000], help="Filas por libro")
+    parser.add_argument("--modes", nargs="+", default=["pandas", "streaming"], choices=["pandas", "streaming"])
+    parser.add_argument("--workdir", default="/tmp/excel-reader-bench", help="Directorio de los libros generados")
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(measure(*args.run)))
+        return
+
+    os.makedirs(args.workdir, exist_ok=True)
+    print(f"{'modo':<11}{'filas':>9}{'seg':>7}{'imports MB':>12}{'pico MB':>10}{'incremento MB':>15}{'% de 256 MB':>13}")
+    for rows in args.rows:
+        path = os.path.join(args.workdir, f"campana_{rows}.xlsx")
+        if not os.path.exists(path):
+            generate_workbook(path, rows)
+        for mode in args.modes:
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", mode, path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            r = json.loads(output)
+            share = r["peak_mb"] / LAMBDA_MEMORY_MB * 100
+            print(f"{r['mode']:<11}{r['rows']:>9}{r['seconds']:>7}{r['baseline_mb']:>12}{r['peak_mb']:>10}{r['delta_mb']:>15}{share:>12.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia, throughput y memoria de los handlers de ingesta.
+
+Ejecuta file_processor.handler (POST /upload con Base64) y api_ingestion.handler en el
+mismo proceso, contra S3 simulado con moto y una API de origen HTTP local que sirve
+registros de pacientes sintéticos. Cada escenario corre en un subproceso limpio (el RSS
+pico es por proceso) y la API de origen en otro, para que su memoria no se sume.
+
+Por escenario se reporta p50/p95/p99 de latencia, throughput (MB/s o registros/s) y
+RSS pico. Los resultados se guardan en benchmarks/results/{commit}.json y --compare
+muestra la variación entre dos archivos de resultados.
+
+Las latencias incluyen el costo de moto en memoria y el RSS pico incluye los objetos que
+moto guarda en el proceso: sirven para comparar commits en la misma máquina, no como
+estimación de la latencia o la memoria en AWS.
+
+Uso:
+    python benchmarks/handlers.py
+    python benchmarks/handlers.py --uploads 0.1 1 10 50 --records 1000 100000 1000000 --iterations 5
+    python benchmarks/handlers.py --uploads --records 1000000 --page-size 0
+    python benchmarks/handlers.py --compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+import argparse
+import base64
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNTIME_LAYER = os.path.join(ROOT_DIR, "layers", "runtime_layer", "python")
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+BUCKET = "medical-analytics-bench"
+
+DIAGNOSES = ("J45 Asma", "I10 Hipertensión esencial", "E11 Diabetes mellitus tipo 2", "N18 Enfermedad renal crónica")
+
+
+class FakeContext:
+    function_name = "benchmark"
+    function_version = "$LATEST"
+    aws_request_id = "benchmark-request-id"
+
+
+def rss_mb():
+    # ru_maxrss está en KiB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthetic_records(count, seed=0):
+    """Registros de pacientes sintéticos con la forma de la API del cliente."""
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(count):
+        yield {
+            "id": i,
+            "numdoc_paciente": str(10_000_000 + rng.randrange(1_000_000)),
+            "nombre_paciente": f"Paciente {rng.randrange(100_000)}",
+            "fecha_folio": (start + datetime.timedelta(minutes=rng.randrange(525_600))).isoformat(),
+            "diagnostico": rng.choice(DIAGNOSES),
+            "presion_sistolica": rng.randrange(90, 180),
+            "presion_diastolica": rng.randrange(60, 110),
+        }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+# --- API de origen simulada ---------------------------------------------------------
+
+def serve_upstream(port):
+    """
+    Sirve GET /datos?records=N con N registros sintéticos. Con page_size=M responde
+    páginas de M registros con "next_cursor" (generadas por página); sin él, un solo
+    arreglo JSON que se genera una vez por N.
+    """
+    cache = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = {key: int(values[0]) for key, values in parse_qs(urlparse(self.path).query).items()}
+            count = query.get("records", 1000)
+            if "page_size" in query:
+                start = query.get("cursor", 0)
+                end = min(start + query["page_size"], count)
+                page = list(synthetic_records(end - start, seed=start))
+                body = json.dumps({"data": page, "next_cursor": end if end < count else None}).encode()
+            else:
+                if count not in cache:
+                    cache[count] = json.dumps(list(synthetic_records(count))).encode()
+                body = cache[count]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"La API simulada no respondió en el puerto {port}")
+
+
+# --- Ejecución de un escenario (subproceso) -----------------------------------------
+
+def load_handler(function_dir):
+    """Carga lambda/{function_dir}/index.py como lo hace tests/conftest.py."""
+    lambda_path = os.path.join(ROOT_DIR, "lambda", function_dir)
+    sys.path[:0] = [lambda_path, RUNTIME_LAYER]
+    spec = importlib.util.spec_from_file_location(f"{function_dir}_index", os.path.join(lambda_path, "index.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_upload(size_mb, iterations):
+    module = load_handler("file_processor")
+    size = int(size_mb * 1024 * 1024)
+    baseline = rss_mb()
+    latencies = []
+    for i in range(iterations):
+        # Contenido distinto en cada iteración para que la deduplicación por SHA-256 no acorte la carga
+        content = i.to_bytes(4, "big") + os.urandom(size - 4)
+        event = {"body": json.dumps({"filename": f"bench_{i}.xlsx", "file": base64.b64encode(content).decode()})}
+        del content
+        started = time.perf_counter()
+        response = module.handler(event, FakeContext())
+        latencies.append(time.perf_counter() - started)
+        assert response["statusCode"] == 200, response
+        del event
+    return baseline, latencies, {"mb_per_s": round(size_mb * iterations / sum(latencies), 1)}
+
+
+def run_api(records, iterations, port, page_size):
+    os.environ["API_ENDPOINT"] = f"http://127.0.0.1:{port}/datos?records={records}"
+    if page_size:
+        os.environ["API_ENDPOINT"] += f"&page_size={page_size}"
+    module = load_handler("api_ingestion")
+    module.requests.get(os.environ["API_ENDPOINT"], timeout=300)  # La API simulada genera el JSON fuera de la medición
+    baseline = rss_mb()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = module.handler({}, FakeContext())
+        latencies.append(time.perf_counter() - started)
+        assert response["statusCode"] == 200, response
+    return baseline, latencies, {"records_per_s": round(records * iterations / sum(latencies))}
+
+
+def measure(kind, size, iterations, port, page_size=0):
+    """Ejecuta un escenario en el proceso actual contra moto y devuelve el resultado."""
+    from moto import mock_aws
+
+    audit_dir = tempfile.mkdtemp(prefix="bench-audit-")
+    os.environ.update({
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "BUCKET_NAME": BUCKET,
+        "AUDIT_SINK": "local",
+        "AUDIT_LOCAL_DIR": audit_dir,
+    })
+    with mock_aws():
+        import boto3
+
+        boto3.client("s3").create_bucket(Bucket=BUCKET)
+        if kind == "upload":
+            baseline, latencies, throughput = run_upload(float(size), iterations)
+        else:
+            baseline, latencies, throughput = run_api(int(size), iterations, port, page_size)
+
+    return {
+        "scenario": f"{kind}:{size}",
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        **throughput,
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(rss_mb(), 1),
+    }
+
+
+# --- Orquestación y comparación ----------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "local"
+
+
+def run_suite(args):
+    scenarios = [("upload", size) for size in args.uploads] + [("api", count) for count in args.records]
+    port = free_port()
+    upstream = subprocess.Popen([sys.executable, __file__, "--serve", str(port)]) if args.records else None
+    try:
+        if upstream:
+            wait_for_port(port)
+        results = []
+        print(f"{'escenario':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'throughput':>16}{'RSS pico MB':>13}")
+        for kind, size in scenarios:
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", kind, str(size), str(args.iterations), str(port), str(args.page_size)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            results.append(r)
+            throughput = f"{r['mb_per_s']} MB/s" if "mb_per_s" in r else f"{r['records_per_s']} reg/s"
+            print(f"{r['scenario']:<16}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{throughput:>16}{r['peak_rss_mb']:>13}")
+    finally:
+        if upstream:
+            upstream.terminate()
+
+    commit = git_commit()
+    output_path = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump({
+            "commit": commit,
+            "created_at": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }, f, indent=2)
+    print(f"Resultados guardados en {output_path}")
+
+
+def compare(old_path, new_path):
+    """Imprime la variación de p50, p95 y RSS pico entre dos archivos de resultados."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    previous = {r["scenario"]: r for r in old["results"]}
+
+    def delta(before, after):
+        return f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'escenario':<16}{'p50':>8}{'p95':>8}{'RSS pico':>10}")
+    for r in new["results"]:
+        before = previous.get(r["scenario"])
+        if before is None:
+            print(f"{r['scenario']:<16}{'nuevo':>8}")
+            continue
+        print(f"{r['scenario']:<16}{delta(before['p50_ms'], r['p50_ms']):>8}{delta(before['p95_ms'], r['p95_ms']):>8}"
+              f"{delta(before['peak_rss_mb'], r['peak_rss_mb']):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=float, nargs="*", default=[0.1, 1, 10, 50], help="Tamaños de archivo en MB")
+    parser.add_argument("--records", type=int, nargs="*", default=[1_000, 10_000, 100_000, 1_000_000],
+                        help="Registros por respuesta de la API")
+    parser.add_argument("--iterations", type=int, default=5, help="Invocaciones por escenario")
+    parser.add_argument("--page-size", type=int, default=10_000,
+                        help="Registros por página de la API simulada (0 = una sola respuesta)")
+    parser.add_argument("--output", help="Archivo de resultados (por defecto benchmarks/results/{commit}.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DESPUES"), help="Compara dos archivos de resultados")
+    parser.add_argument("--run", nargs=5, metavar=("KIND", "SIZE", "ITERATIONS", "PORT", "PAGE_SIZE"), help=argparse.SUPPRESS)
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_upstream(args.serve)
+    elif args.run:
+        kind, size, iterations, port, page_size = args.run
+        print(json.dumps(measure(kind, size, int(iterations), int(port), int(page_size))))
+    elif args.compare:
+        compare(*args.compare)
+    else:
+        run_suite(args)
+
+
+if __name__ == "__main__":
+    main()
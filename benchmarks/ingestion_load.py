@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Generador de carga de api_ingestion contra la API de origen simulada (mock_api.py).
+
+Levanta mock_api.py en un subproceso con la latencia, las fallas y el volumen indicados,
+y ejecuta api_ingestion.handler contra él (S3 simulado con moto) una vez por cada
+combinación de --concurrency y --page-size. Cada combinación corre en un subproceso
+limpio: la configuración de index.py se lee al importarlo y el RSS pico es por proceso.
+
+Por combinación se reporta la duración media, registros/s, bytes/s recibidos (comprimidos,
+los "bytes_recibidos" de los metadatos de la ejecución), RSS pico, ejecuciones fallidas y
+las respuestas 429/5xx que sirvió la API (cada una es un reintento del cliente) y 304. Sirve
+para elegir API_MAX_CONCURRENCY, API_PAGE_SIZE, API_RATE_LIMIT y el backoff de los
+reintentos sin tocar la API de producción.
+
+Las cifras incluyen el costo de moto en memoria: comparan configuraciones en la misma
+máquina, no estiman la duración en AWS.
+
+Uso:
+    python benchmarks/ingestion_load.py --records 100000 --concurrency 1 2 4 8 --latency-ms 80
+    python benchmarks/ingestion_load.py --records 50000 --throttle-rate 0.05 --error-rate 0.02 --retry-base-delay 0.2
+    python benchmarks/ingestion_load.py --records 200000 --page-size 1000 5000 --pagination offset --output load.json
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import mock_api
+from handlers import BUCKET, FakeContext, free_port, git_commit, load_handler, rss_mb, wait_for_port
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MOCK_API = os.path.join(ROOT_DIR, "benchmarks", "mock_api.py")
+# Opciones de mock_api.py que se reenvían al servidor
+SERVER_OPTIONS = ("records", "pagination", "latency_ms", "jitter_ms", "throttle_rate", "error_rate",
+                  "retry_after", "seed")
+
+
+def server_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stats", timeout=10) as response:
+        return json.load(response)
+
+
+def stats_delta(before, after):
+    """
+    Respuestas servidas entre dos lecturas de /_stats.
+    """
+    status = {
+        code: count - before["status"].get(code, 0)
+        for code, count in after["status"].items() if count - before["status"].get(code, 0)
+    }
+    return {
+        "requests": after["requests"] - before["requests"],
+        "throttled": status.get("429", 0),
+        "server_errors": sum(count for code, count in status.items() if code.startswith("5")),
+        "not_modified": status.get("304", 0),
+    }
+
+
+def run_combination(port, concurrency, page_size, iterations, options):
+    """
+    Ejecuta api_ingestion.handler iterations veces en el proceso actual contra moto.
+    """
+    from moto import mock_aws
+
+    os.environ.update({
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "BUCKET_NAME": BUCKET,
+        "AUDIT_SINK": "local",
+        "AUDIT_LOCAL_DIR": tempfile.mkdtemp(prefix="load-audit-"),
+        "API_ENDPOINT": f"http://127.0.0.1:{port}/datos",
+        "API_PAGINATION": options["pagination"],
+        "API_PAGE_SIZE": str(page_size),
+        "API_MAX_CONCURRENCY": str(concurrency),
+        "API_RATE_LIMIT": str(options["rate_limit"]),
+        "API_RETRY_BASE_DELAY": str(options["retry_base_delay"]),
+        "API_RETRY_MAX_DELAY": str(options["retry_max_delay"]),
+        "API_OUTPUT_FORMATS": options["output_formats"],
+    })
+    with mock_aws():
+        import boto3
+
+        s3 = boto3.client("s3")
+        s3.create_bucket(Bucket=BUCKET)
+        module = load_handler("api_ingestion")
+        baseline = rss_mb()
+        before = server_stats(port)
+        durations, records, wire_bytes, failures = [], 0, 0, 0
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = module.handler({}, FakeContext())
+            durations.append(time.perf_counter() - started)
+            if response["statusCode"] != 200:
+                failures += 1
+                continue
+            records += json.loads(response["body"])["records_processed"]
+        # Los bytes recibidos por la red quedan en los metadatos de cada ejecución
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET, Prefix="raw/api/"):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith("_metadata.json"):
+                    body = s3.get_object(Bucket=BUCKET, Key=obj["Key"])["Body"].read()
+                    wire_bytes += json.loads(body)["bytes_recibidos"]
+        served = stats_delta(before, server_stats(port))
+
+    elapsed = sum(durations)
+    return {
+        "concurrency": concurrency,
+        "page_size": page_size,
+        "iterations": iterations,
+        "failures": failures,
+        "mean_s": round(statistics.mean(durations), 3),
+        "records_per_s": round(records / elapsed) if elapsed else 0,
+        "mb_per_s": round(wire_bytes / elapsed / 1024 / 1024, 2) if elapsed else 0,
+        "wire_bytes": wire_bytes,
+        **served,
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(rss_mb(), 1),
+    }
+
+
+def start_server(port, args):
+    # Con paginación link el cliente no envía limit: el tamaño de página lo decide el servidor
+    command = [sys.executable, MOCK_API, "--port", str(port), "--page-size", str(args.page_size[0])]
+    for option in SERVER_OPTIONS:
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    if args.no_gzip:
+        command.append("--no-gzip")
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    wait_for_port(port)
+    return server
+
+
+def run_load(args):
+    port = free_port()
+    server = start_server(port, args)
+    options = {
+        "pagination": args.pagination,
+        "rate_limit": args.rate_limit,
+        "retry_base_delay": args.retry_base_delay,
+        "retry_max_delay": args.retry_max_delay,
+        "output_formats": args.output_formats,
+    }
+    results = []
+    try:
+        print(f"{'concurrencia':>12}{'página':>8}{'s/ejec':>9}{'reg/s':>10}{'MB/s':>8}{'429':>6}{'5xx':>6}{'304':>6}"
+              f"{'fallidas':>10}{'RSS pico MB':>13}")
+        for concurrency in args.concurrency:
+            for page_size in args.page_size:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--run", json.dumps({
+                        "port": port, "concurrency": concurrency, "page_size": page_size,
+                        "iterations": args.iterations, "options": options,
+                    })],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                r = json.loads(output.strip().splitlines()[-1])
+                results.append(r)
+                print(f"{r['concurrency']:>12}{r['page_size']:>8}{r['mean_s']:>9}{r['records_per_s']:>10}"
+                      f"{r['mb_per_s']:>8}{r['throttled']:>6}{r['server_errors']:>6}{r['not_modified']:>6}{r['failures']:>10}"
+                      f"{r['peak_rss_mb']:>13}")
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "created_at": datetime.datetime.utcnow().isoformat(),
+                "server": {option: getattr(args, option) for option in SERVER_OPTIONS},
+                "client": options,
+                "results": results,
+            }, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mock_api.add_arguments(parser)
+    parser.add_argument("--page-size", type=int, nargs="+", default=[1000],
+                        help="Registros por página (API_PAGE_SIZE; con --pagination link, el primero fija el del servidor)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Valores de API_MAX_CONCURRENCY")
+    parser.add_argument("--iterations", type=int, default=3, help="Ejecuciones del handler por combinación")
+    parser.add_argument("--rate-limit", type=float, default=0, help="API_RATE_LIMIT (solicitudes/s, 0 = sin límite)")
+    parser.add_argument("--retry-base-delay", type=float, default=0.5, help="API_RETRY_BASE_DELAY en segundos")
+    parser.add_argument("--retry-max-delay", type=float, default=20, help="API_RETRY_MAX_DELAY en segundos")
+    parser.add_argument("--output-formats", default="ndjson", help="API_OUTPUT_FORMATS (p. ej. ndjson,parquet)")
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        spec = json.loads(args.run)
+        print(json.dumps(run_combination(
+            spec["port"], spec["concurrency"], spec["page_size"], spec["iterations"], spec["options"]
+        )))
+    else:
+        run_load(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+API de origen simulada para probar api_ingestion sin la API del cliente.
+
+Servidor HTTP/1.1 sobre asyncio (solo biblioteca estándar) que sirve registros de
+pacientes sintéticos con el contrato de la API (RECORD_CONTRACT en parquet_writer.py):
+
+- Volumen: --records registros deterministas (mismo --seed, mismos datos). Cada página se
+  genera al pedirla, así que el volumen no depende de la memoria del servidor.
+- Paginación: cursor ("next_cursor" en el cuerpo), offset (offset/limit) o link
+  (encabezado Link con rel="next"). El tamaño de página es ?limit= o --page-size.
+- Filtro incremental: updated_since / updated_until sobre "updated_at", que crece con el
+  id (como una API que ordena por fecha de modificación).
+- Latencia: --latency-ms por respuesta, más un jitter uniforme de --jitter-ms.
+- Fallas: una fracción --throttle-rate de solicitudes responde 429 con Retry-After y
+  --error-rate responde 500/502/503/504. Se sortean con --seed, de modo que dos
+  ejecuciones con la misma configuración ven las mismas fallas en el mismo orden.
+- gzip si la solicitud lo acepta (--no-gzip lo desactiva) y ETag por página: una solicitud
+  con If-None-Match igual al ETag actual recibe 304 sin cuerpo.
+
+GET /_stats devuelve los contadores del servidor (solicitudes, códigos, bytes enviados).
+
+Uso:
+    python benchmarks/mock_api.py --port 8080 --records 100000
+    python benchmarks/mock_api.py --records 1000000 --page-size 5000 --pagination offset --latency-ms 80
+    python benchmarks/mock_api.py --throttle-rate 0.05 --error-rate 0.02 --retry-after 1
+"""
+import argparse
+import asyncio
+import datetime
+import gzip
+import hashlib
+import json
+import random
+from urllib.parse import parse_qs, urlencode, urlparse
+
+DIAGNOSES = ("J45 Asma", "I10 Hipertensión esencial", "E11 Diabetes mellitus tipo 2", "N18 Enfermedad renal crónica")
+PAGINATION_MODES = ("cursor", "offset", "link")
+ERROR_STATUSES = (500, 502, 503, 504)
+REASONS = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    429: "Too Many Requests", 500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+START = datetime.datetime(2024, 1, 1)
+# updated_at del registro i: START + i * UPDATE_STEP
+UPDATE_STEP = datetime.timedelta(seconds=30)
+MAX_PAGE_SIZE = 100_000
+WRITE_CHUNK = 64 * 1024
+
+
+def synthetic_record(index, seed=0):
+    """
+    Registro de paciente sintético; depende solo de (index, seed).
+    """
+    rng = random.Random(seed << 32 | index)
+    return {
+        "id": index,
+        "numdoc_paciente": str(10_000_000 + rng.randrange(1_000_000)),
+        "nombre_paciente": f"Paciente {rng.randrange(100_000)}",
+        "fecha_folio": (START + datetime.timedelta(minutes=rng.randrange(525_600))).isoformat(),
+        "diagnostico": rng.choice(DIAGNOSES),
+        "presion_sistolica": rng.randrange(90, 180),
+        "presion_diastolica": rng.randrange(60, 110),
+        "updated_at": (START + UPDATE_STEP * index).isoformat() + "Z",
+    }
+
+
+def index_at(timestamp, records):
+    """
+    Primer id con updated_at >= timestamp (acotado a [0, records]).
+    """
+    moment = datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    steps = -(-(moment - START) // UPDATE_STEP)  # División redondeada hacia arriba
+    return min(max(steps, 0), records)
+
+
+class MockApi:
+    """
+    Estado y configuración del servidor simulado.
+    """
+
+    def __init__(self, records=10_000, page_size=1000, pagination="cursor", latency_ms=0.0, jitter_ms=0.0,
+                 throttle_rate=0.0, error_rate=0.0, retry_after=1, gzip_enabled=True, seed=0):
+        """
+        Args:
+            records (int): Registros del conjunto completo
+            page_size (int): Registros por página cuando la solicitud no indica limit
+            pagination (str): cursor, offset o link
+            latency_ms (float): Latencia fija por respuesta
+            jitter_ms (float): Latencia adicional aleatoria (uniforme entre 0 y jitter_ms)
+            throttle_rate (float): Fracción de solicitudes que reciben 429
+            error_rate (float): Fracción de solicitudes que reciben 5xx
+            retry_after (int): Segundos del encabezado Retry-After de los 429
+            gzip_enabled (bool): Comprimir con gzip si la solicitud lo acepta
+            seed (int): Semilla de los datos y de las fallas
+        """
+        if pagination not in PAGINATION_MODES:
+            raise ValueError(f"Modo de paginación no soportado: {pagination}")
+        self.records = records
+        self.page_size = page_size
+        self.pagination = pagination
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.gzip_enabled = gzip_enabled
+        self.seed = seed
+        self._faults = random.Random(seed)
+        self.stats = {"requests": 0, "records_sent": 0, "bytes_sent": 0, "status": {}}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Atiende las solicitudes de una conexión (keep-alive) hasta que el cliente la cierra.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                status, response_headers, body = await self.respond(method, target, headers)
+                await self.send(writer, status, response_headers, body)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, headers):
+        """
+        Respuesta (status, encabezados, cuerpo) de una solicitud.
+        """
+        url = urlparse(target)
+        if url.path == "/_stats":
+            return 200, {"Content-Type": "application/json"}, json.dumps(self.stats).encode()
+        if method != "GET":
+            return 405, {"Allow": "GET"}, b""
+
+        self.stats["requests"] += 1
+        delay = self.latency + (self._faults.uniform(0, self.jitter) if self.jitter else 0)
+        fault = self._faults.random()
+        if delay:
+            await asyncio.sleep(delay)
+        if fault < self.throttle_rate:
+            return 429, {"Retry-After": str(self.retry_after), "Content-Type": "application/json"}, b'{"error":"rate limit"}'
+        if fault < self.throttle_rate + self.error_rate:
+            status = ERROR_STATUSES[int(fault * 1_000_000) % len(ERROR_STATUSES)]
+            return status, {"Content-Type": "application/json"}, b'{"error":"upstream"}'
+
+        try:
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            start, end, next_query = self.page_bounds(query)
+        except ValueError as e:
+            return 400, {"Content-Type": "application/json"}, json.dumps({"error": str(e)}).encode()
+
+        etag = self.etag(url.path, query)
+        if headers.get("if-none-match") == etag:
+            return 304, {"ETag": etag}, b""
+
+        page = [synthetic_record(i, self.seed) for i in range(start, end)]
+        response_headers = {"Content-Type": "application/json", "ETag": etag}
+        if self.pagination == "cursor":
+            payload = {"data": page, "next_cursor": next_query.get("cursor") if next_query else None}
+        else:
+            payload = {"data": page}
+            if self.pagination == "link" and next_query:
+                host = headers.get("host", "localhost")
+                response_headers["Link"] = f'<http://{host}{url.path}?{urlencode(next_query)}>; rel="next"'
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        if self.gzip_enabled and "gzip" in headers.get("accept-encoding", ""):
+            body = gzip.compress(body, compresslevel=6)
+            response_headers["Content-Encoding"] = "gzip"
+        self.stats["records_sent"] += len(page)
+        return 200, response_headers, body
+
+    def page_bounds(self, query):
+        """
+        Rango [start, end) de ids de la página y parámetros de la página siguiente (o None).
+        """
+        first = index_at(query["updated_since"], self.records) if "updated_since" in query else 0
+        last = index_at(query["updated_until"], self.records) if "updated_until" in query else self.records
+        limit = min(int(query.get("limit", self.page_size)), MAX_PAGE_SIZE)
+        if limit <= 0:
+            raise ValueError(f"limit no válido: {limit}")
+        position = int(query.get("offset", query.get("cursor", 0)))
+        start = first + position
+        end = max(min(start + limit, last), start)
+        if end >= last:
+            return start, end, None
+        field = "offset" if self.pagination == "offset" else "cursor"
+        return start, end, {**query, "limit": limit, field: position + limit}
+
+    def etag(self, path, query):
+        """
+        ETag de una página: cambia con los datos (seed, volumen) y con la consulta.
+        """
+        canonical = json.dumps([self.seed, self.records, path, sorted(query.items())])
+        return '"' + hashlib.sha1(canonical.encode()).hexdigest()[:20] + '"'
+
+    async def send(self, writer, status, headers, body):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Content-Length: {len(body)}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        for offset in range(0, len(body), WRITE_CHUNK):
+            writer.write(body[offset:offset + WRITE_CHUNK])
+            await writer.drain()
+        await writer.drain()
+        codes = self.stats["status"]
+        codes[str(status)] = codes.get(str(status), 0) + 1
+        self.stats["bytes_sent"] += len(body)
+
+
+async def serve(api, host="127.0.0.1", port=8080):
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    print(f"API simulada en http://{host}:{port}/datos ({api.records} registros, paginación {api.pagination})",
+          flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def add_arguments(parser):
+    """
+    Opciones del servidor salvo --page-size (compartidas con ingestion_load.py, que las reenvía).
+    """
+    parser.add_argument("--records", type=int, default=10_000, help="Registros del conjunto completo")
+    parser.add_argument("--pagination", choices=PAGINATION_MODES, default="cursor", help="Estilo de paginación")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latencia fija por respuesta")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Latencia adicional aleatoria por respuesta")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="Fracción de respuestas 429")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fracción de respuestas 5xx")
+    parser.add_argument("--retry-after", type=int, default=1, help="Segundos de Retry-After en los 429")
+    parser.add_argument("--no-gzip", action="store_true", help="No comprimir las respuestas")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los datos y las fallas")
+
+
+def from_args(args):
+    return MockApi(
+        records=args.records, page_size=args.page_size, pagination=args.pagination, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, throttle_rate=args.throttle_rate, error_rate=args.error_rate,
+        retry_after=args.retry_after, gzip_enabled=not args.no_gzip, seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--page-size", type=int, default=1000, help="Registros por página si la solicitud no indica limit")
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
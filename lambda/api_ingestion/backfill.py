@@ -0,0 +1,173 @@
+"""
+Backfill histórico de la API en shards por rango de fechas.
+
+Una sola invocación de api_ingestion no alcanza para descargar meses de historia. El
+backfill lo reparte en una máquina de estados (Step Functions) con tres pasos, todos
+atendidos por index.backfill_handler:
+
+1. plan: divide [start, end) en shards de API_BACKFILL_SHARD_DAYS días. Si el backfill
+   ya se ejecutó antes (mismo backfill_id), omite los shards que tienen manifiesto, de
+   modo que reintentar la ejecución solo repite los que fallaron.
+2. ingest (Map, con concurrencia acotada): descarga el rango de un shard con la misma
+   lógica de ingest_pages, escribe sus datos en raw/api/backfill/{backfill_id}/ y un
+   manifiesto por shard en raw/api/_backfills/{backfill_id}/shards/.
+3. merge: combina los manifiestos de todos los shards del plan en
+   raw/api/_backfills/{backfill_id}/manifest.json e informa los que faltan.
+
+Los shards no usan la marca de agua ni el índice CDC de la ingesta programada: el
+backfill es una copia del rango pedido y no debe mover el estado incremental.
+
+run_locally() ejecuta los mismos pasos sin Step Functions (pruebas y desarrollo).
+"""
+import datetime
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from checkpoint import parse_timestamp
+from medical_analytics_runtime import storage
+
+logger = logging.getLogger()
+
+BACKFILL_PREFIX = 'raw/api/_backfills'
+BACKFILL_DATA_PREFIX = 'raw/api/backfill'
+DEFAULT_SHARD_DAYS = 1
+# Los elementos del Map viajan en el estado de la ejecución (máximo 256 KB)
+MAX_SHARDS = 1000
+
+
+def plan_shards(start, end, shard_days=DEFAULT_SHARD_DAYS):
+    """
+    Divide el rango [start, end) en shards consecutivos de shard_days días.
+
+    Args:
+        start (str): Inicio del rango (ISO 8601; las fechas sin zona son UTC)
+        end (str): Fin del rango, excluido
+        shard_days (float): Días por shard (admite fracciones, p. ej. 0.25 = 6 horas)
+
+    Returns:
+        list: Shards {shard_id, start, end} con fechas ISO 8601 en UTC
+
+    Raises:
+        ValueError: Si el rango está vacío o tiene más de MAX_SHARDS shards
+    """
+    first, last = parse_timestamp(start), parse_timestamp(end)
+    if last <= first:
+        raise ValueError(f"Rango de backfill vacío: {start} - {end}")
+    if shard_days <= 0:
+        raise ValueError(f"Días por shard no válidos: {shard_days}")
+    step = datetime.timedelta(days=shard_days)
+    count = -(-(last - first) // step)  # División redondeada hacia arriba
+    if count > MAX_SHARDS:
+        raise ValueError(f"El rango genera {count} shards (máximo {MAX_SHARDS}); aumente shard_days")
+
+    shards = []
+    for number in range(count):
+        shard_start = first + step * number
+        shards.append({
+            'shard_id': f"{number:04d}",
+            'start': shard_start.isoformat(),
+            'end': min(shard_start + step, last).isoformat()
+        })
+    return shards
+
+
+def shard_manifest_key(backfill_id, shard_id):
+    return f"{BACKFILL_PREFIX}/{backfill_id}/shards/{shard_id}.json"
+
+
+def shard_data_key(backfill_id, shard_id):
+    # El backfill_id va también en el nombre: el Parquet de todos los backfills comparte partición
+    return f"{BACKFILL_DATA_PREFIX}/{backfill_id}/{backfill_id}-{shard_id}_data.ndjson"
+
+
+def completed_shards(client, bucket, backfill_id):
+    """
+    IDs de los shards del backfill que ya tienen manifiesto.
+    """
+    prefix = f"{BACKFILL_PREFIX}/{backfill_id}/shards/"
+    completed = set()
+    for page in client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            completed.add(obj['Key'][len(prefix):].split('.')[0])
+    return completed
+
+
+def write_shard_manifest(client, bucket, backfill_id, shard, result):
+    """
+    Guarda el manifiesto de un shard terminado (marca el shard como completo).
+    """
+    manifest = {
+        'backfill_id': backfill_id,
+        **shard,
+        's3_key': result['s3_key'],
+        'records': result['records'],
+        'pages': result['pages'],
+        'wire_bytes': result['wire_bytes'],
+        'parquet': result['parquet_keys'],
+        'completed_at': datetime.datetime.utcnow().isoformat()
+    }
+    storage.put_object(
+        client, bucket, shard_manifest_key(backfill_id, shard['shard_id']), json.dumps(manifest), 'application/json',
+        codec='none'
+    )
+    return manifest
+
+
+def merge_manifests(backfill_id, plan, manifests):
+    """
+    Combina los manifiestos de los shards en el manifiesto del backfill.
+
+    Args:
+        backfill_id (str): ID del backfill
+        plan (list): Shards del plan completo
+        manifests (dict): shard_id -> manifiesto de los shards terminados
+
+    Returns:
+        dict: Manifiesto del backfill (status succeeded o incomplete)
+    """
+    missing = [shard['shard_id'] for shard in plan if shard['shard_id'] not in manifests]
+    shards = [manifests[shard['shard_id']] for shard in plan if shard['shard_id'] in manifests]
+    return {
+        'backfill_id': backfill_id,
+        'start': plan[0]['start'],
+        'end': plan[-1]['end'],
+        'status': 'incomplete' if missing else 'succeeded',
+        'shards_total': len(plan),
+        'shards_completed': len(shards),
+        'missing_shards': missing,
+        'records': sum(shard['records'] for shard in shards),
+        'pages': sum(shard['pages'] for shard in shards),
+        'wire_bytes': sum(shard['wire_bytes'] for shard in shards),
+        'objects': [shard['s3_key'] for shard in shards if shard['s3_key']],
+        'parquet': [key for shard in shards for key in shard['parquet']],
+        'merged_at': datetime.datetime.utcnow().isoformat()
+    }
+
+
+def run_locally(handler, event, context, max_concurrency=4):
+    """
+    Ejecuta plan, ingest (con hasta max_concurrency shards a la vez) y merge como lo hace
+    la máquina de estados. Un shard fallido no detiene a los demás: queda en missing_shards.
+
+    Args:
+        handler (callable): index.backfill_handler
+        event (dict): {backfill_id, start, end, shard_days}
+        context (LambdaContext): Contexto para el handler
+        max_concurrency (int): Shards en paralelo
+
+    Returns:
+        dict: Resultado del paso merge
+    """
+    plan = handler({**event, 'action': 'plan'}, context)
+
+    def ingest(shard):
+        try:
+            return handler({'action': 'ingest', 'backfill_id': plan['backfill_id'], 'shard': shard}, context)
+        except Exception as e:
+            logger.error(f"Shard {shard['shard_id']} fallido: {e}")
+            return {'shard_id': shard['shard_id'], 'status': 'failed', 'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(max_concurrency, 1)) as executor:
+        list(executor.map(ingest, plan['shards']))
+    return handler({**plan, 'action': 'merge'}, context)
@@ -0,0 +1,312 @@
+"""
+Captura de cambios (CDC) de los registros de la API.
+
+Aun con marca de agua, la API reenvía registros que no cambiaron (la ventana de
+solapamiento, o el conjunto completo si el endpoint no filtra). Con API_RECORD_KEY
+configurado, cada endpoint mantiene un índice clave del registro -> hash del contenido y
+cada registro se clasifica como:
+
+- insert: la clave no está en el índice.
+- update: la clave está con otro hash.
+- unchanged: mismo hash; el registro no se vuelve a escribir.
+- delete: el registro trae API_DELETED_FIELD verdadero o, en una descarga completa (sin
+  filtro incremental), la clave del índice no apareció. Se escribe en el flujo de
+  tombstones en lugar de los datos.
+
+El índice vive en S3 bajo raw/api/_cdc/{id del endpoint}/{shards}/, repartido en shards
+por hash de la clave. Cada shard guarda las claves ordenadas y un arreglo contiguo de
+hashes de 16 bytes (búsqueda binaria, sin un dict por registro) y se carga solo cuando
+aparece una clave que le corresponde. Los shards modificados se reemplazan con
+escrituras condicionales sobre su ETag; si otra ejecución cambió uno, se vuelve a leer y
+se aplican encima los cambios de esta ejecución.
+
+Cambiar el número de shards equivale a empezar con un índice vacío (todo es insert una vez).
+"""
+import base64
+import bisect
+import datetime
+import hashlib
+import json
+import logging
+
+from botocore.exceptions import ClientError
+
+from checkpoint import checkpoint_id
+from medical_analytics_runtime import storage
+from pagination import lookup
+
+logger = logging.getLogger()
+
+CDC_PREFIX = 'raw/api/_cdc'
+DEFAULT_SHARDS = 64
+DIGEST_SIZE = 16
+
+INSERT = 'insert'
+UPDATE = 'update'
+UNCHANGED = 'unchanged'
+DELETE = 'delete'
+
+# Intentos de guardar un shard cuando otra ejecución lo modificó
+MAX_SAVE_ATTEMPTS = 3
+
+
+class CdcConfig:
+    """
+    Clave de los registros y campos que intervienen en la detección de cambios.
+    """
+
+    def __init__(self, key_fields=(), ignore_fields=(), deleted_field=None, shards=DEFAULT_SHARDS):
+        """
+        Args:
+            key_fields (tuple): Campos (rutas con puntos) que identifican el registro; vacío desactiva el CDC
+            ignore_fields (tuple): Campos de primer nivel que no cuentan como cambio (p. ej. fechas de envío)
+            deleted_field (str, opcional): Campo que marca un registro como eliminado
+            shards (int): Número de shards del índice
+        """
+        self.key_fields = tuple(key_fields)
+        self.ignore_fields = frozenset(ignore_fields)
+        self.deleted_field = deleted_field
+        self.shards = shards
+
+    @classmethod
+    def from_env(cls, environ):
+        return cls(
+            key_fields=split_fields(environ.get('API_RECORD_KEY', '')),
+            ignore_fields=split_fields(environ.get('API_CDC_IGNORE_FIELDS', '')),
+            deleted_field=environ.get('API_DELETED_FIELD') or None,
+            shards=int(environ.get('API_CDC_SHARDS', str(DEFAULT_SHARDS)))
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.key_fields)
+
+    def record_key(self, record):
+        """
+        Clave del registro (valores de key_fields unidos por |), o None si le falta alguno.
+        """
+        if not isinstance(record, dict):
+            return None
+        values = [lookup(record, field) for field in self.key_fields]
+        if any(value is None or value == '' for value in values):
+            return None
+        return '|'.join(str(value) for value in values)
+
+    def content_hash(self, record):
+        """
+        Hash de 16 bytes del contenido (JSON canónico, sin los campos ignorados).
+        """
+        content = {k: v for k, v in record.items() if k not in self.ignore_fields}
+        canonical = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+        return hashlib.blake2b(canonical.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+    def is_deleted(self, record):
+        return bool(self.deleted_field and lookup(record, self.deleted_field))
+
+    def shard_of(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4).digest()
+        return int.from_bytes(digest, 'big') % self.shards
+
+
+class IndexShard:
+    """
+    Claves ordenadas y hashes contiguos de un shard, más los cambios de la ejecución.
+    """
+
+    def __init__(self, keys=None, digests=b'', etag=None):
+        self.keys = keys or []
+        self.digests = digests
+        self.etag = etag
+        self.changes = {}  # clave -> hash nuevo, o None si se eliminó
+        self.seen = set()
+
+    @classmethod
+    def decode(cls, body, etag):
+        data = json.loads(body)
+        return cls(data['keys'], base64.b64decode(data['digests']), etag)
+
+    def encode(self):
+        return json.dumps({
+            'keys': self.keys,
+            'digests': base64.b64encode(self.digests).decode('ascii')
+        }, ensure_ascii=False, separators=(',', ':'))
+
+    def get(self, key):
+        if key in self.changes:
+            return self.changes[key]
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.digests[position * DIGEST_SIZE:(position + 1) * DIGEST_SIZE]
+        return None
+
+    def stored_keys(self):
+        """
+        Claves presentes después de aplicar los cambios de la ejecución.
+        """
+        current = {key for key in self.keys if self.changes.get(key, True) is not None}
+        return current | {key for key, digest in self.changes.items() if digest is not None}
+
+    def merged(self):
+        """
+        Shard resultante de aplicar los cambios de la ejecución sobre el contenido leído de S3.
+        """
+        entries = {
+            key: self.digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] for i, key in enumerate(self.keys)
+        }
+        for key, digest in self.changes.items():
+            if digest is None:
+                entries.pop(key, None)
+            else:
+                entries[key] = digest
+        keys = sorted(entries)
+        return IndexShard(keys, b''.join(entries[key] for key in keys), self.etag)
+
+
+class ChangeIndex:
+    """
+    Índice de contenido de un endpoint, cargado por shard a demanda.
+    """
+
+    def __init__(self, client, bucket, endpoint, config, prefix=CDC_PREFIX):
+        """
+        Args:
+            client: Cliente S3 de boto3
+            bucket (str): Bucket de datos
+            endpoint (str): URL del endpoint (identifica el índice)
+            config (CdcConfig): Clave y campos del CDC
+            prefix (str): Prefijo de los índices
+        """
+        self.client = client
+        self.bucket = bucket
+        self.config = config
+        self.prefix = f"{prefix}/{checkpoint_id(endpoint)}/{config.shards}"
+        self.counts = {INSERT: 0, UPDATE: 0, UNCHANGED: 0, DELETE: 0}
+        self.tombstones = []
+        self.codec = storage.default_codec() if storage.default_codec() != 'none' else 'gzip'
+        self._shards = {}
+
+    def classify(self, records):
+        """
+        Clasifica una página y registra sus cambios en el índice.
+
+        Returns:
+            list: Registros nuevos o modificados (los eliminados van a self.tombstones)
+        """
+        deltas = []
+        for record in records:
+            key = self.config.record_key(record)
+            if key is None:
+                # Sin clave no hay con qué comparar: se escribe siempre
+                self.counts[INSERT] += 1
+                deltas.append(record)
+                continue
+            shard = self._shard(key)
+            shard.seen.add(key)
+            previous = shard.get(key)
+            if self.config.is_deleted(record):
+                if previous is not None:
+                    shard.changes[key] = None
+                    self._tombstone(key, 'deleted_field')
+                continue
+            digest = self.config.content_hash(record)
+            if previous == digest:
+                self.counts[UNCHANGED] += 1
+                continue
+            self.counts[UPDATE if previous is not None else INSERT] += 1
+            shard.changes[key] = digest
+            deltas.append(record)
+        return deltas
+
+    def sweep(self):
+        """
+        Después de una descarga completa: las claves del índice que no aparecieron se eliminan.
+        Carga todos los shards.
+        """
+        for number in range(self.config.shards):
+            shard = self._load_shard(number)
+            for key in sorted(shard.stored_keys() - shard.seen):
+                shard.changes[key] = None
+                self._tombstone(key, 'snapshot')
+
+    def save(self, tasks=None):
+        """
+        Guarda los shards con cambios (condicional sobre el ETag leído).
+
+        Args:
+            tasks (TaskGroup, opcional): Si se indica, cada shard se guarda como una tarea
+                del grupo (en paralelo); los errores se relanzan al esperar el grupo
+
+        Returns:
+            int: Shards con cambios
+
+        Raises:
+            ClientError: Si S3 rechaza la escritura por un motivo distinto a la condición
+        """
+        dirty = [number for number, shard in sorted(self._shards.items()) if shard.changes]
+        for number in dirty:
+            if tasks is None:
+                self._save_shard(number)
+            else:
+                tasks.submit(self._save_shard, number)
+        logger.info(f"Índice CDC: {len(dirty)} shards con cambios, {self.counts}")
+        return len(dirty)
+
+    def _save_shard(self, number):
+        shard = self._shards[number]
+        for _ in range(MAX_SAVE_ATTEMPTS):
+            body = shard.merged().encode().encode('utf-8')
+            condition = {'IfMatch': shard.etag} if shard.etag else {'IfNoneMatch': '*'}
+            try:
+                # Clave fija (sin extensión de códec) para que la escritura condicional siempre apunte al mismo objeto
+                self.client.put_object(
+                    Bucket=self.bucket,
+                    Key=self._shard_key(number),
+                    Body=storage.compress(body, self.codec),
+                    ContentType='application/json',
+                    ContentEncoding=self.codec,
+                    Metadata={'uncompressed-size': str(len(body))},
+                    **condition
+                )
+                return
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                    raise
+                logger.info(f"El shard {number} del índice CDC cambió durante la ejecución; se vuelve a leer")
+                fresh = self._read_shard(number)
+                fresh.changes = shard.changes
+                shard = self._shards[number] = fresh
+        raise RuntimeError(f"No se pudo guardar el shard {number} del índice CDC: cambia continuamente")
+
+    def _tombstone(self, key, reason):
+        self.counts[DELETE] += 1
+        self.tombstones.append({
+            'op': DELETE,
+            'key': key,
+            'key_fields': list(self.config.key_fields),
+            'reason': reason,
+            'detected_at': datetime.datetime.utcnow().isoformat()
+        })
+
+    def _shard(self, key):
+        return self._load_shard(self.config.shard_of(key))
+
+    def _load_shard(self, number):
+        shard = self._shards.get(number)
+        if shard is None:
+            shard = self._shards[number] = self._read_shard(number)
+        return shard
+
+    def _read_shard(self, number):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._shard_key(number))
+        except self.client.exceptions.NoSuchKey:
+            return IndexShard()
+        body = storage.decompress(response['Body'].read(), response.get('ContentEncoding'))
+        return IndexShard.decode(body, response['ETag'])
+
+    def _shard_key(self, number):
+        return f"{self.prefix}/shard-{number:04d}.json"
+
+
+def split_fields(value):
+    return tuple(field.strip() for field in value.split(',') if field.strip())
@@ -0,0 +1,248 @@
+"""
+Ingesta incremental con marca de agua (watermark) por endpoint.
+
+Las cuatro ejecuciones diarias descargaban el conjunto completo cada vez. Con
+API_WATERMARK_FIELD configurado, cada endpoint guarda en un objeto de checkpoint el
+valor más alto del campo de cambios visto (updated_at o una secuencia) y la siguiente
+ejecución solo pide los registros modificados desde entonces:
+
+- La consulta se hace desde la marca menos una ventana de solapamiento
+  (API_WATERMARK_OVERLAP), para recoger registros que llegan tarde con un valor
+  anterior a la marca. Los registros de la ventana pueden repetirse entre ejecuciones.
+- La marca avanza solo después de que los datos y sus metadatos quedaron escritos; si
+  la ejecución falla, la siguiente vuelve a pedir desde la marca anterior.
+- El checkpoint se reemplaza con una escritura condicional sobre su ETag: dos
+  ejecuciones simultáneas no pueden hacer retroceder la marca.
+
+El checkpoint guarda también los validadores HTTP (ETag, Last-Modified) de la última
+respuesta, para repetir la misma solicitud como condicional.
+"""
+import datetime
+import hashlib
+import json
+import logging
+
+from botocore.exceptions import ClientError
+
+from medical_analytics_runtime import storage
+from pagination import lookup
+
+logger = logging.getLogger()
+
+CHECKPOINT_PREFIX = 'raw/api/_checkpoints'
+WATERMARK_KINDS = ('timestamp', 'sequence')
+
+# Intentos de avanzar la marca cuando otra ejecución modificó el checkpoint
+MAX_ADVANCE_ATTEMPTS = 3
+
+
+class WatermarkConfig:
+    """
+    Campo de cambios de los registros y parámetro con el que la API filtra por él.
+    """
+
+    def __init__(self, field=None, param=None, kind='timestamp', overlap=0):
+        """
+        Args:
+            field (str): Campo de los registros con la marca (ruta con puntos); vacío desactiva la ingesta incremental
+            param (str): Parámetro de consulta que recibe la marca (p. ej. updated_since)
+            kind (str): timestamp (ISO 8601 o epoch) o sequence (entero creciente)
+            overlap (int): Ventana de solapamiento, en segundos para timestamp o en unidades para sequence
+        """
+        if kind not in WATERMARK_KINDS:
+            raise ValueError(f"Tipo de marca de agua no soportado: {kind}")
+        self.field = field
+        self.param = param
+        self.kind = kind
+        self.overlap = overlap
+
+    @classmethod
+    def from_env(cls, environ):
+        return cls(
+            field=environ.get('API_WATERMARK_FIELD') or None,
+            param=environ.get('API_WATERMARK_PARAM', 'updated_since'),
+            kind=environ.get('API_WATERMARK_TYPE', 'timestamp'),
+            overlap=int(environ.get('API_WATERMARK_OVERLAP', '0'))
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.field and self.param)
+
+    def request_params(self, watermark):
+        """
+        Parámetros de consulta para pedir los cambios desde la marca (menos el solapamiento).
+        Sin marca previa no se filtra: la primera ejecución descarga todo.
+        """
+        if watermark is None:
+            return {}
+        if self.kind == 'sequence':
+            return {self.param: max(int(watermark) - self.overlap, 0)}
+        since = parse_timestamp(watermark) - datetime.timedelta(seconds=self.overlap)
+        return {self.param: since.isoformat()}
+
+    def newest(self, records, current=None):
+        """
+        Marca más alta entre current y los registros de una página (los que no tienen el campo se ignoran).
+        """
+        newest = self.normalize(current) if current is not None else None
+        for record in records:
+            value = lookup(record, self.field) if isinstance(record, dict) else None
+            if value is None or value == '':
+                continue
+            try:
+                value = self.normalize(value)
+            except ValueError:
+                logger.warning(f"Valor de {self.field} no válido como marca de agua: {value!r}")
+                continue
+            if newest is None or self._key(value) > self._key(newest):
+                newest = value
+        return newest
+
+    def normalize(self, value):
+        """
+        Forma canónica de la marca: entero para sequence, ISO 8601 en UTC para timestamp.
+        """
+        if self.kind == 'sequence':
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Secuencia no válida: {value!r}")
+        return parse_timestamp(value).isoformat()
+
+    def is_after(self, value, other):
+        """
+        True si la marca value es posterior a other (o si no hay other).
+        """
+        return other is None or self._key(self.normalize(value)) > self._key(self.normalize(other))
+
+    def _key(self, value):
+        return value if self.kind == 'sequence' else parse_timestamp(value)
+
+
+class CheckpointStore:
+    """
+    Objeto de checkpoint de un endpoint en S3, reemplazado con escrituras condicionales.
+    """
+
+    def __init__(self, client, bucket, endpoint, config, prefix=CHECKPOINT_PREFIX):
+        """
+        Args:
+            client: Cliente S3 de boto3
+            bucket (str): Bucket de datos
+            endpoint (str): URL del endpoint (identifica el checkpoint)
+            config (WatermarkConfig): Campo y tipo de la marca
+            prefix (str): Prefijo de los checkpoints
+        """
+        self.client = client
+        self.bucket = bucket
+        self.endpoint = endpoint
+        self.config = config
+        self.key = f"{prefix}/{checkpoint_id(endpoint)}.json"
+        self._etag = None
+
+    def load(self):
+        """
+        Lee el checkpoint y recuerda su ETag para el reemplazo condicional.
+
+        Returns:
+            dict: Checkpoint, o None si el endpoint no tiene uno todavía
+        """
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key)
+        except self.client.exceptions.NoSuchKey:
+            self._etag = None
+            return None
+        self._etag = response['ETag']
+        return json.loads(response['Body'].read())
+
+    def watermark(self, checkpoint):
+        """
+        Marca de agua del checkpoint, o None si no tiene o se calculó sobre otro campo.
+        """
+        if not checkpoint or checkpoint.get('watermark') is None:
+            return None
+        if checkpoint.get('field') != self.config.field or checkpoint.get('kind') != self.config.kind:
+            # La marca se calculó sobre otro campo: no sirve para filtrar
+            logger.warning(f"El checkpoint {self.key} corresponde a otro campo; se descarga todo")
+            return None
+        return checkpoint['watermark']
+
+    def advance(self, watermark=None, validators=None, **details):
+        """
+        Guarda la nueva marca si es posterior a la del checkpoint, junto con los validadores
+        HTTP de la respuesta.
+
+        Args:
+            watermark: Marca más alta de los registros escritos (None deja la marca igual)
+            validators (dict, opcional): url, etag y last_modified para la próxima solicitud
+                condicional ({} los borra, None los deja igual)
+            **details: Datos de la ejecución que la produjo (request_id, s3_key, ...)
+
+        Returns:
+            bool: True si el checkpoint se actualizó
+
+        Raises:
+            ClientError: Si S3 rechaza la escritura por un motivo distinto a la condición
+        """
+        if watermark is None and validators is None:
+            return False
+        for _ in range(MAX_ADVANCE_ATTEMPTS):
+            current = self.load() or {}
+            current_watermark = self.watermark(current)
+            new_watermark = current_watermark
+            if watermark is not None and self.config.is_after(watermark, current_watermark):
+                new_watermark = self.config.normalize(watermark)
+            new_validators = current.get('validators') if validators is None else validators
+            if new_watermark == current_watermark and new_validators == current.get('validators'):
+                logger.info(f"El checkpoint {self.key} ya cubre la marca {watermark}")
+                return False
+
+            body = {
+                'endpoint': self.endpoint,
+                'field': self.config.field,
+                'kind': self.config.kind,
+                'watermark': new_watermark,
+                'validators': new_validators,
+                'updated_at': datetime.datetime.utcnow().isoformat(),
+                **details
+            }
+            # Solo si nadie cambió el checkpoint desde la lectura (o si aún no existe)
+            condition = {'IfMatch': self._etag} if self._etag else {'IfNoneMatch': '*'}
+            try:
+                storage.put_object(
+                    self.client, self.bucket, self.key, json.dumps(body), 'application/json', codec='none', **condition
+                )
+                logger.info(f"Checkpoint de {self.endpoint} actualizado (marca de agua {new_watermark})")
+                return True
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                    raise
+                logger.info(f"El checkpoint {self.key} cambió durante la ejecución; se vuelve a leer")
+        logger.warning(f"No se pudo actualizar el checkpoint de {self.endpoint}: cambia continuamente")
+        return False
+
+
+def checkpoint_id(endpoint):
+    """
+    Nombre estable del checkpoint de un endpoint (hash de la URL, sin parámetros de consulta).
+    """
+    return hashlib.sha256(endpoint.split('?')[0].rstrip('/').encode('utf-8')).hexdigest()[:16]
+
+
+def parse_timestamp(value):
+    """
+    Convierte una marca de tiempo ISO 8601 (con Z u offset) o epoch en segundos a datetime UTC.
+    Las fechas sin zona horaria se interpretan como UTC.
+    """
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+    try:
+        # fromisoformat de Python 3.9 no acepta el sufijo Z
+        parsed = datetime.datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Marca de tiempo no válida: {value!r}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc)
+
@@ -0,0 +1,208 @@
+"""
+Cliente HTTP de la API de origen.
+
+- Sesión persistente: build_session() crea una requests.Session con un pool de
+  conexiones que se conserva entre invocaciones calientes (sin un TCP+TLS nuevo por
+  solicitud).
+- Compresión: se anuncia Accept-Encoding con los códecs disponibles en la capa
+  (zstd, br, gzip) y el cuerpo se descomprime por bloques a medida que llega, en lugar
+  de delegarlo en urllib3 (que en la versión de la capa solo decodifica gzip/deflate).
+  Las respuestas NDJSON se parsean línea a línea sobre los bloques descomprimidos.
+- Solicitudes condicionales: read_page() devuelve ETag y Last-Modified de la respuesta;
+  quien llama los reenvía como If-None-Match / If-Modified-Since y una respuesta 304
+  se reporta como NotModified.
+"""
+import json
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+try:
+    import zstandard
+except ImportError:  # Capa sin zstandard: no se anuncia zstd
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # Capa sin brotli: no se anuncia br
+    brotli = None
+
+CHUNK_SIZE = 64 * 1024
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+
+class NotModified(Exception):
+    """La API respondió 304: el recurso no cambió desde la solicitud anterior."""
+
+
+class Page:
+    """
+    Respuesta de la API ya descomprimida y parseada (con la interfaz que usa pagination.iter_pages).
+    """
+
+    def __init__(self, url, status_code, headers, links, payload, wire_bytes):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.links = links
+        self.payload = payload
+        self.wire_bytes = wire_bytes  # Bytes recibidos por la red (comprimidos)
+
+    def json(self):
+        return self.payload
+
+    @property
+    def validators(self):
+        """
+        ETag y Last-Modified de la respuesta (los que existan).
+        """
+        return {
+            field: self.headers[header]
+            for field, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified'))
+            if self.headers.get(header)
+        }
+
+
+def accept_encoding():
+    """
+    Valor de Accept-Encoding con los códecs que se pueden descomprimir, en orden de preferencia.
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return ', '.join(encodings)
+
+
+def build_session(pool_size):
+    """
+    Sesión con pool de conexiones para pool_size solicitudes simultáneas al mismo host.
+    Los reintentos los maneja la política de reintentos, no urllib3.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 1), max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = accept_encoding()
+    return session
+
+
+def conditional_headers(validators):
+    """
+    Encabezados If-None-Match / If-Modified-Since a partir de los validadores guardados.
+    """
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def request_url(url, params):
+    """
+    URL completa (con parámetros de consulta) de una solicitud GET; identifica la solicitud condicional.
+    """
+    return requests.Request('GET', url, params=params).prepare().url
+
+
+def read_page(response):
+    """
+    Lee el cuerpo de una respuesta abierta con stream=True, descomprimiéndolo por bloques.
+
+    Args:
+        response (requests.Response): Respuesta exitosa o 304
+
+    Returns:
+        Page: Respuesta parseada
+
+    Raises:
+        NotModified: Si la respuesta es 304
+        requests.exceptions.ConnectionError, requests.exceptions.Timeout: Si la conexión se
+            corta o se agota el tiempo mientras se lee el cuerpo
+    """
+    try:
+        if response.status_code == 304:
+            raise NotModified(response.url)
+        counter = {'bytes': 0}
+        chunks = decode_chunks(
+            count_bytes(response.raw.stream(CHUNK_SIZE, decode_content=False), counter),
+            response.headers.get('Content-Encoding')
+        )
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        try:
+            payload = parse_ndjson(chunks) if content_type in NDJSON_TYPES else json.loads(b''.join(chunks))
+        except ReadTimeoutError as e:
+            raise requests.exceptions.Timeout(e)
+        except ProtocolError as e:
+            raise requests.exceptions.ConnectionError(e)
+        return Page(response.url, response.status_code, response.headers, response.links, payload, counter['bytes'])
+    finally:
+        # El cuerpo ya se leyó completo: la conexión vuelve al pool
+        response.close()
+
+
+def count_bytes(chunks, counter):
+    for chunk in chunks:
+        counter['bytes'] += len(chunk)
+        yield chunk
+
+
+def decode_chunks(chunks, encoding):
+    """
+    Descomprime los bloques del cuerpo según Content-Encoding (gzip, deflate, br, zstd o ninguno).
+    """
+    encoding = (encoding or 'identity').strip().lower()
+    if encoding == 'identity':
+        yield from chunks
+        return
+    decompressor = decompressor_for(encoding)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def decompressor_for(encoding):
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return zlib.decompressobj()
+    if encoding == 'zstd' and zstandard is not None:
+        return _FlushAdapter(zstandard.ZstdDecompressor().decompressobj().decompress)
+    if encoding == 'br' and brotli is not None:
+        return _FlushAdapter(brotli.Decompressor().process)
+    raise ValueError(f"Content-Encoding no soportado: {encoding}")
+
+
+class _FlushAdapter:
+    """
+    Interfaz decompress/flush de zlib para los descompresores de zstd y brotli.
+    """
+
+    def __init__(self, decompress):
+        self.decompress = decompress
+
+    def flush(self):
+        return b''
+
+
+def parse_ndjson(chunks):
+    """
+    Registros de un cuerpo NDJSON, parseados a medida que llegan los bloques.
+    """
+    records, pending = [], b''
+    for chunk in chunks:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        records.extend(json.loads(line) for line in lines if line.strip())
+    if pending.strip():
+        records.append(json.loads(pending))
+    return records
@@ -1,26 +1,93 @@
 import json
 import os
-import boto3
 import requests
 import logging
 import datetime
 import uuid
+import time
+import threading
 import traceback
+import contextlib
+from urllib.parse import urlparse
+
+import backfill
+from cdc import CdcConfig, ChangeIndex
+from checkpoint import CheckpointStore, WatermarkConfig
+from http_client import NotModified, build_session, conditional_headers, read_page, request_url
+from pagination import PaginationConfig, iter_pages
+from parquet_writer import PartitionedParquetWriter
+from medical_analytics_runtime import storage
+from medical_analytics_runtime.alerts import ErrorAggregator
+from medical_analytics_runtime.audit import AuditLogger
+from medical_analytics_runtime.background import BackgroundIO
+from medical_analytics_runtime.clients import lazy_client
+from medical_analytics_runtime.ratelimit import host_limiter
+from medical_analytics_runtime.resilience import (
+    CircuitBreaker, CircuitOpenError, RetryableError, RetryPolicy, parse_retry_after
+)
 
 # Configuración de logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Inicializar clientes de AWS
-s3 = boto3.client('s3')
-# Otros clientes se inicializan cuando se necesitan
+# Clientes de AWS perezosos: se crean en el primer uso y se reutilizan en el contenedor
+s3 = lazy_client('s3')
+
+# Auditoría con búfer: los registros se agrupan en Firehose en lugar de un objeto S3 por evento
+audit = AuditLogger.from_env('api_ingestion')
+# Notificaciones de error agregadas por huella (un resumen SNS por ventana)
+alerts = ErrorAggregator.from_env('api_ingestion')
+# Escrituras secundarias (metadatos, índice CDC) en paralelo, después de los datos
+background = BackgroundIO.from_env()
 
 # Configuración
 BUCKET_NAME = os.environ.get('BUCKET_NAME')
 API_ENDPOINT = os.environ.get('API_ENDPOINT')
 API_KEY = os.environ.get('API_KEY')  # API key hardcoded para desarrollo
-ERROR_TOPIC_ARN = os.environ.get('ERROR_TOPIC_ARN', '')
 MAX_RETRIES = 3
+API_CONNECT_TIMEOUT = float(os.environ.get('API_CONNECT_TIMEOUT', '5'))  # Una API caída se detecta sin esperar la lectura
+API_READ_TIMEOUT = float(os.environ.get('API_READ_TIMEOUT', '30'))
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Margen que se reserva para cerrar la carga multiparte y escribir los metadatos
+DEADLINE_MARGIN_SECONDS = 10
+RETRY_POLICY = RetryPolicy(
+    max_attempts=MAX_RETRIES,
+    base_delay=float(os.environ.get('API_RETRY_BASE_DELAY', '0.5')),
+    max_delay=float(os.environ.get('API_RETRY_MAX_DELAY', '20'))
+)
+PAGINATION = PaginationConfig.from_env(os.environ)
+WATERMARK = WatermarkConfig.from_env(os.environ)  # Sin API_WATERMARK_FIELD se descarga todo en cada ejecución
+CDC = CdcConfig.from_env(os.environ)  # Sin API_RECORD_KEY se escriben todos los registros recibidos
+MULTIPART_PART_SIZE = int(os.environ.get('MULTIPART_PART_SIZE', str(8 * 1024 * 1024)))
+UPLOAD_PARTS_IN_FLIGHT = 2  # Partes subiéndose mientras se descarga la página siguiente
+API_MAX_CONCURRENCY = int(os.environ.get('API_MAX_CONCURRENCY', '4'))  # Páginas descargándose a la vez (offset)
+API_RATE_LIMIT = float(os.environ.get('API_RATE_LIMIT', '0'))  # Solicitudes por segundo por host (0 = sin límite)
+API_RATE_BURST = int(os.environ.get('API_RATE_BURST', str(API_MAX_CONCURRENCY)))
+# Formatos de salida: el NDJSON crudo siempre; con "parquet" también Parquet particionado
+OUTPUT_FORMATS = [fmt.strip() for fmt in os.environ.get('API_OUTPUT_FORMATS', 'ndjson').split(',')]
+PARQUET_ENABLED = 'parquet' in OUTPUT_FORMATS
+API_SOURCE_NAME = os.environ.get('API_SOURCE_NAME', 'api')
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')
+PARQUET_TARGET_FILE_BYTES = int(os.environ.get('PARQUET_TARGET_FILE_MB', '128')) * 1024 * 1024
+PARQUET_ROW_GROUP_ROWS = int(os.environ.get('PARQUET_ROW_GROUP_ROWS', '100000'))
+# Backfill: parámetros con los que la API filtra un rango [desde, hasta) y tamaño de shard
+API_BACKFILL_SINCE_PARAM = os.environ.get('API_BACKFILL_SINCE_PARAM') or WATERMARK.param or 'updated_since'
+API_BACKFILL_UNTIL_PARAM = os.environ.get('API_BACKFILL_UNTIL_PARAM', 'updated_until')
+API_BACKFILL_SHARD_DAYS = float(os.environ.get('API_BACKFILL_SHARD_DAYS', str(backfill.DEFAULT_SHARD_DAYS)))
+
+# Sesión HTTP con pool de conexiones y compresión, reutilizada entre invocaciones calientes
+session = build_session(API_MAX_CONCURRENCY)
+
+# Circuit breaker de la API de origen: con la API caída las ejecuciones fallan de inmediato
+breaker = CircuitBreaker.from_env(f"api:{urlparse(API_ENDPOINT or '').netloc}")
+
+
+class ApiFetchError(Exception):
+    """La API respondió con un error que reintentar no corregiría (4xx)."""
+
+
+class ApiUnavailableError(ApiFetchError):
+    """La API no respondió correctamente después de los reintentos."""
 
 def handler(event, context):
     """
@@ -35,7 +102,54 @@ def handler(event, context):
         dict: Resultado de la ejecución
     """
     try:
-        logger.info(f"Iniciando proceso de ingesta desde API: {datetime.datetime.now()}")
+        return run_ingestion(event, context)
+    finally:
+        # Auditoría y errores se envían en segundo plano; esperar su entrega antes de congelar el contenedor
+        audit.flush()
+        alerts.flush()
+
+def backfill_handler(event, context):
+    """
+    Pasos de la máquina de estados de backfill (ver backfill.py), según event['action']:
+    - plan: {start, end, shard_days?, backfill_id?} -> shards pendientes
+    - ingest: {backfill_id, shard} -> resumen del shard (el error se relanza para que
+      Step Functions reintente)
+    - merge: salida de plan -> manifiesto combinado
+    
+    Args:
+        event (dict): Entrada del estado
+        context (LambdaContext): Contexto de ejecución de Lambda
+    
+    Returns:
+        dict: Salida del estado
+    """
+    try:
+        action = event.get('action')
+        if action == 'plan':
+            return plan_backfill(event)
+        if action == 'ingest':
+            return ingest_backfill_shard(event['backfill_id'], event['shard'], context)
+        if action == 'merge':
+            return merge_backfill(event)
+        raise ValueError(f"Acción de backfill no soportada: {action}")
+    finally:
+        audit.flush()
+        alerts.flush()
+
+def run_ingestion(event, context):
+    """
+    Ejecuta la ingesta: obtiene los datos de la API y los guarda en S3 junto con sus metadatos.
+    
+    Args:
+        event (dict): Evento de EventBridge
+        context (LambdaContext): Contexto de ejecución de Lambda
+    
+    Returns:
+        dict: Resultado de la ejecución
+    """
+    try:
+        started_at = datetime.datetime.now()
+        logger.info(f"Iniciando proceso de ingesta desde API: {started_at}")
         
         # Obtener la fecha actual para la partición
         today = datetime.datetime.now().strftime('%Y-%m-%d')
@@ -46,52 +160,100 @@ def handler(event, context):
         # En una implementación final esto vendría de Secrets Manager
         api_key = API_KEY
         
-        # Intentar obtener datos de la API con reintentos
-        data = fetch_api_data(api_key, MAX_RETRIES)
+        # Ingesta incremental: pedir solo los cambios desde la marca de agua del endpoint
+        checkpoint = CheckpointStore(s3, BUCKET_NAME, API_ENDPOINT, WATERMARK)
+        with background.group() as reads:
+            # El checkpoint (S3) se lee mientras se consulta el circuito (DynamoDB)
+            loading = reads.submit(checkpoint.load)
+            # Con el circuito abierto no se llama a la API (la excepción evita escribir un objeto vacío)
+            breaker.before_call()
+        previous = loading.result()
+        previous_watermark = checkpoint.watermark(previous) if WATERMARK.enabled else None
+        params = WATERMARK.request_params(previous_watermark) if WATERMARK.enabled else {}
+        if params:
+            logger.info(f"Ingesta incremental desde {params}")
+        # Captura de cambios: solo se escriben los registros nuevos o modificados
+        changes = ChangeIndex(s3, BUCKET_NAME, API_ENDPOINT, CDC) if CDC.enabled else None
         
-        if not data:
-            error_message = 'Error al obtener datos de la API después de reintentos'
-            notify_error(error_message, context.aws_request_id)
+        # Descargar las páginas y escribirlas como NDJSON comprimido en una carga multiparte
+        try:
+            result = ingest_pages(
+                api_key,
+                f"raw/api/{today}/{timestamp}_{request_id}_data.ndjson",
+                request_id,
+                context,
+                params,
+                validators=(previous or {}).get('validators'),
+                changes=changes
+            )
+        except NotModified:
+            # La API respondió 304 a la solicitud condicional: no hay nada que escribir
+            breaker.record_success()
+            logger.info("Los datos no cambiaron desde la ejecución anterior (304); no se escribe en S3")
+            log_activity(
+                action="api_ingestion_not_modified",
+                details={"api_endpoint": API_ENDPOINT},
+                request_id=request_id,
+                context=context
+            )
             return {
-                'statusCode': 500,
-                'body': json.dumps(error_message)
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Sin cambios desde la última ingesta', 'records_processed': 0})
             }
+        except ApiUnavailableError:
+            breaker.record_failure()
+            raise
+        except Exception:
+            # Error local (S3, datos) o rechazo 4xx: no indica que la API esté caída
+            breaker.release_probe()
+            raise
+        breaker.record_success()
+        s3_key, records, pages, watermark = result['s3_key'], result['records'], result['pages'], result['watermark']
         
-        # Construir ruta de destino en S3
-        s3_key = f"raw/api/{today}/{timestamp}_{request_id}_data.json"
-        
-        # Guardar datos en S3
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=s3_key,
-            Body=json.dumps(data),
-            ContentType='application/json',
-            Metadata={
-                'request-id': request_id,
-                'lambda-request-id': context.aws_request_id,
-                'source': 'api-ingestion'
-            }
-        )
-        
-        logger.info(f"Datos guardados exitosamente en s3://{BUCKET_NAME}/{s3_key}")
+        if s3_key:
+            logger.info(f"Datos guardados exitosamente en s3://{BUCKET_NAME}/{s3_key} ({records} registros, {pages} páginas)")
+        else:
+            logger.info(f"Ningún registro nuevo o modificado ({records} registros, {pages} páginas)")
         
         # Registrar metadatos de la ejecución
         metadata = {
-            'timestamp_inicio': datetime.datetime.now().isoformat(),
+            'timestamp_inicio': started_at.isoformat(),
             'timestamp_fin': datetime.datetime.now().isoformat(),
-            'registros_procesados': len(data) if isinstance(data, list) else 1,
+            'registros_procesados': records,
+            'paginas': pages,
+            'bytes_recibidos': result['wire_bytes'],
+            'parquet': result['parquet_keys'],
+            'cdc': changes.counts if changes is not None else None,
+            'tombstones': result['tombstones_key'],
+            'watermark_anterior': previous_watermark,
+            'watermark': watermark if watermark is not None else previous_watermark,
             'errores': 0,
             'request_id': request_id,
             'lambda_request_id': context.aws_request_id,
             'api_endpoint': API_ENDPOINT  # No incluir la API key por seguridad
         }
         
-        # Guardar metadatos en S3
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=f"raw/api/{today}/{timestamp}_{request_id}_metadata.json",
-            Body=json.dumps(metadata),
-            ContentType='application/json'
+        # Metadatos e índice CDC a la vez (los datos y los tombstones ya están escritos);
+        # el bloque espera ambas escrituras y relanza el primer error
+        with background.group() as side_writes:
+            side_writes.submit(
+                storage.put_object,
+                s3,
+                BUCKET_NAME,
+                f"raw/api/{today}/{timestamp}_{request_id}_metadata.json",
+                json.dumps(metadata),
+                'application/json'
+            )
+            if changes is not None:
+                changes.save(side_writes)
+        
+        # La marca y los validadores HTTP avanzan solo con los datos y sus metadatos ya escritos
+        checkpoint.advance(
+            watermark if WATERMARK.enabled else None,
+            validators=result['validators'],
+            request_id=request_id,
+            s3_key=s3_key,
+            records=records
         )
         
         # Registrar actividad para auditoría
@@ -99,7 +261,8 @@ def handler(event, context):
             action="api_ingestion_success",
             details={
                 "records_processed": metadata['registros_procesados'],
-                "s3_location": f"s3://{BUCKET_NAME}/{s3_key}"
+                "s3_location": f"s3://{BUCKET_NAME}/{s3_key}" if s3_key else None,
+                "cdc": metadata['cdc']
             },
             request_id=request_id,
             context=context
@@ -110,10 +273,30 @@ def handler(event, context):
             'body': json.dumps({
                 'message': 'Ingesta completada exitosamente',
                 'records_processed': metadata['registros_procesados'],
-                's3_location': f"s3://{BUCKET_NAME}/{s3_key}"
+                's3_location': f"s3://{BUCKET_NAME}/{s3_key}" if s3_key else None,
+                'changes': metadata['cdc']
             })
         }
-    
+
+    except CircuitOpenError as e:
+        # La API falló en ejecuciones recientes: no se la vuelve a llamar hasta que venza el plazo
+        logger.warning(str(e))
+        notify_error(str(e), context.aws_request_id, error_type='CircuitOpenError')
+        log_activity(
+            action="api_ingestion_skipped",
+            details={"reason": str(e)},
+            request_id=str(uuid.uuid4()),
+            context=context
+        )
+        return {
+            'statusCode': 503,
+            'body': json.dumps({
+                'message': f'Error: {e}',
+                'type': 'CircuitOpenError',
+                'request_id': context.aws_request_id
+            })
+        }
+
     except Exception as e:
         # Capturar detalles del error
         error_type = type(e).__name__
@@ -124,7 +307,7 @@ def handler(event, context):
         logger.error(f"Stack trace: {stack_trace}")
         
         # Notificar el error
-        notify_error(f"{error_type}: {error_message}", context.aws_request_id, stack_trace)
+        notify_error(error_message, context.aws_request_id, stack_trace, error_type=error_type)
         
         # Registrar actividad de error
         log_activity(
@@ -146,6 +329,100 @@ def handler(event, context):
             })
         }
 
+def plan_backfill(event):
+    """
+    Divide el rango del backfill en shards y omite los que ya tienen manifiesto.
+    Desde Step Functions la entrada de la ejecución llega en event['input'] y el
+    backfill_id por defecto es el nombre de la ejecución.
+    """
+    request = {**event, **(event.get('input') or {})}
+    backfill_id = request.get('backfill_id') or event.get('execution_name') or str(uuid.uuid4())
+    shard_days = float(request.get('shard_days') or API_BACKFILL_SHARD_DAYS)
+    plan = backfill.plan_shards(request['start'], request['end'], shard_days)
+    completed = backfill.completed_shards(s3, BUCKET_NAME, backfill_id)
+    pending = [shard for shard in plan if shard['shard_id'] not in completed]
+    logger.info(f"Backfill {backfill_id}: {len(plan)} shards, {len(pending)} pendientes")
+    return {
+        'backfill_id': backfill_id,
+        'start': request['start'],
+        'end': request['end'],
+        'shard_days': shard_days,
+        'shards_total': len(plan),
+        'shards': pending
+    }
+
+def ingest_backfill_shard(backfill_id, shard, context):
+    """
+    Descarga el rango de un shard y guarda sus datos y su manifiesto. No toca el
+    checkpoint ni el índice CDC de la ingesta programada.
+    
+    Raises:
+        CircuitOpenError, ApiUnavailableError: Step Functions reintenta el shard
+        ApiFetchError: La API rechazó la solicitud (4xx); no se reintenta y el shard queda fallido
+    """
+    request_id = f"{backfill_id}-{shard['shard_id']}"
+    params = {API_BACKFILL_SINCE_PARAM: shard['start'], API_BACKFILL_UNTIL_PARAM: shard['end']}
+    logger.info(f"Backfill {backfill_id}, shard {shard['shard_id']}: {params}")
+    
+    breaker.before_call()
+    try:
+        result = ingest_pages(API_KEY, backfill.shard_data_key(backfill_id, shard['shard_id']), request_id, context, params)
+    except ApiUnavailableError:
+        breaker.record_failure()
+        raise
+    except Exception:
+        # Error local (S3, datos) o rechazo 4xx: no indica que la API esté caída
+        breaker.release_probe()
+        raise
+    breaker.record_success()
+    
+    backfill.write_shard_manifest(s3, BUCKET_NAME, backfill_id, shard, result)
+    log_activity(
+        action="api_backfill_shard",
+        details={"backfill_id": backfill_id, "shard": shard, "records_processed": result['records']},
+        request_id=request_id,
+        context=context
+    )
+    return {'shard_id': shard['shard_id'], 'status': 'succeeded', 'records': result['records']}
+
+def merge_backfill(event):
+    """
+    Combina los manifiestos de los shards y guarda el manifiesto del backfill.
+    
+    Returns:
+        dict: Resumen (sin las listas de objetos) con status y missing_shards
+    """
+    backfill_id = event['backfill_id']
+    plan = backfill.plan_shards(event['start'], event['end'], float(event['shard_days']))
+    completed = backfill.completed_shards(s3, BUCKET_NAME, backfill_id)
+    
+    # Los manifiestos de los shards se leen en paralelo
+    with background.group() as reads:
+        loading = {
+            shard_id: reads.submit(storage.get_object, s3, BUCKET_NAME, backfill.shard_manifest_key(backfill_id, shard_id))
+            for shard_id in sorted(completed)
+        }
+    manifests = {shard_id: json.loads(future.result()) for shard_id, future in loading.items()}
+    
+    manifest = backfill.merge_manifests(backfill_id, plan, manifests)
+    storage.put_object(
+        s3, BUCKET_NAME, f"{backfill.BACKFILL_PREFIX}/{backfill_id}/manifest.json", json.dumps(manifest), 'application/json'
+    )
+    logger.info(
+        f"Backfill {backfill_id} {manifest['status']}: {manifest['shards_completed']}/{manifest['shards_total']} shards, "
+        f"{manifest['records']} registros"
+    )
+    if manifest['missing_shards']:
+        notify_error(
+            f"Backfill {backfill_id} incompleto: faltan {len(manifest['missing_shards'])} shards",
+            backfill_id,
+            error_type='BackfillIncomplete'
+        )
+    return {
+        key: manifest[key]
+        for key in ('backfill_id', 'status', 'shards_total', 'shards_completed', 'missing_shards', 'records')
+    }
+
 # def get_api_key_from_secret():
 #     """
 #     Código comentado: la opción de usar Secrets Manager ha sido removida
@@ -153,80 +430,234 @@ def handler(event, context):
 #     """
 #     pass
 
-def fetch_api_data(api_key, max_retries):
+def ingest_pages(api_key, s3_key, request_id, context, params=None, validators=None, changes=None):
     """
-    Obtiene datos de la API con reintentos en caso de fallo.
+    Recorre las páginas de la API y escribe sus registros como NDJSON en S3.
+    Con paginación offset hasta API_MAX_CONCURRENCY páginas se descargan en paralelo
+    (respetando API_RATE_LIMIT por host) y se escriben en orden; con link/cursor la
+    descarga es secuencial y solo se adelanta la página siguiente. Cada página se serializa y se comprime en cuanto
+    llega; las partes completas se suben en segundo plano, por lo que la memoria queda
+    acotada por el tamaño de página y de parte, no por el total de registros.
+    
+    Con un índice CDC solo se escriben los registros nuevos o modificados, y las
+    eliminaciones van a un objeto de tombstones aparte. Los objetos de salida se crean con
+    el primer registro a escribir: una ejecución sin cambios no deja objetos de datos.
     
     Args:
         api_key (str): API key para autenticación
-        max_retries (int): Número máximo de reintentos
+        s3_key (str): Clave de destino sin la extensión de compresión
+        request_id (str): ID de la solicitud
+        context (LambdaContext): Contexto de Lambda
+        params (dict, opcional): Parámetros de consulta de la primera página (filtro incremental)
+        validators (dict, opcional): url, etag y last_modified de la ejecución anterior; la
+            solicitud a esa misma URL se hace condicional
+        changes (ChangeIndex, opcional): Índice CDC del endpoint (se guarda después, en run_ingestion)
     
     Returns:
-        dict/list: Datos obtenidos de la API
+        dict: s3_key (None si no hubo nada que escribir), records (recibidos), pages,
+            watermark (o None), wire_bytes, parquet_keys, tombstones_key (o None) y
+            validators para la próxima ejecución ({} si el resultado tuvo más de una página)
+    
+    Raises:
+        NotModified: Si la API responde 304 (la carga multiparte se aborta sin escribir)
     """
     headers = {
         'Authorization': f'Bearer {api_key}',
-        'Content-Type': 'application/json',
+        'Accept': 'application/json',
         'User-Agent': 'Medical-Analytics-Ingestion/1.0'
     }
+    records = pages = 0
+    watermark = None
+    deadline = request_deadline(context)
+    # Resumen de las respuestas (desde varios hilos); las páginas no se conservan después de escribirlas
+    fetched = {'responses': 0, 'wire_bytes': 0, 'first': None}
+    fetched_lock = threading.Lock()
+    
+    def fetch(url, page_params):
+        page_url = request_url(url, page_params)
+        page_headers = headers
+        if validators and validators.get('url') == page_url:
+            page_headers = {**headers, **conditional_headers(validators)}
+        page = fetch_page(url, page_params, page_headers, deadline)
+        with fetched_lock:
+            fetched['responses'] += 1
+            fetched['wire_bytes'] += page.wire_bytes
+            if fetched['first'] is None:
+                fetched['first'] = (page_url, page.validators)
+        return page
+    
+    writer = parquet = None
+    # Al salir se cierran los escritores abiertos (o se abortan si hubo un error)
+    with contextlib.ExitStack() as outputs:
+        for page in iter_pages(fetch, API_ENDPOINT, PAGINATION, params, max_concurrency=API_MAX_CONCURRENCY):
+            records += len(page)
+            pages += 1
+            if WATERMARK.enabled:
+                watermark = WATERMARK.newest(page, watermark)
+            if changes is not None:
+                page = changes.classify(page)
+            if not page:
+                continue
+            if writer is None:
+                # El Parquet entra primero: el ExitStack cierra en orden inverso, así el NDJSON
+                # se completa antes de subir los últimos Parquet y, si falla, el Parquet se
+                # aborta y elimina los archivos que ya había subido
+                parquet = outputs.enter_context(open_parquet_writer(s3_key, request_id))
+                writer = outputs.enter_context(storage.open_writer(
+                    s3,
+                    BUCKET_NAME,
+                    s3_key,
+                    'application/x-ndjson',
+                    metadata={
+                        'request-id': request_id,
+                        'lambda-request-id': context.aws_request_id,
+                        'source': 'api-ingestion'
+                    },
+                    part_size=MULTIPART_PART_SIZE,
+                    max_in_flight=UPLOAD_PARTS_IN_FLIGHT
+                ))
+            writer.write(encode_ndjson(page))
+            if parquet is not None:
+                parquet.write(page)
+            # Ya escrita: no retener la página mientras se descarga la siguiente
+            del page
+    
+    tombstones_key = None
+    if changes is not None:
+        # Solo una descarga completa (sin filtro incremental ni tope de páginas) revela eliminaciones
+        if not params and pages < PAGINATION.max_pages:
+            changes.sweep()
+        if changes.tombstones:
+            tombstones_key = storage.put_object(
+                s3,
+                BUCKET_NAME,
+                s3_key.replace('_data.ndjson', '_tombstones.ndjson'),
+                encode_ndjson([{**tombstone, 'request_id': request_id} for tombstone in changes.tombstones]),
+                'application/x-ndjson',
+                metadata={'request-id': request_id, 'source': 'api-ingestion'}
+            )
+    
+    # Un 304 solo garantiza que no hubo cambios si el conjunto completo vino en una respuesta
+    next_validators = {}
+    if fetched['responses'] == 1 and fetched['first'][1]:
+        next_validators = {'url': fetched['first'][0], **fetched['first'][1]}
+    return {
+        's3_key': writer.key if writer is not None else None,
+        'records': records,
+        'pages': pages,
+        'watermark': watermark,
+        'wire_bytes': fetched['wire_bytes'],
+        'parquet_keys': parquet.keys if parquet is not None else [],
+        'tombstones_key': tombstones_key,
+        'validators': next_validators
+    }
+
+def open_parquet_writer(s3_key, request_id):
+    """
+    Escritor Parquet particionado de la ejecución, o un contexto vacío si la salida Parquet
+    no está habilitada. Los archivos se nombran como el NDJSON de la misma ejecución.
+    """
+    if not PARQUET_ENABLED:
+        return contextlib.nullcontext()
+    return PartitionedParquetWriter(
+        s3,
+        BUCKET_NAME,
+        API_SOURCE_NAME,
+        os.path.basename(s3_key).split('.')[0],
+        request_id,
+        datetime.datetime.utcnow(),
+        target_file_bytes=PARQUET_TARGET_FILE_BYTES,
+        row_group_rows=PARQUET_ROW_GROUP_ROWS,
+        compression=PARQUET_COMPRESSION
+    )
+
+def fetch_page(url, params, headers, deadline=None):
+    """
+    Obtiene una página de la API. Los errores de conexión, los timeouts y las respuestas
+    429/5xx se reintentan con backoff exponencial y jitter (respetando Retry-After); los
+    demás errores HTTP no se reintentan.
+    
+    Args:
+        url (str): URL de la página
+        params (dict): Parámetros de consulta (None si la URL ya los incluye)
+        headers (dict): Encabezados de la solicitud
+        deadline (float, opcional): Instante (time.monotonic) después del cual no se reintenta
     
-    for attempt in range(max_retries):
+    Returns:
+        Page: Respuesta exitosa, descomprimida y parseada
+    
+    Raises:
+        NotModified: Si la solicitud era condicional y la API respondió 304
+        ApiUnavailableError: Si se agotan los reintentos
+        ApiFetchError: Si la API rechaza la solicitud
+    """
+    def attempt():
+        logger.info(f"Solicitando {url}")
+        host_limiter(url, API_RATE_LIMIT, API_RATE_BURST).acquire()
         try:
-            logger.info(f"Intento {attempt + 1} de {max_retries} para obtener datos de la API")
-            response = requests.get(API_ENDPOINT, headers=headers, timeout=30)
+            response = session.get(
+                url, params=params, headers=headers, timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT), stream=True
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise RetryableError(str(e))
+        if response.status_code in RETRY_STATUS_CODES:
+            response.close()
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            raise RetryableError(f"HTTP {response.status_code}", retry_after=retry_after)
+        if response.status_code >= 400:
+            response.close()
             response.raise_for_status()  # Levantar excepción si hay error HTTP
-            
-            return response.json()
-        
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Error en intento {attempt + 1}: {str(e)}")
-            if attempt == max_retries - 1:
-                logger.error(f"Se agotaron los reintentos. Último error: {str(e)}")
-                return None
+        try:
+            # El cuerpo se descomprime mientras se recibe; un 304 se reporta como NotModified
+            return read_page(response)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise RetryableError(f"Respuesta interrumpida: {e}")
     
-    return None
+    try:
+        return RETRY_POLICY.run(attempt, deadline=deadline)
+    except RetryableError as e:
+        logger.error(f"Se agotaron los reintentos. Último error: {str(e)}")
+        raise ApiUnavailableError(f"Error al obtener datos de la API después de reintentos: {e}")
+    except requests.exceptions.RequestException as e:
+        raise ApiFetchError(f"La API rechazó la solicitud: {e}")
+
+def request_deadline(context):
+    """
+    Instante (time.monotonic) hasta el que se puede reintentar sin agotar el timeout de la Lambda.
+    """
+    get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if get_remaining is None:
+        return None
+    return time.monotonic() + get_remaining() / 1000 - DEADLINE_MARGIN_SECONDS
 
-def notify_error(error_message, request_id, stack_trace=None):
+def encode_ndjson(records):
     """
-    Notifica un error a través de SNS.
+    Serializa una página de registros como NDJSON (un objeto JSON por línea).
+    """
+    return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+
+def notify_error(error_message, request_id, stack_trace=None, error_type='IngestionError'):
+    """
+    Reporta un error al agregador. Si la API de origen cae, las ejecuciones
+    programadas generan un solo resumen SNS por ventana en lugar de uno por fallo.
     
     Args:
         error_message (str): Mensaje de error
         request_id (str): ID de la solicitud
         stack_trace (str, opcional): Traza de la pila de ejecución
+        error_type (str, opcional): Tipo del error para agrupar las notificaciones
     """
-    if not ERROR_TOPIC_ARN:
-        logger.warning("No se ha configurado ERROR_TOPIC_ARN. No se enviará notificación.")
-        return
-    
-    try:
-        # Inicializar cliente de SNS cuando se necesita
-        sns = boto3.client('sns')
-        
-        message = {
-            "error": error_message,
-            "timestamp": datetime.datetime.now().isoformat(),
-            "component": "api_ingestion_lambda",
-            "request_id": request_id
-        }
-        
-        if stack_trace:
-            message["stack_trace"] = stack_trace
-        
-        sns.publish(
-            TopicArn=ERROR_TOPIC_ARN,
-            Subject=f"Error en ingesta de API - {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            Message=json.dumps(message, indent=2)
-        )
-        
-        logger.info(f"Notificación de error enviada a {ERROR_TOPIC_ARN}")
-    
-    except Exception as e:
-        logger.error(f"Error al enviar notificación: {str(e)}")
+    alerts.report(
+        error_type,
+        error_message,
+        stack_trace=stack_trace,
+        request_id=request_id,
+        api_endpoint=API_ENDPOINT
+    )
 
 def log_activity(action, details, request_id, context):
     """
-    Registra actividad en S3 para auditoría.
+    Registra actividad en el log de auditoría con búfer (Firehose), sin bloquear la ejecución.
     
     Args:
         action (str): Tipo de acción realizada
@@ -235,24 +666,13 @@ def log_activity(action, details, request_id, context):
         context (LambdaContext): Contexto de Lambda
     """
     try:
-        today = datetime.datetime.now().strftime('%Y-%m-%d')
-        
-        activity_log = {
-            "timestamp": datetime.datetime.now().isoformat(),
-            "action": action,
-            "lambda_name": context.function_name,
-            "lambda_version": context.function_version,
-            "lambda_request_id": context.aws_request_id,
-            "request_id": request_id,
-            "details": details
-        }
-        
-        # Guardar log en S3
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=f"activity_logs/{today}/api_ingestion/{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{request_id}.json",
-            Body=json.dumps(activity_log),
-            ContentType='application/json'
+        audit.emit(
+            action,
+            lambda_name=context.function_name,
+            lambda_version=context.function_version,
+            lambda_request_id=context.aws_request_id,
+            request_id=request_id,
+            details=details
         )
         
     except Exception as e:
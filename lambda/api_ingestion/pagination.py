@@ -0,0 +1,207 @@
+"""
+Paginación de la API del cliente.
+
+La API puede paginar de tres formas y iter_pages() las recorre todas igual,
+generando los registros de una página a la vez (la memoria depende del tamaño de
+página y no del total):
+- link: encabezado Link con rel="next" (RFC 8288).
+- cursor: el cuerpo incluye el cursor de la página siguiente (p. ej. "next_cursor").
+- offset: parámetros offset/limit; termina con la primera página incompleta.
+En modo auto se sigue el encabezado Link si existe y, si no, el cursor del cuerpo.
+
+Con max_concurrency > 1 la descarga se solapa con el procesamiento:
+- offset: las URL de las páginas se conocen de antemano, así que se piden hasta
+  max_concurrency páginas en paralelo; se entregan en orden y, al llegar la primera
+  página incompleta, se descartan las posteriores ya pedidas.
+- link/cursor: cada página depende de la anterior, así que la descarga es secuencial
+  por naturaleza: la siguiente se pide en segundo plano en cuanto se conoce su cursor,
+  mientras se procesa la actual (una página de adelanto, sea cual sea max_concurrency).
+La memoria queda acotada por max_concurrency páginas (dos con link/cursor).
+"""
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger()
+
+PAGINATION_MODES = ('auto', 'link', 'cursor', 'offset', 'none')
+
+# Campos en los que suelen venir los registros cuando la respuesta es un objeto
+RECORD_FIELDS = ('data', 'results', 'items', 'records')
+
+# Límite de seguridad ante un cursor que nunca termina
+DEFAULT_MAX_PAGES = 10000
+
+
+class PaginationConfig:
+    """
+    Parámetros de paginación de un endpoint.
+    """
+
+    def __init__(self, mode='auto', page_size=1000, records_field=None, cursor_field='next_cursor',
+                 cursor_param='cursor', offset_param='offset', limit_param='limit', max_pages=DEFAULT_MAX_PAGES):
+        if mode not in PAGINATION_MODES:
+            raise ValueError(f"Modo de paginación no soportado: {mode}")
+        self.mode = mode
+        self.page_size = page_size
+        self.records_field = records_field
+        self.cursor_field = cursor_field
+        self.cursor_param = cursor_param
+        self.offset_param = offset_param
+        self.limit_param = limit_param
+        self.max_pages = max_pages
+
+    @classmethod
+    def from_env(cls, environ):
+        return cls(
+            mode=environ.get('API_PAGINATION', 'auto'),
+            page_size=int(environ.get('API_PAGE_SIZE', '1000')),
+            records_field=environ.get('API_RECORDS_FIELD') or None,
+            cursor_field=environ.get('API_CURSOR_FIELD', 'next_cursor'),
+            cursor_param=environ.get('API_CURSOR_PARAM', 'cursor'),
+            offset_param=environ.get('API_OFFSET_PARAM', 'offset'),
+            limit_param=environ.get('API_LIMIT_PARAM', 'limit'),
+            max_pages=int(environ.get('API_MAX_PAGES', str(DEFAULT_MAX_PAGES)))
+        )
+
+
+def iter_pages(fetch_page, endpoint, config, params=None, max_concurrency=1):
+    """
+    Recorre las páginas del endpoint.
+
+    Args:
+        fetch_page (callable): Recibe (url, params) y devuelve la respuesta HTTP
+            (con .json() y .links, como requests.Response); debe ser seguro entre hilos
+            si max_concurrency > 1
+        endpoint (str): URL de la primera página
+        config (PaginationConfig): Estilo de paginación
+        params (dict, opcional): Parámetros de consulta comunes a todas las páginas
+        max_concurrency (int): Solicitudes simultáneas como máximo (1 = secuencial); con
+            link/cursor cualquier valor > 1 equivale a una página de adelanto
+
+    Yields:
+        list: Registros de cada página, en orden
+    """
+    params = dict(params or {})
+    if config.mode in ('cursor', 'offset'):
+        params[config.limit_param] = config.page_size
+    if config.mode == 'offset':
+        params[config.offset_param] = 0
+        if max_concurrency > 1:
+            return _iter_offset_pages(fetch_page, endpoint, config, params, max_concurrency)
+    return _iter_linked_pages(fetch_page, endpoint, config, params, prefetch=max_concurrency > 1)
+
+
+def _iter_linked_pages(fetch_page, endpoint, config, params, prefetch):
+    """
+    Páginas en las que la solicitud siguiente depende de la respuesta actual.
+    Con prefetch, la siguiente página se descarga mientras quien consume procesa la actual.
+    Un solo hilo basta: la URL de la página n+2 solo se conoce al llegar la n+1, por lo
+    que no puede haber más de una solicitud en curso.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='api-pages') if prefetch else None
+
+    def submit(url, page_params):
+        if executor is not None:
+            return executor.submit(fetch_page, url, page_params)
+        future = Future()
+        future.set_result(fetch_page(url, page_params))
+        return future
+
+    seen_cursors = set()
+    request = (endpoint, params)
+    pending = submit(*request)
+    try:
+        for page_number in range(1, config.max_pages + 1):
+            response = pending.result()
+            payload = response.json()
+            records = extract_records(payload, config.records_field)
+            request = _next_request(config, response, payload, records, request, seen_cursors, page_number)
+            pending = submit(*request) if request and page_number < config.max_pages else None
+            yield records
+            if request is None:
+                return
+        logger.warning(f"Se alcanzó el límite de {config.max_pages} páginas")
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _next_request(config, response, payload, records, request, seen_cursors, page_number):
+    """
+    (url, params) de la página siguiente, o None si la actual es la última.
+    """
+    url, params = request
+    next_link = (getattr(response, 'links', None) or {}).get('next', {}).get('url')
+    cursor = lookup(payload, config.cursor_field) if isinstance(payload, dict) else None
+
+    if config.mode == 'link' or (config.mode == 'auto' and next_link):
+        # La URL del encabezado Link ya incluye sus parámetros de consulta
+        return (next_link, None) if next_link else None
+    if config.mode in ('cursor', 'auto') and cursor:
+        if cursor in seen_cursors:
+            logger.warning(f"Cursor repetido en la página {page_number}; se detiene la paginación")
+            return None
+        seen_cursors.add(cursor)
+        return url, {**(params or {}), config.cursor_param: cursor}
+    if config.mode == 'offset' and len(records) >= config.page_size:
+        return url, {**params, config.offset_param: params[config.offset_param] + len(records)}
+    return None
+
+
+def _iter_offset_pages(fetch_page, endpoint, config, params, max_concurrency):
+    """
+    Páginas offset/limit pedidas en paralelo (hasta max_concurrency en curso) y entregadas en orden.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='api-pages')
+    pending = deque()
+    submitted = 0
+    try:
+        for page_number in range(1, config.max_pages + 1):
+            while len(pending) < max_concurrency and submitted < config.max_pages:
+                offset = params[config.offset_param] + submitted * config.page_size
+                pending.append(executor.submit(fetch_page, endpoint, {**params, config.offset_param: offset}))
+                submitted += 1
+
+            records = extract_records(pending.popleft().result().json(), config.records_field)
+            if len(records) > config.page_size:
+                # Las páginas siguientes se pidieron suponiendo page_size registros por página
+                raise ValueError(
+                    f"La API devolvió {len(records)} registros con {config.limit_param}={config.page_size}; "
+                    "no se puede paginar en paralelo"
+                )
+            yield records
+            if len(records) < config.page_size:
+                return
+        logger.warning(f"Se alcanzó el límite de {config.max_pages} páginas")
+    finally:
+        # Las páginas posteriores a la última ya pedidas se descartan
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_records(payload, records_field=None):
+    """
+    Registros de una página: la lista misma, el campo configurado o el primer campo conocido.
+    """
+    if isinstance(payload, list):
+        return payload
+    if not isinstance(payload, dict):
+        return [payload]
+    if records_field:
+        return lookup(payload, records_field) or []
+    for field in RECORD_FIELDS:
+        if isinstance(payload.get(field), list):
+            return payload[field]
+    return [payload]
+
+
+def lookup(payload, path):
+    """
+    Valor de un campo con ruta separada por puntos ("meta.next_cursor"), o None.
+    """
+    value = payload
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
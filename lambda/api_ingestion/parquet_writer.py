@@ -0,0 +1,247 @@
+"""
+Salida Parquet particionada de los registros de la API.
+
+Además del NDJSON de cada ejecución, los registros se escriben como Parquet bajo
+raw/parquet/source={SOURCE}/year={YYYY}/month={MM}/day={DD}/ (particiones Hive que
+Athena y Glue podan por ruta):
+
+- Esquema estable: las columnas y sus tipos salen de RECORD_CONTRACT (el contrato de la
+  API), no de los registros de cada ejecución. Los valores que no se pueden convertir
+  quedan nulos y los campos que el contrato no conoce se guardan como JSON en "extra".
+- Tamaño de archivo: las páginas se acumulan como RecordBatch (columnares, compactos)
+  hasta completar un row group; cada archivo se cierra y se sube al superar
+  target_file_bytes, de modo que Athena/Glue reparten archivos de tamaño similar.
+- Estadísticas: cada row group se ordena por fecha y se escribe con min/max y conteo de
+  nulos por columna, para que las consultas descarten row groups sin leerlos.
+
+pyarrow viene en la capa de pandas y se importa solo al crear el primer escritor.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from checkpoint import parse_timestamp
+
+logger = logging.getLogger()
+
+# Contrato de la API del cliente: campo -> tipo en Parquet
+RECORD_CONTRACT = (
+    ('id', 'int64'),
+    ('numdoc_paciente', 'string'),
+    ('nombre_paciente', 'string'),
+    ('fecha_folio', 'timestamp'),
+    ('diagnostico', 'string'),
+    ('presion_sistolica', 'float64'),
+    ('presion_diastolica', 'float64'),
+    ('updated_at', 'timestamp'),
+)
+# Columnas agregadas por la ingesta
+LINEAGE_COLUMNS = (
+    ('extra', 'string'),
+    ('request_id', 'string'),
+    ('ingested_at', 'timestamp'),
+)
+# Orden dentro de cada row group: las estadísticas min/max quedan ajustadas por fecha
+SORT_COLUMNS = ('fecha_folio', 'numdoc_paciente')
+
+PARQUET_PREFIX = 'raw/parquet'
+DEFAULT_TARGET_FILE_BYTES = 128 * 1024 * 1024
+DEFAULT_ROW_GROUP_ROWS = 100000
+
+_pyarrow = None
+
+
+def load_pyarrow():
+    """
+    Importa pyarrow en el primer uso (las ejecuciones solo NDJSON no pagan su importación).
+    """
+    global _pyarrow
+    if _pyarrow is None:
+        import pyarrow
+        import pyarrow.parquet
+        _pyarrow = (pyarrow, pyarrow.parquet)
+    return _pyarrow
+
+
+def record_schema():
+    """
+    Esquema Arrow del contrato más las columnas de linaje.
+    """
+    pa, _ = load_pyarrow()
+    types = {'int64': pa.int64(), 'string': pa.string(), 'float64': pa.float64(), 'timestamp': pa.timestamp('ms')}
+    return pa.schema([(name, types[kind]) for name, kind in RECORD_CONTRACT + LINEAGE_COLUMNS])
+
+
+class PartitionedParquetWriter:
+    """
+    Escribe páginas de registros en archivos Parquet de tamaño acotado bajo una partición diaria.
+
+    Usar como context manager: si ocurre un error, los archivos ya subidos se eliminan.
+    """
+
+    def __init__(self, client, bucket, source, file_stem, request_id, ingested_at, prefix=PARQUET_PREFIX,
+                 target_file_bytes=DEFAULT_TARGET_FILE_BYTES, row_group_rows=DEFAULT_ROW_GROUP_ROWS,
+                 compression='zstd'):
+        """
+        Args:
+            client: Cliente S3 de boto3
+            bucket (str): Bucket de destino
+            source (str): Origen de los datos (partición source=)
+            file_stem (str): Prefijo de los nombres de archivo (el del NDJSON de la ejecución, sin extensión)
+            request_id (str): ID de la ejecución (columna request_id)
+            ingested_at (datetime): Momento de la ingesta en UTC (partición y columna ingested_at)
+            prefix (str): Prefijo de la salida Parquet
+            target_file_bytes (int): Tamaño a partir del cual se cierra un archivo
+            row_group_rows (int): Filas por row group
+            compression (str): Códec Parquet (zstd o snappy)
+        """
+        self.pa, self.pq = load_pyarrow()
+        self.client = client
+        self.bucket = bucket
+        self.file_stem = file_stem
+        self.request_id = request_id
+        self.ingested_at = ingested_at.replace(microsecond=0, tzinfo=None)
+        self.partition = (
+            f"{prefix}/source={source}/year={ingested_at:%Y}/month={ingested_at:%m}/day={ingested_at:%d}"
+        )
+        self.target_file_bytes = target_file_bytes
+        self.row_group_rows = row_group_rows
+        self.compression = compression
+        self.schema = record_schema()
+        self.keys = []
+        self.rows = 0
+        self._batches = []
+        self._batch_rows = 0
+        self._writer = None
+        self._path = None
+        self._tmp_dir = tempfile.mkdtemp(prefix='api-parquet-')
+
+    def write(self, records):
+        """
+        Agrega una página de registros; escribe un row group cada row_group_rows filas.
+        """
+        if not records:
+            return
+        self._batches.append(self._to_batch(records))
+        self._batch_rows += len(records)
+        self.rows += len(records)
+        while self._batch_rows >= self.row_group_rows:
+            self._write_row_group(self.row_group_rows)
+
+    def close(self):
+        """
+        Escribe lo pendiente y sube el último archivo.
+
+        Returns:
+            list: Claves S3 de los archivos escritos
+        """
+        self._write_row_group()
+        self._roll()
+        os.rmdir(self._tmp_dir)
+        return self.keys
+
+    def abort(self):
+        """
+        Descarta el archivo en curso y elimina los ya subidos (best effort).
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for key in self.keys:
+            try:
+                self.client.delete_object(Bucket=self.bucket, Key=key)
+            except Exception as e:
+                logger.error(f"No se pudo eliminar el Parquet parcial s3://{self.bucket}/{key}: {e}")
+        self.keys = []
+        # También el archivo de un _roll que falló al subirlo (ya sin escritor abierto)
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def _to_batch(self, records):
+        pa = self.pa
+        known = {name for name, _ in RECORD_CONTRACT}
+        columns = []
+        for name, kind in RECORD_CONTRACT:
+            values = [convert(record.get(name) if isinstance(record, dict) else None, kind) for record in records]
+            columns.append(pa.array(values, type=self.schema.field(name).type))
+        extra = [
+            json.dumps({k: v for k, v in record.items() if k not in known}, ensure_ascii=False, default=str)
+            if isinstance(record, dict) and not known.issuperset(record) else None
+            for record in records
+        ]
+        columns.append(pa.array(extra, type=pa.string()))
+        columns.append(pa.array([self.request_id] * len(records), type=pa.string()))
+        columns.append(pa.array([self.ingested_at] * len(records), type=pa.timestamp('ms')))
+        return pa.RecordBatch.from_arrays(columns, schema=self.schema)
+
+    def _write_row_group(self, rows=None):
+        """
+        Escribe las primeras rows filas pendientes (todas si es None) como un row group.
+        """
+        if not self._batches:
+            return
+        table = self.pa.Table.from_batches(self._batches, schema=self.schema)
+        rows = table.num_rows if rows is None else rows
+        pending = table.slice(rows)
+        self._batches, self._batch_rows = pending.to_batches(), pending.num_rows
+        table = table.slice(0, rows).sort_by([(column, 'ascending') for column in SORT_COLUMNS])
+
+        if self._writer is None:
+            self._path = os.path.join(self._tmp_dir, f"{len(self.keys):04d}.parquet")
+            self._writer = self.pq.ParquetWriter(
+                self._path, self.schema, compression=self.compression, write_statistics=True
+            )
+        self._writer.write_table(table, row_group_size=table.num_rows)
+        if os.path.getsize(self._path) >= self.target_file_bytes:
+            self._roll()
+
+    def _roll(self):
+        """
+        Cierra el archivo en curso, lo sube a S3 y libera /tmp.
+        """
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        key = f"{self.partition}/{self.file_stem}_{len(self.keys):04d}.parquet"
+        self.client.upload_file(self._path, self.bucket, key, ExtraArgs={'ContentType': 'application/vnd.apache.parquet'})
+        os.remove(self._path)
+        self.keys.append(key)
+        logger.info(f"Parquet escrito: s3://{self.bucket}/{key}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                self.close()
+            except Exception:
+                # Falló la subida del último archivo: no dejar un resultado parcial
+                self.abort()
+                raise
+        else:
+            self.abort()
+        return False
+
+
+def convert(value, kind):
+    """
+    Convierte un valor de la API al tipo del contrato; los que no se pueden convertir quedan en None.
+    """
+    if value is None or value == '':
+        return None
+    try:
+        if kind == 'string':
+            return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        if kind == 'int64':
+            return int(value)
+        if kind == 'float64':
+            return float(value)
+        if kind == 'timestamp':
+            return parse_timestamp(value).replace(tzinfo=None)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    raise ValueError(f"Tipo de contrato no soportado: {kind}")
+
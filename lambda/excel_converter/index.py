@@ -0,0 +1,319 @@
+import os
+import re
+import logging
+import datetime
+import hashlib
+import tempfile
+import traceback
+import urllib.parse
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from schema_registry import SchemaError, SchemaRegistry
+from workbook_reader import iter_record_batches
+from medical_analytics_runtime import content_index
+from medical_analytics_runtime.alerts import ErrorAggregator
+from medical_analytics_runtime.audit import AuditLogger
+from medical_analytics_runtime.clients import lazy_client
+
+# Configuración de logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Clientes de AWS perezosos: se crean en el primer uso y se reutilizan en el contenedor
+s3 = lazy_client('s3')
+
+# Auditoría con búfer compartida con las demás Lambdas de ingesta
+audit = AuditLogger.from_env('excel_converter')
+# Notificaciones de error agregadas por huella (un resumen SNS por ventana)
+alerts = ErrorAggregator.from_env('excel_converter')
+
+# Configuración
+BUCKET_NAME = os.environ.get('BUCKET_NAME')
+RAW_EXCEL_PREFIX = 'raw/excel'
+CLEANED_PREFIX = 'cleaned'
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')  # zstd o snappy
+EXCEL_EXTENSIONS = ('xlsx', 'xls')
+BATCH_ROWS = int(os.environ.get('BATCH_ROWS', '20000'))  # Filas por lote leído del libro
+SCHEMA_CACHE_DIR = os.environ.get('SCHEMA_CACHE_DIR', '/tmp/schema-registry')  # Caché local del registro de plantillas
+
+# Encabezados conocidos de cada campo (normalizados sin tildes) en las plantillas de los hospitales;
+# los encabezados no listados se resuelven por similitud en el registro de esquemas
+COLUMN_ALIASES = {
+    'numdoc_paciente': ('NUMDOC_PACIENTE', 'NUMDOC', 'NUM_DOC', 'NUMERO_DOCUMENTO', 'DOCUMENTO', 'IDENTIFICACION', 'CEDULA'),
+    'nombre_paciente': ('NOMBRE_PACIENTE', 'NOMBRE', 'NOMBRES_Y_APELLIDOS', 'PACIENTE'),
+    'fecha_folio': ('FECHA_FOLIO', 'FECHA', 'FECHA_ATENCION', 'FECHA_CONSULTA'),
+    'diagnostico': ('DIAGNOSTICO', 'DX', 'DIAGNOSTICO_PRINCIPAL', 'COD_DIAGNOSTICO'),
+    'presion_sistolica': ('PRESION_SISTOLICA', 'PAS', 'TAS', 'TA_SIST', 'TA_SISTOLICA', 'TENSION_ARTERIAL_SISTOLICA'),
+    'presion_diastolica': ('PRESION_DIASTOLICA', 'PAD', 'TAD', 'TA_DIAST', 'TA_DIASTOLICA', 'TENSION_ARTERIAL_DIASTOLICA'),
+}
+REQUIRED_FIELDS = ('numdoc_paciente', 'nombre_paciente', 'fecha_folio', 'diagnostico')
+
+# Esquema de lectura: solo se proyectan estas columnas de la hoja
+WORKBOOK_SCHEMA = pa.schema([
+    ('numdoc_paciente', pa.string()),
+    ('nombre_paciente', pa.string()),
+    ('fecha_folio', pa.timestamp('ms')),
+    ('diagnostico', pa.string()),
+    ('presion_sistolica', pa.float64()),
+    ('presion_diastolica', pa.float64()),
+])
+
+# Esquemas tipados de las tablas en cleaned/
+DIAGNOSTICOS_SCHEMA = pa.schema([
+    ('numdoc_paciente', pa.string()),
+    ('fecha_folio', pa.timestamp('ms')),
+    ('diagnostico', pa.string()),
+    ('presion_sistolica', pa.float64()),
+    ('presion_diastolica', pa.float64()),
+    ('source_key', pa.string()),
+    ('ingested_at', pa.timestamp('ms')),
+])
+PACIENTES_SCHEMA = pa.schema([
+    ('numdoc_paciente', pa.string()),
+    ('nombre_paciente', pa.string()),
+    ('source_key', pa.string()),
+    ('ingested_at', pa.timestamp('ms')),
+])
+
+
+# Registro de plantillas; se conserva entre invocaciones del contenedor
+_schema_registry = None
+
+
+def get_schema_registry():
+    """
+    Devuelve el registro de esquemas del contenedor, creándolo en el primer uso.
+    """
+    global _schema_registry
+    if _schema_registry is None:
+        _schema_registry = SchemaRegistry(
+            s3, BUCKET_NAME, WORKBOOK_SCHEMA, COLUMN_ALIASES, REQUIRED_FIELDS, cache_dir=SCHEMA_CACHE_DIR
+        )
+    return _schema_registry
+
+
+def handler(event, context):
+    """
+    Convierte a Parquet cada libro Excel creado bajo raw/excel/.
+    Escribe las tablas tipadas en cleaned/diagnosticos/ y cleaned/pacientes/ con
+    particiones Hive por fecha de carga (year=YYYY/month=MM/day=DD).
+
+    Args:
+        event (dict): Evento de EventBridge ("Object Created") o notificación S3
+        context (LambdaContext): Contexto de ejecución Lambda
+
+    Returns:
+        dict: Resumen de los libros convertidos y rechazados
+    """
+    converted, rejected = [], []
+    try:
+        for bucket, s3_key in extract_s3_objects(event):
+            if not is_convertible(s3_key):
+                logger.info(f"Objeto ignorado: s3://{bucket}/{s3_key}")
+                continue
+
+            try:
+                result = convert_workbook(bucket, s3_key, context)
+                if result:
+                    converted.append(result)
+            except SchemaError as e:
+                # Error de datos: se notifica sin relanzar para que EventBridge no reintente
+                logger.error(f"Libro rechazado s3://{bucket}/{s3_key}: {e}")
+                notify_error('SchemaError', str(e), s3_key, context.aws_request_id)
+                rejected.append(s3_key)
+            except Exception as e:
+                logger.error(f"Error convirtiendo s3://{bucket}/{s3_key}: {e}")
+                notify_error(type(e).__name__, str(e), s3_key, context.aws_request_id, traceback.format_exc())
+                raise
+
+        return {'converted': converted, 'rejected': rejected}
+    finally:
+        audit.flush()
+        alerts.flush()
+
+
+def convert_workbook(bucket, s3_key, context):
+    """
+    Descarga un libro y lo convierte por lotes de filas a las tablas Parquet de cleaned/.
+    La memoria queda acotada por el tamaño del lote: cada lote se escribe como row group
+    en un archivo Parquet local que luego se sube a S3.
+
+    Args:
+        bucket (str): Bucket del libro
+        s3_key (str): Clave del libro bajo raw/excel/
+        context (LambdaContext): Contexto de ejecución Lambda
+
+    Returns:
+        dict: Claves Parquet escritas y número de filas, o None si el libro es un duplicado
+    """
+    ingested_at = datetime.datetime.utcnow().replace(microsecond=0)
+    partition = partition_path(s3_key, ingested_at)
+    stem = os.path.splitext(os.path.basename(s3_key))[0]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        local_path = os.path.join(tmp_dir, os.path.basename(s3_key))
+        if not download_workbook(bucket, s3_key, local_path):
+            return None
+
+        diagnosticos_path = os.path.join(tmp_dir, 'diagnosticos.parquet')
+        rows = 0
+        template = {}
+        # Último nombre visto por documento; crece con los pacientes distintos, no con las filas
+        pacientes = {}
+
+        def resolve_columns(header):
+            # La plantilla se resuelve con el registro (una búsqueda por hash si ya se conoce)
+            template.update(get_schema_registry().resolve(header))
+            return template['columns']
+
+        with pq.ParquetWriter(diagnosticos_path, DIAGNOSTICOS_SCHEMA, compression=PARQUET_COMPRESSION) as writer:
+            for batch in iter_record_batches(local_path, WORKBOOK_SCHEMA, resolve_columns, BATCH_ROWS):
+                batch = batch.filter(pc.is_valid(batch.column('numdoc_paciente')))
+                if not batch.num_rows:
+                    continue
+                writer.write_table(build_diagnosticos(batch, s3_key, ingested_at))
+                pacientes.update(zip(
+                    batch.column('numdoc_paciente').to_pylist(),
+                    batch.column('nombre_paciente').to_pylist()
+                ))
+                rows += batch.num_rows
+
+        pacientes_path = os.path.join(tmp_dir, 'pacientes.parquet')
+        pq.write_table(
+            build_pacientes(pacientes, s3_key, ingested_at),
+            pacientes_path,
+            compression=PARQUET_COMPRESSION
+        )
+
+        outputs = {}
+        for table_name, path in (('diagnosticos', diagnosticos_path), ('pacientes', pacientes_path)):
+            # La clave se deriva del libro de origen: reprocesar un evento sobrescribe el mismo archivo
+            output_key = f"{CLEANED_PREFIX}/{table_name}/{partition}/{stem}.parquet"
+            s3.upload_file(path, bucket, output_key, ExtraArgs={'ContentType': 'application/vnd.apache.parquet'})
+            outputs[table_name] = output_key
+
+    logger.info(f"Libro convertido: s3://{bucket}/{s3_key} ({rows} filas)")
+    audit.emit(
+        'excel_converted',
+        lambda_name=context.function_name,
+        lambda_request_id=context.aws_request_id,
+        source_key=s3_key,
+        template=template['fingerprint'],
+        outputs=outputs,
+        rows=rows
+    )
+    return {'source_key': s3_key, 'template': template['fingerprint'], 'outputs': outputs, 'rows': rows}
+
+
+def download_workbook(bucket, s3_key, local_path):
+    """
+    Descarga un libro calculando su SHA-256 y lo reclama en el índice de contenido.
+    file_processor reclama el mismo hash al recibir el evento y elimina los duplicados;
+    ambos coinciden en el dueño sin importar cuál llega primero.
+
+    Returns:
+        bool: False si el libro ya no existe o su contenido pertenece a otro objeto
+    """
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=s3_key)
+    except s3.exceptions.NoSuchKey:
+        logger.info(f"Libro eliminado antes de convertirlo (duplicado): s3://{bucket}/{s3_key}")
+        return False
+
+    hasher = hashlib.sha256()
+    with open(local_path, 'wb') as f:
+        for chunk in obj['Body'].iter_chunks(chunk_size=1024 * 1024):
+            hasher.update(chunk)
+            f.write(chunk)
+
+    request_id = obj.get('Metadata', {}).get('request-id')
+    owner = content_index.claim(s3, bucket, hasher.hexdigest(), s3_key, obj.get('ContentLength'), request_id)
+    if owner['s3_key'] != s3_key:
+        logger.info(f"Libro duplicado de s3://{bucket}/{owner['s3_key']}, no se convierte: s3://{bucket}/{s3_key}")
+        return False
+    return True
+
+
+def build_diagnosticos(batch, s3_key, ingested_at):
+    """
+    Construye la tabla de diagnósticos (una fila por folio) de un lote del libro.
+    """
+    return pa.Table.from_arrays(
+        [
+            batch.column('numdoc_paciente'),
+            batch.column('fecha_folio'),
+            batch.column('diagnostico'),
+            batch.column('presion_sistolica'),
+            batch.column('presion_diastolica'),
+            pa.array([s3_key] * batch.num_rows, type=pa.string()),
+            pa.array([ingested_at] * batch.num_rows, type=pa.timestamp('ms')),
+        ],
+        schema=DIAGNOSTICOS_SCHEMA
+    )
+
+
+def build_pacientes(pacientes, s3_key, ingested_at):
+    """
+    Construye la tabla de pacientes del libro (un registro por documento).
+    """
+    return pa.Table.from_arrays(
+        [
+            pa.array(list(pacientes.keys()), type=pa.string()),
+            pa.array(list(pacientes.values()), type=pa.string()),
+            pa.array([s3_key] * len(pacientes), type=pa.string()),
+            pa.array([ingested_at] * len(pacientes), type=pa.timestamp('ms')),
+        ],
+        schema=PACIENTES_SCHEMA
+    )
+
+
+def partition_path(s3_key, ingested_at):
+    """
+    Partición Hive a partir de la fecha de carga incluida en raw/excel/{YYYY-MM-DD}/.
+    """
+    match = re.match(rf'{RAW_EXCEL_PREFIX}/(\d{{4}})-(\d{{2}})-(\d{{2}})/', s3_key)
+    year, month, day = match.groups() if match else (
+        ingested_at.strftime('%Y'), ingested_at.strftime('%m'), ingested_at.strftime('%d')
+    )
+    return f"year={year}/month={month}/day={day}"
+
+
+def is_convertible(s3_key):
+    """
+    Indica si la clave es un libro Excel cargado (excluye el índice y demás prefijos internos).
+    """
+    return (
+        s3_key.startswith(f"{RAW_EXCEL_PREFIX}/")
+        and '/_' not in s3_key
+        and s3_key.lower().rsplit('.', 1)[-1] in EXCEL_EXTENSIONS
+    )
+
+
+def extract_s3_objects(event):
+    """
+    Devuelve pares (bucket, key) de un evento S3 en formato EventBridge o de notificación.
+    """
+    if event.get('source') == 'aws.s3':
+        detail = event.get('detail', {})
+        return [(detail['bucket']['name'], detail['object']['key'])]
+    return [
+        (record['s3']['bucket']['name'], urllib.parse.unquote_plus(record['s3']['object']['key']))
+        for record in event.get('Records', [])
+    ]
+
+
+def notify_error(error_type, error_message, s3_key, lambda_request_id, stack_trace=None):
+    """
+    Reporta un error al agregador: un libro defectuoso repetido en muchas cargas
+    genera un solo resumen SNS por ventana.
+    """
+    alerts.report(
+        error_type,
+        error_message,
+        stack_trace=stack_trace,
+        s3_key=s3_key,
+        lambda_request_id=lambda_request_id
+    )
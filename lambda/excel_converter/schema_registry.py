@@ -0,0 +1,207 @@
+"""
+Registro versionado de esquemas de plantillas Excel.
+
+Cada hospital nombra las mismas columnas de forma distinta ("Presión Sistólica", "PAS",
+"TA sist"). La primera vez que aparece una plantilla, sus encabezados se resuelven con
+alias y coincidencia aproximada; el resultado (mapeo columna -> campo y plan de tipos)
+se guarda en S3 bajo la huella de los encabezados normalizados. Los contenedores
+calientes lo mantienen en memoria y en /tmp, de modo que una plantilla conocida se
+resuelve con una sola búsqueda por hash.
+
+Al cambiar las reglas de inferencia se incrementa REGISTRY_VERSION: las entradas
+anteriores quedan en su prefijo y no se reutilizan.
+"""
+import difflib
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+import datetime
+
+logger = logging.getLogger()
+
+REGISTRY_VERSION = 'v1'
+REGISTRY_PREFIX = 'cleaned/_schemas'
+DEFAULT_CACHE_DIR = '/tmp/schema-registry'
+
+# Similitud mínima para aceptar una coincidencia aproximada
+MATCH_THRESHOLD = 0.85
+# Si dos campos quedan a menos de este margen, el encabezado es ambiguo y no se asigna
+AMBIGUITY_MARGIN = 0.05
+# Puntaje de una abreviatura token a token ("TA SIST" -> "TA_SISTOLICA")
+ABBREVIATION_SCORE = 0.95
+
+
+class SchemaError(ValueError):
+    """El libro no tiene las columnas requeridas; reintentar no lo corregiría."""
+
+
+class SchemaRegistry:
+    """
+    Resuelve encabezados de plantillas a un mapeo de columnas, con caché en memoria,
+    en /tmp y en S3.
+    """
+
+    def __init__(self, client, bucket, schema, aliases, required, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        Args:
+            client: Cliente S3 de boto3
+            bucket (str): Bucket donde se guarda el registro
+            schema (pa.Schema): Campos de salida; define el plan de tipos
+            aliases (dict): Campo -> encabezados normalizados conocidos
+            required (tuple): Campos sin los cuales el libro se rechaza
+            cache_dir (str): Directorio local de caché
+        """
+        self.client = client
+        self.bucket = bucket
+        self.schema = schema
+        self.aliases = aliases
+        self.required = required
+        self.cache_dir = os.path.join(cache_dir, REGISTRY_VERSION)
+        self._memory = {}
+
+    def resolve(self, header):
+        """
+        Devuelve la entrada del registro para los encabezados dados, infiriéndola
+        y publicándola si la plantilla no se había visto.
+
+        Args:
+            header (tuple): Valores de la fila de encabezados
+
+        Returns:
+            dict: Entrada con fingerprint, columns (campo -> posición) y dtypes
+
+        Raises:
+            SchemaError: Si falta algún campo requerido
+        """
+        normalized = [normalize_header(name) if name is not None else '' for name in header]
+        fingerprint = header_fingerprint(normalized)
+
+        entry = self._memory.get(fingerprint) or self._read_local(fingerprint) or self._read_remote(fingerprint)
+        if entry is None:
+            entry = self._infer(fingerprint, header, normalized)
+            self._write_remote(entry)
+        self._remember(entry)
+        return entry
+
+    def _infer(self, fingerprint, header, normalized):
+        columns = infer_mapping(normalized, self.aliases)
+        missing = [field for field in self.required if field not in columns]
+        if missing:
+            raise SchemaError(f"Columnas requeridas ausentes: {', '.join(missing)}")
+
+        logger.info(f"Plantilla nueva {fingerprint[:12]}: {columns}")
+        return {
+            'version': REGISTRY_VERSION,
+            'fingerprint': fingerprint,
+            'headers': [None if name is None else str(name) for name in header],
+            'columns': columns,
+            'dtypes': {field: str(self.schema.field(field).type) for field in columns},
+            'created_at': datetime.datetime.utcnow().isoformat()
+        }
+
+    def _remember(self, entry):
+        fingerprint = entry['fingerprint']
+        if fingerprint in self._memory:
+            return
+        self._memory[fingerprint] = entry
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, f"{fingerprint}.json"), 'w') as f:
+            json.dump(entry, f)
+
+    def _read_local(self, fingerprint):
+        try:
+            with open(os.path.join(self.cache_dir, f"{fingerprint}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_remote(self, fingerprint):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(fingerprint))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+    def _write_remote(self, entry):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(entry['fingerprint']),
+            Body=json.dumps(entry, ensure_ascii=False, indent=2).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+    def _key(self, fingerprint):
+        return f"{REGISTRY_PREFIX}/{REGISTRY_VERSION}/{fingerprint}.json"
+
+
+def header_fingerprint(normalized):
+    """
+    Huella SHA-256 de los encabezados normalizados, en orden.
+    """
+    return hashlib.sha256('\x1f'.join(normalized).encode('utf-8')).hexdigest()
+
+
+def infer_mapping(normalized, aliases):
+    """
+    Asigna columnas a campos por alias exacto, abreviatura o similitud.
+    Cada columna y cada campo se usan a lo sumo una vez, empezando por las
+    coincidencias de mayor puntaje; las columnas ambiguas se descartan.
+
+    Args:
+        normalized (list): Encabezados normalizados, en orden
+        aliases (dict): Campo -> encabezados normalizados conocidos
+
+    Returns:
+        dict: Campo -> posición de la columna
+    """
+    candidates = []
+    for index, name in enumerate(normalized):
+        if not name:
+            continue
+        scores = sorted(
+            ((max(match_score(name, alias) for alias in field_aliases), field)
+             for field, field_aliases in aliases.items()),
+            reverse=True
+        )
+        best_score, best_field = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        if best_score < MATCH_THRESHOLD:
+            continue
+        if best_score < 1.0 and best_score - runner_up < AMBIGUITY_MARGIN:
+            logger.warning(f"Encabezado ambiguo ignorado: {name}")
+            continue
+        candidates.append((best_score, -index, best_field, index))
+
+    columns = {}
+    used = set()
+    for _, _, field, index in sorted(candidates, reverse=True):
+        if field not in columns and index not in used:
+            columns[field] = index
+            used.add(index)
+    return columns
+
+
+def match_score(name, alias):
+    """
+    Similitud entre un encabezado y un alias normalizados (1.0 = idénticos).
+    """
+    if name == alias:
+        return 1.0
+    name_tokens, alias_tokens = name.split('_'), alias.split('_')
+    if len(name_tokens) == len(alias_tokens) and all(
+        alias_token.startswith(token) and (len(token) >= 3 or token == alias_token)
+        for token, alias_token in zip(name_tokens, alias_tokens)
+    ):
+        return ABBREVIATION_SCORE
+    return difflib.SequenceMatcher(None, name, alias).ratio()
+
+
+def normalize_header(header):
+    """
+    Normaliza un encabezado: mayúsculas, sin tildes y con guiones bajos ("Diagnóstico" -> "DIAGNOSTICO").
+    """
+    text = unicodedata.normalize('NFKD', str(header)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^A-Z0-9]+', '_', text.strip().upper()).strip('_')
@@ -0,0 +1,204 @@
+"""
+Lectura de libros Excel por lotes de filas con memoria acotada.
+
+openpyxl en modo read_only recorre la hoja como un stream XML sin cargarla completa;
+cada lote de filas se convierte en un RecordBatch de Arrow con solo las columnas
+que el esquema de destino necesita. La memoria depende del tamaño del lote y no
+del número de filas de la hoja, con dos excepciones propias de openpyxl: la tabla de
+textos compartidos se carga completa, y si la hoja no declara <dimension> (Excel
+siempre lo hace) el libro se recorre una vez al abrirlo.
+
+El recorrido rápido (RowParser) usa internos de openpyxl; solo se activa con las
+versiones verificadas en ROW_PARSER_VERSIONS (la fijada en la capa de pandas). Con
+cualquier otra se usa la API pública ReadOnlyWorksheet.iter_rows(values_only=True).
+"""
+import datetime
+
+import openpyxl
+import pyarrow as pa
+from openpyxl.xml.functions import iterparse
+
+try:  # Internos de openpyxl: solo se usan con las versiones de ROW_PARSER_VERSIONS
+    from openpyxl.worksheet._reader import DATA_TAG, ROW_TAG, WorkSheetParser
+except ImportError:
+    WorkSheetParser = None
+
+# Filas por lote: ~20k filas x pocas columnas se mantienen en unos pocos MB
+DEFAULT_BATCH_ROWS = 20000
+
+# Versiones de openpyxl verificadas con RowParser (layers/pandas_layer/requirements.txt)
+ROW_PARSER_VERSIONS = ('3.1.0',)
+USE_ROW_PARSER = WorkSheetParser is not None and openpyxl.__version__ in ROW_PARSER_VERSIONS
+
+# Formatos aceptados para fechas escritas como texto (las celdas de fecha llegan como datetime)
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d/%m/%Y', '%d/%m/%Y %H:%M', '%d-%m-%Y')
+
+
+def iter_record_batches(path, schema, resolve_columns, batch_size=DEFAULT_BATCH_ROWS):
+    """
+    Recorre la primera hoja del libro y genera lotes de filas como RecordBatch.
+
+    Args:
+        path (str): Ruta local del libro (.xlsx o .xls)
+        schema (pa.Schema): Campos de salida (string, timestamp o numéricos)
+        resolve_columns (callable): Recibe la fila de encabezados y devuelve
+            campo -> posición; los campos no resueltos quedan nulos
+        batch_size (int): Filas por lote
+
+    Yields:
+        pa.RecordBatch: Lote con los campos de schema, en el orden del esquema
+    """
+    rows = iter_xls_rows(path) if path.lower().endswith('.xls') else iter_xlsx_rows(path)
+    try:
+        # El encabezado es la primera fila con contenido
+        header = next((row for row in rows if any(cell is not None for cell in row)), ())
+        positions = resolve_columns(header)
+        fields = [schema.field(name) for name in positions]
+        converters = [converter_for(field.type) for field in fields]
+
+        values = [[] for _ in fields]
+        count = 0
+        for row in rows:
+            # Omitir filas completamente vacías (formato aplicado más allá de los datos)
+            cells = [row[index] if index < len(row) else None for index in positions.values()]
+            if all(cell is None for cell in cells):
+                continue
+            for column, convert, cell in zip(values, converters, cells):
+                column.append(convert(cell))
+            count += 1
+            if count >= batch_size:
+                yield build_batch(values, fields, schema, count)
+                values = [[] for _ in fields]
+                count = 0
+        if count:
+            yield build_batch(values, fields, schema, count)
+    finally:
+        rows.close()
+
+
+if WorkSheetParser is not None:
+    class RowParser(WorkSheetParser):
+        """
+        WorkSheetParser de openpyxl limitado a las filas.
+
+        El parser original limpia cada <row> pero la deja como hijo de <sheetData>, por lo
+        que el árbol crece ~80 bytes por fila (~40 MB en 500k filas). Aquí cada fila se
+        desprende de <sheetData> en cuanto se procesa.
+        """
+
+        def parse(self):
+            sheet_data = None
+            for event, element in iterparse(self.source, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == DATA_TAG:
+                        sheet_data = element
+                elif element.tag == ROW_TAG:
+                    row = self.parse_row(element)
+                    sheet_data.remove(element)
+                    self.row_dimensions.clear()
+                    yield row
+
+
+def iter_xlsx_rows(path):
+    """
+    Filas (tuplas de valores) de la primera hoja de un .xlsx en modo streaming.
+    Con una versión verificada de openpyxl se usa el lector read_only (textos
+    compartidos, estilos de fecha) con RowParser; con otra, iter_rows(values_only=True),
+    que conserva el crecimiento del árbol XML descrito en RowParser.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        if not USE_ROW_PARSER:
+            yield from worksheet.iter_rows(values_only=True)
+            return
+        with worksheet._get_source() as source:
+            parser = RowParser(
+                source,
+                worksheet._shared_strings,
+                data_only=True,
+                epoch=workbook.epoch,
+                date_formats=workbook._date_formats,
+                timedelta_formats=workbook._timedelta_formats
+            )
+            for _, cells in parser.parse():
+                row = [None] * max((cell['column'] for cell in cells), default=0)
+                for cell in cells:
+                    row[cell['column'] - 1] = cell['value']
+                yield tuple(row)
+    finally:
+        workbook.close()
+
+
+def iter_xls_rows(path):
+    """
+    Filas de la primera hoja de un .xls (formato antiguo, limitado a 65.536 filas).
+    openpyxl no lee .xls, por lo que se usa xlrd a través de pandas.
+    """
+    import pandas as pd
+
+    df = pd.read_excel(path, sheet_name=0, header=None, dtype=object)
+    for row in df.itertuples(index=False, name=None):
+        yield tuple(None if pd.isna(value) else value for value in row)
+
+
+def build_batch(values, fields, schema, num_rows):
+    arrays = {field.name: pa.array(column, type=field.type) for field, column in zip(fields, values)}
+    return pa.RecordBatch.from_arrays(
+        [arrays.get(field.name, pa.nulls(num_rows, field.type)) for field in schema],
+        schema=schema
+    )
+
+
+def converter_for(arrow_type):
+    if pa.types.is_timestamp(arrow_type):
+        return to_datetime
+    if pa.types.is_floating(arrow_type):
+        return to_number
+    return to_text
+
+
+def to_text(value):
+    """
+    Texto recortado; los vacíos quedan nulos y los números enteros pierden el ".0" de Excel.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return text or None
+
+
+def to_number(value):
+    """
+    Número de una celda; acepta coma decimal en textos ("120,5") y deja nulos los no numéricos.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().replace(',', '.'))
+        except ValueError:
+            return None
+    return None
+
+
+def to_datetime(value):
+    """
+    Fecha de una celda; los textos se interpretan con el día primero y los no reconocidos quedan nulos.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+    if isinstance(value, str):
+        text = value.strip()
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(text, date_format)
+            except ValueError:
+                continue
+    return None
@@ -0,0 +1,92 @@
+"""
+Decodificación Base64 en streaming hacia S3.
+
+Permite subir el campo "file" de un cuerpo JSON de API Gateway sin parsear el JSON
+completo ni materializar el archivo decodificado: el Base64 se decodifica por bloques
+y se envía a S3 con medical_analytics_runtime.multipart.S3MultipartWriter, cuyo búfer
+está acotado por el tamaño de parte.
+"""
+import base64
+import json
+import re
+
+# Caracteres Base64 procesados por bloque (múltiplo de 4 => ~768 KiB decodificados)
+B64_CHUNK_CHARS = 1024 * 1024
+
+# Cualquier carácter fuera del alfabeto Base64 (escapes JSON, saltos de línea) se descarta,
+# igual que hace base64.b64decode sin validación
+_B64_NOISE = re.compile(r'[^A-Za-z0-9+/=]')
+_B64_ESCAPES = re.compile(r'\\(?:/|n|r|t)')
+
+
+def split_file_field(body, field='file'):
+    """
+    Localiza el valor string de un campo dentro del JSON sin parsear el cuerpo completo.
+
+    Args:
+        body (str): Cuerpo JSON de la solicitud
+        field (str): Nombre del campo con el contenido Base64
+
+    Returns:
+        tuple: (metadatos sin el campo, inicio, fin) del valor dentro de body.
+               inicio y fin son None si el campo no existe.
+
+    Raises:
+        ValueError: Si el cuerpo no es JSON válido
+    """
+    # Fuera de un string JSON las comillas no van escapadas, así que "file": solo puede ser una clave
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(field), body)
+    if not match:
+        return json.loads(body), None, None
+
+    start = match.end()
+    end = body.find('"', start)
+    if end < 0:
+        raise ValueError(f'Valor del campo "{field}" sin terminar')
+
+    # Se parsea solo el resto del JSON, con el campo reemplazado por un string vacío
+    metadata = json.loads(body[:start] + body[end:])
+    if not isinstance(metadata, dict):
+        raise ValueError('El cuerpo JSON debe ser un objeto')
+    return metadata, start, end
+
+
+def iter_decoded_chunks(source, start=0, end=None, chunk_chars=B64_CHUNK_CHARS):
+    """
+    Decodifica source[start:end] por bloques acotados.
+
+    Args:
+        source (str): Texto que contiene el Base64
+        start (int): Posición inicial del Base64
+        end (int): Posición final (exclusiva) del Base64
+        chunk_chars (int): Caracteres procesados por bloque
+
+    Yields:
+        bytes: Bloques decodificados
+
+    Raises:
+        binascii.Error: Si el contenido no es Base64 válido
+    """
+    end = len(source) if end is None else end
+    pos = start
+    carry = ''
+    while pos < end:
+        piece = source[pos:min(pos + chunk_chars, end)]
+        pos += len(piece)
+
+        # No partir una secuencia de escape JSON entre dos bloques
+        if piece.endswith('\\') and pos < end:
+            piece += source[pos]
+            pos += 1
+        if _B64_NOISE.search(piece):
+            piece = _B64_NOISE.sub('', _B64_ESCAPES.sub(lambda m: '/' if m.group(0) == '\\/' else '', piece))
+
+        data = carry + piece if carry else piece
+        usable = len(data) - len(data) % 4
+        carry = data[usable:]
+        if usable:
+            yield base64.b64decode(data[:usable])
+
+    if carry:
+        # Longitud no múltiplo de 4: mismo error que produciría b64decode
+        base64.b64decode(carry)
@@ -1,29 +1,122 @@
 import json
 import os
-import boto3
-import base64
+import binascii
 import logging
 import datetime
+import hashlib
 import uuid
 import re
 import traceback
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from base64_stream import iter_decoded_chunks, split_file_field
+from medical_analytics_runtime import content_index
+from medical_analytics_runtime.alerts import ErrorAggregator
+from medical_analytics_runtime.audit import AuditLogger
+from medical_analytics_runtime.background import BackgroundIO
+from medical_analytics_runtime.clients import lazy_client
+from medical_analytics_runtime.idempotency import Idempotency, get_idempotency_key
+from medical_analytics_runtime.multipart import S3MultipartWriter
 
 # Configuración de logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Inicializar clientes de AWS
-s3 = boto3.client('s3')
-sns = boto3.client('sns')
+# Clientes de AWS perezosos: se crean en el primer uso y se reutilizan en el contenedor
+s3 = lazy_client('s3')
+
+# Auditoría con búfer: los registros se agrupan en Firehose en lugar de un objeto S3 por evento
+audit = AuditLogger.from_env('file_processor')
+# Notificaciones de error agregadas por huella (un resumen SNS por ventana)
+alerts = ErrorAggregator.from_env('file_processor')
+# Respuestas de las cargas por Idempotency-Key (DynamoDB con TTL)
+idempotency = Idempotency.from_env()
+# Escrituras secundarias (índice de contenido) en paralelo con el resto de la solicitud
+background = BackgroundIO.from_env()
 
 # Configuración
 BUCKET_NAME = os.environ.get('BUCKET_NAME')
-ERROR_TOPIC_ARN = os.environ.get('ERROR_TOPIC_ARN')
+RAW_EXCEL_PREFIX = 'raw/excel'
+PRESIGNED_URL_EXPIRATION = int(os.environ.get('PRESIGNED_URL_EXPIRATION', '900'))  # segundos
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(100 * 1024 * 1024)))
+ALLOWED_EXTENSIONS = ('xlsx', 'xls')
+MULTIPART_PART_SIZE = max(int(os.environ.get('MULTIPART_PART_SIZE', str(8 * 1024 * 1024))), 5 * 1024 * 1024)  # S3 exige >= 5 MiB
+MAX_PART_URLS_PER_REQUEST = 100
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', '50'))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '8'))  # No mayor que CLIENT_MAX_POOL_CONNECTIONS
+STREAM_PART_SIZE = int(os.environ.get('STREAM_PART_SIZE', str(5 * 1024 * 1024)))  # Búfer de la decodificación en streaming
 
 
 def handler(event, context):
     """
-    Función Lambda para decodificar un archivo Base64 y subirlo a S3.
+    Punto de entrada de la Lambda. Enruta según el origen del evento:
+    - Evento S3 ObjectCreated (EventBridge o notificación S3): procesamiento posterior a la carga.
+    - POST /upload/url: genera una URL prefirmada para subir directamente a S3.
+    - POST /upload/batch: varios archivos Base64 en una sola solicitud.
+    - /upload/session[/parts|/complete]: carga multiparte reanudable directa a S3.
+    - POST /upload: carga tradicional con el archivo en Base64 dentro del JSON.
+    Las cargas Base64 (/upload y /upload/batch) aceptan el encabezado Idempotency-Key.
+
+    Args:
+        event (dict): Evento de API Gateway o de S3
+        context (LambdaContext): Contexto de ejecución Lambda
+
+    Returns:
+        dict: Respuesta HTTP o resultado del procesamiento
+    """
+    try:
+        if is_s3_event(event):
+            return handle_object_created(event, context)
+
+        route = (event.get('resource') or event.get('path') or '').rstrip('/')
+        if route.endswith('/upload/url'):
+            return handle_upload_url(event, context)
+        if '/upload/session' in route:
+            return handle_upload_session(event, context, route)
+        if route.endswith('/upload/batch'):
+            return run_idempotent(event, 'batch', lambda: handle_batch_upload(event, context))
+
+        return run_idempotent(event, 'upload', lambda: handle_base64_upload(event, context))
+    finally:
+        # Auditoría y errores se envían en segundo plano; esperar su entrega antes de congelar el contenedor
+        audit.flush()
+        alerts.flush()
+
+
+def run_idempotent(event, route, process):
+    """
+    Ejecuta la carga una sola vez por Idempotency-Key: un reintento del cliente (p. ej.
+    tras un 504 de API Gateway) recibe la respuesta guardada sin decodificar ni subir
+    de nuevo el archivo. Sin el encabezado, la carga se procesa normalmente.
+
+    Args:
+        event (dict): Evento de API Gateway
+        route (str): Ruta de la carga; las claves de cada ruta son independientes
+        process (callable): Procesa la carga y devuelve la respuesta HTTP
+
+    Returns:
+        dict: Respuesta HTTP
+    """
+    try:
+        key = get_idempotency_key(event)
+    except ValueError as e:
+        return build_response(400, str(e))
+    if key is None:
+        return process()
+    return idempotency.run(
+        f"{route}:{key}",
+        process,
+        lambda: build_response(409, {'message': 'Hay una solicitud en curso con la misma Idempotency-Key'})
+    )
+
+
+def handle_base64_upload(event, context):
+    """
+    Decodifica un archivo Base64 y lo sube a S3.
+    El Base64 se decodifica en streaming directamente hacia una carga multiparte,
+    por lo que la memoria usada depende del tamaño de parte y no del archivo.
+    Si el SHA-256 del contenido ya está en el índice, no se vuelve a escribir.
     No realiza validaciones adicionales.
 
     Args:
@@ -37,59 +130,557 @@ def handler(event, context):
     try:
         logger.info(f"Inicio de procesamiento. Request ID: {request_id}")
 
-        # Obtener y parsear el cuerpo
+        # Localizar el campo Base64 sin parsear ni copiar el cuerpo completo
         body = event.get('body', '')
         if isinstance(body, str):
             try:
-                body = json.loads(body)
-            except json.JSONDecodeError:
+                body_meta, file_start, file_end = split_file_field(body)
+            except ValueError:
                 return build_response(400, 'Cuerpo de solicitud no es JSON válido')
+            encoded_source = body
+        else:
+            # Invocación directa con el cuerpo ya como dict
+            body_meta = body or {}
+            encoded_source = body_meta.get('file') or ''
+            file_start, file_end = 0, len(encoded_source)
 
         # Extraer datos de archivo
-        encoded_file = body.get('file')
-        original_filename = body.get('filename', request_id)
+        original_filename = body_meta.get('filename', request_id)
 
-        if not encoded_file:
+        if file_start is None or file_start == file_end:
             return build_response(400, 'No se proporcionó contenido de archivo')
 
-        # Decodificar Base64
-        try:
-            file_bytes = base64.b64decode(encoded_file)
-        except Exception as e:
-            logger.error(f"Error decodificando Base64: {e}")
-            return build_response(400, 'Error al decodificar el archivo')
+        status_code, result = store_encoded_file(encoded_source, file_start, file_end, original_filename, request_id, context)
+        return build_response(status_code, result)
+
+    except Exception as ex:
+        err = str(ex)
+        trace = traceback.format_exc()
+        logger.error(f"Error interno: {err}")
+        logger.error(trace)
+        notify_error('InternalError', err, request_id, context.aws_request_id, trace)
+        return build_response(500, {'message': 'Error interno al procesar el archivo', 'request_id': request_id})
+
+
+def handle_batch_upload(event, context):
+    """
+    Recibe varios archivos Base64 en una sola solicitud ({"files": [{file, filename}, ...]})
+    y los escribe en S3 de forma concurrente con un pool de hilos acotado.
+    El arranque en frío y el TLS se pagan una vez por lote en lugar de una vez por archivo.
+
+    Args:
+        event (dict): Evento de API Gateway
+        context (LambdaContext): Contexto de ejecución Lambda
+
+    Returns:
+        dict: Respuesta HTTP con el resultado de cada archivo
+    """
+    batch_id = str(uuid.uuid4())
+    try:
+        body = parse_json_body(event)
+        if body is None:
+            return build_response(400, 'Cuerpo de solicitud no es JSON válido')
+
+        files = body.get('files')
+        if not isinstance(files, list) or not files:
+            return build_response(400, 'No se proporcionaron archivos')
+        if len(files) > BATCH_MAX_FILES:
+            return build_response(400, f'Máximo {BATCH_MAX_FILES} archivos por lote')
+
+        logger.info(f"Inicio de lote con {len(files)} archivos. Batch ID: {batch_id}")
+
+        def store(index_and_item):
+            index, item = index_and_item
+            request_id = str(uuid.uuid4())
+            item = item if isinstance(item, dict) else {}
+            encoded = item.get('file') or ''
+            filename = item.get('filename', request_id)
+            if not encoded:
+                return {'index': index, 'filename': filename, 'status': 400, 'message': 'No se proporcionó contenido de archivo'}
+            try:
+                status_code, result = store_encoded_file(encoded, 0, len(encoded), filename, request_id, context)
+            except Exception as ex:
+                logger.error(f"Error procesando archivo {index} del lote {batch_id}: {ex}")
+                logger.error(traceback.format_exc())
+                status_code, result = 500, {'message': 'Error interno al procesar el archivo', 'request_id': request_id}
+            if not isinstance(result, dict):
+                result = {'message': result}
+            return {'index': index, 'filename': filename, 'status': status_code, **result}
+
+        with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(files))) as executor:
+            results = list(executor.map(store, enumerate(files)))
+
+        failed = [r for r in results if r['status'] >= 400]
+        if failed:
+            notify_error(
+                'BatchUploadError',
+                f"{len(failed)} de {len(results)} archivos fallaron",
+                batch_id,
+                context.aws_request_id
+            )
+
+        return build_response(200, {
+            'batch_id': batch_id,
+            'total': len(results),
+            'succeeded': len(results) - len(failed),
+            'failed': len(failed),
+            'results': results
+        })
+
+    except Exception as ex:
+        err = str(ex)
+        trace = traceback.format_exc()
+        logger.error(f"Error interno en lote: {err}")
+        logger.error(trace)
+        notify_error('InternalError', err, batch_id, context.aws_request_id, trace)
+        return build_response(500, {'message': 'Error interno al procesar el lote', 'batch_id': batch_id})
+
+
+def store_encoded_file(encoded_source, file_start, file_end, original_filename, request_id, context):
+    """
+    Decodifica un archivo Base64 por bloques, lo deduplica por SHA-256 y lo sube a S3.
+
+    Args:
+        encoded_source (str): Texto que contiene el Base64
+        file_start (int): Posición inicial del Base64 en encoded_source
+        file_end (int): Posición final (exclusiva) del Base64 en encoded_source
+        original_filename (str): Nombre original del archivo
+        request_id (str): ID de la solicitud
+        context (LambdaContext): Contexto de ejecución Lambda
+
+    Returns:
+        tuple: (código HTTP, cuerpo de la respuesta)
+    """
+    # Sanitizar nombre de archivo
+    sanitized_name = sanitize_filename(original_filename)
+
+    # Generar clave S3 única bajo raw/excel/ para que la etapa de conversión la procese
+    s3_key = build_raw_excel_key(request_id, sanitized_name)
+
+    # Una sola pasada: decodificar por bloques, calcular el SHA-256 y subir a S3 con memoria
+    # acotada por el tamaño de parte. El objeto solo se completa si el contenido es nuevo.
+    writer = S3MultipartWriter(
+        s3,
+        BUCKET_NAME,
+        s3_key,
+        part_size=STREAM_PART_SIZE,
+        ContentType=guess_content_type(sanitized_name),
+        # Los metadatos S3 solo admiten ASCII: el nombre original se guarda codificado.
+        # content-index indica a Object Created que el hash y la auditoría ya se registraron.
+        Metadata={'request-id': request_id, 'original-filename': urllib.parse.quote(original_filename),
+                  'content-index': 'upload'}
+    )
+    hasher = hashlib.sha256()
+    try:
+        for chunk in iter_decoded_chunks(encoded_source, file_start, file_end):
+            hasher.update(chunk)
+            writer.write(chunk)
+        sha256 = hasher.hexdigest()
+
+        # Si el mismo contenido ya fue cargado, descartar las partes y apuntar al objeto existente
+        duplicate = find_duplicate_result(sha256, request_id)
+        if duplicate:
+            writer.abort()
+            return 200, duplicate
+        writer.close()
+    except binascii.Error as e:
+        writer.abort()
+        logger.error(f"Error decodificando Base64: {e}")
+        return 400, 'Error al decodificar el archivo'
+    except Exception:
+        writer.abort()
+        raise
+
+    # Otra carga del mismo contenido pudo reclamar el hash mientras se subía este objeto
+    owner = content_index.claim(s3, BUCKET_NAME, sha256, s3_key, writer.bytes_written, request_id)
+    if owner['s3_key'] != s3_key:
+        s3.delete_object(Bucket=BUCKET_NAME, Key=s3_key)
+        return 200, duplicate_body(owner, sha256, request_id)
+    logger.info(f"Archivo subido: s3://{BUCKET_NAME}/{s3_key} ({writer.bytes_written} bytes)")
+
+    # Notificación de éxito (opcional)
+    log_activity(request_id, context, s3_key)
+
+    return 200, {'message': 'Archivo subido correctamente', 's3_key': s3_key, 'sha256': sha256, 'request_id': request_id}
+
+
+def handle_upload_url(event, context):
+    """
+    Genera una política POST prefirmada para que el navegador suba el archivo
+    directamente a S3 bajo raw/excel/{fecha}/, sin pasar los bytes por API Gateway
+    ni por la Lambda. El procesamiento posterior se dispara con el evento ObjectCreated.
+
+    Args:
+        event (dict): Evento de API Gateway con {filename, size} en el cuerpo
+        context (LambdaContext): Contexto de ejecución Lambda
+
+    Returns:
+        dict: Respuesta HTTP con la URL y los campos del formulario a enviar a S3
+    """
+    request_id = str(uuid.uuid4())
+    try:
+        body = parse_json_body(event)
+        if body is None:
+            return build_response(400, 'Cuerpo de solicitud no es JSON válido')
+
+        original_filename = body.get('filename')
+        if not original_filename:
+            return build_response(400, 'No se proporcionó el nombre del archivo')
 
-        # Sanitizar nombre de archivo
         sanitized_name = sanitize_filename(original_filename)
+        if sanitized_name.lower().split('.')[-1] not in ALLOWED_EXTENSIONS:
+            return build_response(400, 'Solo se permiten archivos Excel (.xlsx, .xls)')
 
-        # Generar clave S3 única
-        now = datetime.datetime.utcnow()
-        date_str = now.strftime('%Y-%m-%d')
-        timestamp = now.strftime('%Y%m%dT%H%M%SZ')
-        s3_key = f"uploads/{date_str}/{timestamp}_{request_id}_{sanitized_name}"
+        size = body.get('size')
+        if size is not None and (not isinstance(size, int) or size <= 0 or size > MAX_UPLOAD_BYTES):
+            return build_response(400, f'Tamaño de archivo inválido (máximo {MAX_UPLOAD_BYTES} bytes)')
 
-        # Subir a S3
-        s3.put_object(
+        duplicate_response = build_duplicate_response(body.get('sha256'), request_id)
+        if duplicate_response:
+            return duplicate_response
+
+        s3_key = build_raw_excel_key(request_id, sanitized_name)
+        content_type = guess_content_type(sanitized_name)
+
+        # La política limita el tamaño y fija el tipo de contenido y los metadatos
+        fields = {
+            'Content-Type': content_type,
+            'x-amz-meta-request-id': request_id,
+            'x-amz-meta-original-filename': sanitized_name
+        }
+        conditions = [
+            ['content-length-range', 1, MAX_UPLOAD_BYTES],
+            {'Content-Type': content_type},
+            {'x-amz-meta-request-id': request_id},
+            {'x-amz-meta-original-filename': sanitized_name}
+        ]
+        presigned = s3.generate_presigned_post(
             Bucket=BUCKET_NAME,
             Key=s3_key,
-            Body=file_bytes,
-            ContentType=guess_content_type(sanitized_name),
-            Metadata={'request-id': request_id, 'original-filename': original_filename}
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=PRESIGNED_URL_EXPIRATION
         )
-        logger.info(f"Archivo subido: s3://{BUCKET_NAME}/{s3_key}")
+        logger.info(f"URL prefirmada generada para s3://{BUCKET_NAME}/{s3_key}. Request ID: {request_id}")
 
-        # Notificación de éxito (opcional)
-        log_activity(request_id, context, s3_key)
+        return build_response(200, {
+            'request_id': request_id,
+            's3_key': s3_key,
+            'upload_url': presigned['url'],
+            'fields': presigned['fields'],
+            'expires_in': PRESIGNED_URL_EXPIRATION,
+            'max_size': MAX_UPLOAD_BYTES
+        })
+
+    except Exception as ex:
+        err = str(ex)
+        trace = traceback.format_exc()
+        logger.error(f"Error generando URL prefirmada: {err}")
+        logger.error(trace)
+        notify_error('PresignError', err, request_id, context.aws_request_id, trace)
+        return build_response(500, {'message': 'Error interno al generar la URL de carga', 'request_id': request_id})
 
-        return build_response(200, {'message': 'Archivo subido correctamente', 's3_key': s3_key})
 
+def handle_upload_session(event, context, route):
+    """
+    API de sesiones de carga multiparte reanudables:
+    - POST   /upload/session           crea la carga multiparte en S3
+    - GET    /upload/session           lista las partes ya confirmadas por S3 (para reanudar)
+    - POST   /upload/session/parts     devuelve URLs prefirmadas para las partes indicadas
+    - POST   /upload/session/complete  completa la carga con los ETags de las partes
+    - DELETE /upload/session           aborta la carga
+
+    Args:
+        event (dict): Evento de API Gateway
+        context (LambdaContext): Contexto de ejecución Lambda
+        route (str): Recurso de API Gateway invocado
+
+    Returns:
+        dict: Respuesta HTTP
+    """
+    request_id = str(uuid.uuid4())
+    method = event.get('httpMethod', 'POST').upper()
+    try:
+        if method == 'GET':
+            params = event.get('queryStringParameters') or {}
+        else:
+            params = parse_json_body(event)
+            if params is None:
+                return build_response(400, 'Cuerpo de solicitud no es JSON válido')
+
+        if route.endswith('/upload/session') and method == 'POST':
+            return create_upload_session(params, request_id)
+
+        # El resto de operaciones actúan sobre una sesión existente
+        s3_key = params.get('s3_key', '')
+        upload_id = params.get('upload_id')
+        if not upload_id or not is_raw_excel_key(s3_key):
+            return build_response(400, 'Sesión de carga inválida')
+
+        if route.endswith('/upload/session') and method == 'GET':
+            return build_response(200, {'s3_key': s3_key, 'upload_id': upload_id, 'parts': list_uploaded_parts(s3_key, upload_id)})
+
+        if route.endswith('/upload/session') and method == 'DELETE':
+            s3.abort_multipart_upload(Bucket=BUCKET_NAME, Key=s3_key, UploadId=upload_id)
+            logger.info(f"Carga multiparte abortada: s3://{BUCKET_NAME}/{s3_key}")
+            return build_response(200, {'message': 'Carga cancelada', 's3_key': s3_key})
+
+        if route.endswith('/upload/session/parts'):
+            part_numbers = params.get('part_numbers') or []
+            if (not part_numbers or len(part_numbers) > MAX_PART_URLS_PER_REQUEST
+                    or not all(isinstance(n, int) and 1 <= n <= 10000 for n in part_numbers)):
+                return build_response(400, f'Se requieren entre 1 y {MAX_PART_URLS_PER_REQUEST} números de parte válidos')
+            urls = {
+                str(n): s3.generate_presigned_url(
+                    'upload_part',
+                    Params={'Bucket': BUCKET_NAME, 'Key': s3_key, 'UploadId': upload_id, 'PartNumber': n},
+                    ExpiresIn=PRESIGNED_URL_EXPIRATION
+                )
+                for n in part_numbers
+            }
+            return build_response(200, {'urls': urls, 'expires_in': PRESIGNED_URL_EXPIRATION})
+
+        if route.endswith('/upload/session/complete'):
+            parts = params.get('parts') or []
+            if not parts:
+                return build_response(400, 'No se proporcionaron las partes de la carga')
+            s3.complete_multipart_upload(
+                Bucket=BUCKET_NAME,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': sorted(
+                    ({'PartNumber': int(p['part_number']), 'ETag': p['etag']} for p in parts),
+                    key=lambda p: p['PartNumber']
+                )}
+            )
+            logger.info(f"Carga multiparte completada: s3://{BUCKET_NAME}/{s3_key} ({len(parts)} partes)")
+            return build_response(200, {'message': 'Archivo subido correctamente', 's3_key': s3_key})
+
+        return build_response(400, 'Operación de sesión no soportada')
+
+    except s3.exceptions.NoSuchUpload:
+        return build_response(404, {'message': 'La sesión de carga no existe o expiró', 'request_id': request_id})
     except Exception as ex:
         err = str(ex)
         trace = traceback.format_exc()
-        logger.error(f"Error interno: {err}")
+        logger.error(f"Error en sesión de carga: {err}")
         logger.error(trace)
-        notify_error('InternalError', err, request_id, context.aws_request_id, trace)
-        return build_response(500, {'message': 'Error interno al procesar el archivo', 'request_id': request_id})
+        notify_error('UploadSessionError', err, request_id, context.aws_request_id, trace)
+        return build_response(500, {'message': 'Error interno en la sesión de carga', 'request_id': request_id})
+
+
+def create_upload_session(params, request_id):
+    """
+    Crea una carga multiparte en S3 y devuelve los datos de la sesión.
+    """
+    original_filename = params.get('filename')
+    size = params.get('size')
+    if not original_filename:
+        return build_response(400, 'No se proporcionó el nombre del archivo')
+    if not isinstance(size, int) or size <= 0 or size > MAX_UPLOAD_BYTES:
+        return build_response(400, f'Tamaño de archivo inválido (máximo {MAX_UPLOAD_BYTES} bytes)')
+
+    sanitized_name = sanitize_filename(original_filename)
+    if sanitized_name.lower().split('.')[-1] not in ALLOWED_EXTENSIONS:
+        return build_response(400, 'Solo se permiten archivos Excel (.xlsx, .xls)')
+
+    duplicate_response = build_duplicate_response(params.get('sha256'), request_id)
+    if duplicate_response:
+        return duplicate_response
+
+    s3_key = build_raw_excel_key(request_id, sanitized_name)
+    upload = s3.create_multipart_upload(
+        Bucket=BUCKET_NAME,
+        Key=s3_key,
+        ContentType=guess_content_type(sanitized_name),
+        Metadata={'request-id': request_id, 'original-filename': sanitized_name}
+    )
+    logger.info(f"Carga multiparte iniciada: s3://{BUCKET_NAME}/{s3_key}. Request ID: {request_id}")
+
+    return build_response(200, {
+        'request_id': request_id,
+        's3_key': s3_key,
+        'upload_id': upload['UploadId'],
+        'part_size': MULTIPART_PART_SIZE,
+        'total_parts': -(-size // MULTIPART_PART_SIZE)
+    })
+
+
+def list_uploaded_parts(s3_key, upload_id):
+    """
+    Lista las partes que S3 ya confirmó para una carga multiparte.
+    """
+    parts = []
+    paginator = s3.get_paginator('list_parts')
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Key=s3_key, UploadId=upload_id):
+        parts.extend(
+            {'part_number': p['PartNumber'], 'etag': p['ETag'], 'size': p['Size']}
+            for p in page.get('Parts', [])
+        )
+    return parts
+
+
+def handle_object_created(event, context):
+    """
+    Procesamiento posterior a una carga directa a S3 (evento ObjectCreated).
+    Registra el SHA-256 en el índice de deduplicación (eliminando las copias de un
+    contenido ya cargado) y la actividad de auditoría de cada objeto nuevo bajo
+    raw/excel/. La entrada del índice de un objeto se escribe
+    en segundo plano mientras se lee el siguiente; todas terminan antes de responder.
+
+    Args:
+        event (dict): Evento de EventBridge ("Object Created") o notificación S3
+        context (LambdaContext): Contexto de ejecución Lambda
+
+    Returns:
+        dict: Resumen de los objetos procesados
+    """
+    processed = []
+    with background.group() as index_writes:
+        for bucket, s3_key in extract_s3_objects(event):
+            if process_created_object(bucket, s3_key, context, index_writes):
+                processed.append(s3_key)
+
+    return {'processed': processed}
+
+
+def process_created_object(bucket, s3_key, context, index_writes):
+    """
+    Indexa y audita un objeto creado bajo raw/excel/.
+
+    Returns:
+        bool: False si el objeto se ignoró (fuera de raw/excel/, interno o ya indexado)
+    """
+    if not s3_key.startswith(f"{RAW_EXCEL_PREFIX}/") or '/_' in s3_key:
+        logger.info(f"Objeto ignorado: s3://{bucket}/{s3_key}")
+        return False
+
+    head = s3.head_object(Bucket=bucket, Key=s3_key)
+    if head.get('Metadata', {}).get('content-index') == 'upload':
+        # Cargas Base64: el hash y la auditoría ya se registraron al escribir el objeto
+        logger.info(f"Objeto ya indexado: s3://{bucket}/{s3_key}")
+        return False
+
+    obj = s3.get_object(Bucket=bucket, Key=s3_key)
+    request_id = obj.get('Metadata', {}).get('request-id') or str(uuid.uuid4())
+    logger.info(f"Objeto recibido: s3://{bucket}/{s3_key} ({obj.get('ContentLength')} bytes)")
+
+    # Registrar el hash para que las cargas siguientes del mismo contenido se dedupliquen
+    hasher = hashlib.sha256()
+    for chunk in obj['Body'].iter_chunks(chunk_size=1024 * 1024):
+        hasher.update(chunk)
+    index_writes.submit(index_created_object, bucket, s3_key, hasher.hexdigest(), obj.get('ContentLength'), request_id)
+
+    log_activity(request_id, context, s3_key)
+    return True
+
+
+def index_created_object(bucket, s3_key, sha256, size, request_id):
+    """
+    Reclama el SHA-256 de un objeto cargado directamente. Si el contenido ya pertenece
+    a otro objeto, elimina la copia para que no se convierta ni se almacene dos veces.
+    """
+    owner = content_index.claim(s3, bucket, sha256, s3_key, size, request_id)
+    if owner['s3_key'] != s3_key:
+        s3.delete_object(Bucket=bucket, Key=s3_key)
+        logger.info(f"Duplicado de s3://{bucket}/{owner['s3_key']} eliminado: s3://{bucket}/{s3_key}")
+
+
+def find_duplicate_result(sha256, request_id):
+    """
+    Si el SHA-256 calculado por el servidor ya está en el índice, devuelve el cuerpo de
+    respuesta que apunta al objeto existente para que no se vuelva a subir. En otro caso
+    devuelve None.
+    """
+    duplicate = content_index.lookup(s3, BUCKET_NAME, sha256)
+    if not duplicate:
+        return None
+    return duplicate_body(duplicate, sha256, request_id)
+
+
+def duplicate_body(owner, sha256, request_id):
+    """
+    Cuerpo de respuesta que apunta al objeto dueño de un contenido ya cargado.
+    """
+    logger.info(f"Archivo duplicado ({sha256}), ya existe en s3://{BUCKET_NAME}/{owner['s3_key']}")
+    return {
+        'message': 'El archivo ya había sido cargado',
+        'request_id': request_id,
+        's3_key': owner['s3_key'],
+        'sha256': sha256,
+        'duplicate': True
+    }
+
+
+def build_duplicate_response(sha256, request_id):
+    """
+    Respuesta HTTP para un SHA-256 enviado por el cliente que ya está en el índice, o None.
+    El servidor no verificó ese hash: la respuesta solo confirma el duplicado y el ID de la
+    carga original, sin revelar la clave del objeto.
+    """
+    if not isinstance(sha256, str) or not re.fullmatch(r'[0-9a-f]{64}', sha256):
+        return None
+    duplicate = content_index.lookup(s3, BUCKET_NAME, sha256)
+    if not duplicate:
+        return None
+    logger.info(f"Archivo duplicado ({sha256}) informado por el cliente. Request ID: {request_id}")
+    return build_response(200, {
+        'message': 'El archivo ya había sido cargado',
+        'request_id': request_id,
+        'original_request_id': duplicate.get('request_id'),
+        'duplicate': True
+    })
+
+
+def is_s3_event(event):
+    """
+    Indica si el evento proviene de S3 (vía EventBridge o notificación directa).
+    """
+    if event.get('source') == 'aws.s3':
+        return True
+    records = event.get('Records') or []
+    return bool(records) and records[0].get('eventSource') == 'aws:s3'
+
+
+def extract_s3_objects(event):
+    """
+    Devuelve pares (bucket, key) de un evento S3 en formato EventBridge o de notificación.
+    """
+    if event.get('source') == 'aws.s3':
+        detail = event.get('detail', {})
+        return [(detail['bucket']['name'], detail['object']['key'])]
+    return [
+        (record['s3']['bucket']['name'], urllib.parse.unquote_plus(record['s3']['object']['key']))
+        for record in event.get('Records', [])
+    ]
+
+
+def parse_json_body(event):
+    """
+    Obtiene el cuerpo de la solicitud como dict. Devuelve None si no es JSON válido.
+    """
+    body = event.get('body') or {}
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except json.JSONDecodeError:
+            return None
+    return body if isinstance(body, dict) else None
+
+
+def is_raw_excel_key(s3_key):
+    """
+    Valida que una clave recibida del cliente pertenezca a raw/excel/.
+    """
+    return s3_key.startswith(f"{RAW_EXCEL_PREFIX}/") and '..' not in s3_key.split('/')
+
+
+def build_raw_excel_key(request_id, sanitized_name):
+    """
+    Construye la clave S3 raw/excel/{fecha}/{timestamp}_{request_id}_{nombre}.
+    """
+    now = datetime.datetime.utcnow()
+    return f"{RAW_EXCEL_PREFIX}/{now.strftime('%Y-%m-%d')}/{now.strftime('%Y%m%dT%H%M%SZ')}_{request_id}_{sanitized_name}"
 
 
 def sanitize_filename(filename):
@@ -113,41 +704,30 @@ def guess_content_type(filename):
 
 def notify_error(error_type, error_message, request_id, lambda_request_id, stack_trace=None):
     """
-    Envía una notificación de error a SNS si está configurado.
+    Reporta un error al agregador: las repeticiones de la misma huella se resumen
+    en una sola notificación SNS por ventana, publicada en segundo plano.
     """
-    if not ERROR_TOPIC_ARN:
-        logger.warning('ERROR_TOPIC_ARN no configurado, no se envía notificación')
-        return
-    message = {
-        'error_type': error_type,
-        'error_message': error_message,
-        'request_id': request_id,
-        'lambda_request_id': lambda_request_id,
-        'timestamp': datetime.datetime.utcnow().isoformat()
-    }
-    if stack_trace:
-        message['stack_trace'] = stack_trace
-    try:
-        sns.publish(TopicArn=ERROR_TOPIC_ARN, Subject=f"Error Lambda: {error_type}", Message=json.dumps(message))
-        logger.info('Notificación de error enviada')
-    except Exception as e:
-        logger.error(f"Fallo al enviar notificación SNS: {e}")
+    alerts.report(
+        error_type,
+        error_message,
+        stack_trace=stack_trace,
+        request_id=request_id,
+        lambda_request_id=lambda_request_id
+    )
 
 
 def log_activity(request_id, context, s3_key):
     """
-    Registra un log básico de la subida en S3 para auditoría.
+    Registra la subida en el log de auditoría con búfer (Firehose), sin bloquear la respuesta.
     """
     try:
-        log_key = f"logs/{datetime.datetime.utcnow().strftime('%Y-%m-%d')}/upload_{request_id}.json"
-        record = {
-            'timestamp': datetime.datetime.utcnow().isoformat(),
-            'lambda_name': context.function_name,
-            'lambda_request_id': context.aws_request_id,
-            'request_id': request_id,
-            's3_key': s3_key
-        }
-        s3.put_object(Bucket=BUCKET_NAME, Key=log_key, Body=json.dumps(record), ContentType='application/json')
+        audit.emit(
+            'file_upload',
+            lambda_name=context.function_name,
+            lambda_request_id=context.aws_request_id,
+            request_id=request_id,
+            s3_key=s3_key
+        )
     except Exception as e:
         logger.error(f"Error registrando actividad: {e}")
 
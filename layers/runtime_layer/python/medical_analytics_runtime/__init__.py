@@ -0,0 +1 @@
+# Código compartido en tiempo de ejecución por las funciones Lambda del sistema de analítica médica
@@ -0,0 +1,259 @@
+"""
+Agregación de notificaciones de error con límite por ventana.
+
+Cuando la API de origen cae o una plantilla defectuosa se repite, cada fallo publicaba
+su propio mensaje SNS (con la traza completa) de forma síncrona. ErrorAggregator agrupa
+los errores por huella (tipo, ubicación y plantilla del mensaje, sin IDs ni números) y
+publica un solo resumen por huella y ventana de tiempo:
+
+- La primera ocurrencia de una huella en la ventana se publica, con su traza y el
+  número de ocurrencias de la ventana anterior.
+- Las siguientes solo incrementan el contador compartido.
+
+El contador vive en un store compartido por todos los contenedores calientes:
+- DynamoDBStore: tabla con contador atómico (UpdateItem ADD) y TTL.
+- LocalStore: stand-in en memoria para pruebas y desarrollo, con la misma semántica.
+
+report() solo encola el error; el contador y la publicación se hacen en un hilo en
+segundo plano, de modo que la latencia de SNS queda fuera de la solicitud que falló.
+Los handlers llaman a flush() antes de terminar.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from medical_analytics_runtime.clients import get_client
+
+logger = logging.getLogger()
+
+DEFAULT_WINDOW_SECONDS = 300
+
+# Partes variables del mensaje que no deben separar errores de la misma causa
+MESSAGE_PATTERNS = (
+    (re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'), '<uuid>'),
+    (re.compile(r'\b[0-9a-fA-F]{16,}\b'), '<hex>'),
+    (re.compile(r'(["\']).*?\1'), '<str>'),
+    (re.compile(r'\b\w+://\S+'), '<url>'),
+    (re.compile(r'\S+/\S+'), '<path>'),
+    (re.compile(r'\d+(\.\d+)?'), '<n>'),
+)
+TRACE_FRAME = re.compile(r'File "([^"]+)", line \d+, in (\S+)')
+
+
+class DynamoDBStore:
+    """
+    Contadores por huella y ventana en una tabla DynamoDB (clave digest_key, TTL expires_at).
+    """
+
+    def __init__(self, table_name, client=None):
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client('dynamodb')
+        return self._client
+
+    def increment(self, key, amount, expires_at):
+        """
+        Suma amount al contador de key y devuelve el valor resultante.
+        """
+        response = self.client.update_item(
+            TableName=self.table_name,
+            Key={'digest_key': {'S': key}},
+            UpdateExpression='ADD occurrences :amount SET expires_at = if_not_exists(expires_at, :expires_at)',
+            ExpressionAttributeValues={':amount': {'N': str(amount)}, ':expires_at': {'N': str(expires_at)}},
+            ReturnValues='UPDATED_NEW'
+        )
+        return int(response['Attributes']['occurrences']['N'])
+
+    def count(self, key):
+        response = self.client.get_item(TableName=self.table_name, Key={'digest_key': {'S': key}})
+        return int(response.get('Item', {}).get('occurrences', {}).get('N', 0))
+
+
+class LocalStore:
+    """
+    Stand-in local de DynamoDBStore: contadores en memoria protegidos por un lock.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def increment(self, key, amount, expires_at):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + amount
+            return self._counts[key]
+
+    def count(self, key):
+        with self._lock:
+            return self._counts.get(key, 0)
+
+
+class ErrorAggregator:
+    """
+    Cuenta errores por huella y publica un resumen SNS por huella y ventana.
+    """
+
+    def __init__(self, store, topic_arn, source, window_seconds=DEFAULT_WINDOW_SECONDS, publisher=None):
+        """
+        Args:
+            store: DynamoDBStore o LocalStore
+            topic_arn (str): Tópico SNS de errores (vacío desactiva la publicación)
+            source (str): Componente que reporta (nombre de la Lambda)
+            window_seconds (int): Duración de la ventana de agregación
+            publisher (callable, opcional): Recibe (subject, message); por defecto sns.publish
+        """
+        self.store = store
+        self.topic_arn = topic_arn
+        self.source = source
+        self.window_seconds = window_seconds
+        self.publisher = publisher or self._publish_sns
+        self._pending = {}
+        self._futures = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='error-aggregator')
+
+    @classmethod
+    def from_env(cls, source):
+        """
+        Construye el agregador según el entorno: ALERT_STATE_TABLE usa DynamoDB y, si
+        no está definida (o ALERT_STATE=local), los contadores quedan en el contenedor.
+        """
+        table_name = os.environ.get('ALERT_STATE_TABLE')
+        store = LocalStore() if os.environ.get('ALERT_STATE') == 'local' or not table_name else DynamoDBStore(table_name)
+        return cls(
+            store,
+            os.environ.get('ERROR_TOPIC_ARN', ''),
+            source,
+            window_seconds=int(os.environ.get('ALERT_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS))
+        )
+
+    def report(self, error_type, message, location=None, stack_trace=None, **details):
+        """
+        Registra un error sin bloquear.
+
+        Args:
+            error_type (str): Tipo del error (nombre de la excepción)
+            message (str): Mensaje del error
+            location (str, opcional): Ubicación; por defecto el último marco de stack_trace
+            stack_trace (str, opcional): Traza, incluida solo en el resumen publicado
+            **details: Datos de la ocurrencia (request_id, s3_key, ...)
+
+        Returns:
+            str: Huella del error
+        """
+        if not self.topic_arn:
+            logger.warning('ERROR_TOPIC_ARN no configurado, no se envía notificación')
+            return None
+
+        location = location or trace_location(stack_trace) or self.source
+        fingerprint = error_fingerprint(error_type, location, message)
+        window = int(time.time() // self.window_seconds)
+
+        with self._lock:
+            pending = self._pending.get((fingerprint, window))
+            if pending:
+                pending['occurrences'] += 1
+                return fingerprint
+            self._pending[(fingerprint, window)] = {
+                'occurrences': 1,
+                'error_type': error_type,
+                'location': location,
+                'template': message_template(message),
+                'example': {'error_message': message, **details},
+                'stack_trace': stack_trace
+            }
+            self._futures = [future for future in self._futures if not future.done()]
+            self._futures.append(self._executor.submit(self._drain))
+        return fingerprint
+
+    def flush(self, timeout=5.0):
+        """
+        Espera a que los errores encolados se hayan contado y publicado.
+
+        Returns:
+            bool: False si se agotó el tiempo de espera
+        """
+        with self._lock:
+            futures = list(self._futures)
+        _, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            logger.warning('Tiempo agotado esperando la publicación de errores')
+        return not not_done
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for (fingerprint, window), entry in pending.items():
+            try:
+                self._deliver(fingerprint, window, entry)
+            except Exception as e:
+                logger.error(f"Error agregando la notificación {fingerprint}: {e}")
+
+    def _deliver(self, fingerprint, window, entry):
+        # La ventana expira del store después de la siguiente, que aún la consulta
+        expires_at = (window + 2) * self.window_seconds + 3600
+        total = self.store.increment(f"{fingerprint}#{window}", entry['occurrences'], expires_at)
+        if total > entry['occurrences']:
+            # Otro contenedor (o un drenado anterior) ya publicó esta huella en la ventana
+            return
+
+        window_start = datetime.datetime.utcfromtimestamp(window * self.window_seconds)
+        digest = {
+            'fingerprint': fingerprint,
+            'component': self.source,
+            'error_type': entry['error_type'],
+            'location': entry['location'],
+            'message_template': entry['template'],
+            'window_start': window_start.isoformat(),
+            'window_seconds': self.window_seconds,
+            'previous_window_occurrences': self.store.count(f"{fingerprint}#{window - 1}"),
+            'example': entry['example']
+        }
+        if entry['stack_trace']:
+            digest['stack_trace'] = entry['stack_trace']
+
+        subject = f"Error {self.source}: {entry['error_type']} en {entry['location']}"
+        self.publisher(subject[:100], json.dumps(digest, indent=2, default=str))
+        logger.info(f"Resumen de error {fingerprint[:12]} publicado")
+
+    def _publish_sns(self, subject, message):
+        get_client('sns').publish(TopicArn=self.topic_arn, Subject=subject, Message=message)
+
+
+def message_template(message):
+    """
+    Plantilla del mensaje sin partes variables ("Fila 12 de 'a.xlsx'" -> "Fila <n> de <str>").
+    """
+    template = str(message)
+    for pattern, placeholder in MESSAGE_PATTERNS:
+        template = pattern.sub(placeholder, template)
+    return template[:500]
+
+
+def trace_location(stack_trace):
+    """
+    Último marco de la traza como archivo:función (sin número de línea, estable entre versiones).
+    """
+    frames = TRACE_FRAME.findall(stack_trace or '')
+    if not frames:
+        return None
+    path, function = frames[-1]
+    return f"{os.path.basename(path)}:{function}"
+
+
+def error_fingerprint(error_type, location, message):
+    """
+    Huella SHA-256 (abreviada) de tipo, ubicación y plantilla del mensaje.
+    """
+    key = '\x1f'.join((error_type, location, message_template(message)))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
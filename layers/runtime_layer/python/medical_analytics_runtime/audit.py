@@ -0,0 +1,206 @@
+"""
+Registro de auditoría con búfer.
+
+En lugar de escribir un objeto S3 por evento, los registros se entregan a un sink que
+los agrupa por tiempo y tamaño en objetos NDJSON comprimidos:
+- FirehoseSink: Kinesis Data Firehose (buffering y compresión GZIP en el servicio).
+- LocalSink: stand-in local para pruebas y desarrollo, con la misma semántica de agrupación.
+
+AuditLogger.emit() solo encola el registro; un hilo en segundo plano lo envía al sink
+mientras el handler sigue trabajando. Los handlers llaman a flush() antes de terminar
+para no perder registros al congelarse el contenedor.
+"""
+import atexit
+import datetime
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from medical_analytics_runtime.clients import get_client
+
+logger = logging.getLogger()
+
+# Límites de PutRecordBatch de Firehose
+FIREHOSE_MAX_RECORDS = 500
+FIREHOSE_MAX_BATCH_BYTES = 4 * 1024 * 1024
+FIREHOSE_MAX_RETRIES = 3
+
+
+class FirehoseSink:
+    """
+    Envía registros NDJSON a un delivery stream de Kinesis Data Firehose.
+    """
+
+    def __init__(self, stream_name, client=None):
+        self.stream_name = stream_name
+        self._client = client
+
+    @property
+    def client(self):
+        # El cliente se crea en el primer envío para no cargar el arranque en frío
+        if self._client is None:
+            self._client = get_client('firehose')
+        return self._client
+
+    def send(self, lines):
+        """
+        Envía una lista de líneas (bytes terminados en salto de línea) en lotes de PutRecordBatch.
+        """
+        batch, batch_bytes = [], 0
+        for line in lines:
+            if batch and (len(batch) >= FIREHOSE_MAX_RECORDS or batch_bytes + len(line) > FIREHOSE_MAX_BATCH_BYTES):
+                self._put_batch(batch)
+                batch, batch_bytes = [], 0
+            batch.append(line)
+            batch_bytes += len(line)
+        if batch:
+            self._put_batch(batch)
+
+    def close(self):
+        pass
+
+    def _put_batch(self, lines):
+        records = [{'Data': line} for line in lines]
+        for attempt in range(FIREHOSE_MAX_RETRIES):
+            response = self.client.put_record_batch(DeliveryStreamName=self.stream_name, Records=records)
+            if not response.get('FailedPutCount'):
+                return
+            # Reintentar solo los registros rechazados (throttling del stream)
+            records = [
+                record for record, result in zip(records, response['RequestResponses'])
+                if result.get('ErrorCode')
+            ]
+            time.sleep(0.1 * (2 ** attempt))
+        logger.error(f"No se pudieron entregar {len(records)} registros de auditoría a {self.stream_name}")
+
+
+class LocalSink:
+    """
+    Stand-in local de Firehose: agrupa las líneas y escribe un archivo NDJSON gzip
+    cuando el búfer supera max_bytes o su antigüedad supera max_age segundos.
+    """
+
+    def __init__(self, directory, max_bytes=5 * 1024 * 1024, max_age=300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_started = None
+        atexit.register(self.close)
+
+    def send(self, lines):
+        if self._buffer_started is None:
+            self._buffer_started = time.monotonic()
+        self._buffer.extend(lines)
+        self._buffer_bytes += sum(len(line) for line in lines)
+        if self._buffer_bytes >= self.max_bytes or time.monotonic() - self._buffer_started >= self.max_age:
+            self._write()
+
+    def close(self):
+        if self._buffer:
+            self._write()
+
+    def _write(self):
+        now = datetime.datetime.utcnow()
+        directory = os.path.join(self.directory, now.strftime('year=%Y/month=%m/day=%d'))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"audit-{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.ndjson.gz")
+        with gzip.open(path, 'wb') as f:
+            f.writelines(self._buffer)
+        self._buffer, self._buffer_bytes, self._buffer_started = [], 0, None
+
+
+class AuditLogger:
+    """
+    Encola registros de auditoría y los entrega al sink desde un hilo en segundo plano.
+    """
+
+    def __init__(self, sink, source):
+        self.sink = sink
+        self.source = source
+        self._pending = []
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._worker = None
+
+    @classmethod
+    def from_env(cls, source):
+        """
+        Construye el logger según el entorno: Firehose con AUDIT_STREAM_NAME, o el
+        stand-in local (en AUDIT_LOCAL_DIR) con AUDIT_SINK=local o fuera de Lambda
+        (sin AWS_LAMBDA_FUNCTION_NAME).
+
+        Raises:
+            ValueError: Si una Lambda no tiene AUDIT_STREAM_NAME ni AUDIT_SINK=local; los
+                registros quedarían en /tmp del contenedor y se perderían
+        """
+        stream_name = os.environ.get('AUDIT_STREAM_NAME')
+        if os.environ.get('AUDIT_SINK') == 'local' or (not stream_name and not os.environ.get('AWS_LAMBDA_FUNCTION_NAME')):
+            return cls(LocalSink(os.environ.get('AUDIT_LOCAL_DIR', '/tmp/audit')), source)
+        if not stream_name:
+            raise ValueError(f"{source}: falta AUDIT_STREAM_NAME (o AUDIT_SINK=local) para la auditoría")
+        return cls(FirehoseSink(stream_name), source)
+
+    def emit(self, action, **fields):
+        """
+        Encola un registro de auditoría sin bloquear.
+        """
+        record = {
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'source': self.source,
+            'action': action,
+            **fields
+        }
+        line = (json.dumps(record, default=str) + '\n').encode('utf-8')
+        with self._condition:
+            self._pending.append(line)
+            self._condition.notify_all()
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='audit-logger', daemon=True)
+                self._worker.start()
+
+    def flush(self, timeout=5.0):
+        """
+        Espera a que los registros encolados se hayan entregado al sink.
+
+        Returns:
+            bool: False si se agotó el tiempo de espera
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._pending or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning('Tiempo agotado esperando la entrega de registros de auditoría')
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout=5.0):
+        """
+        Entrega los registros pendientes y vacía el búfer del sink.
+        """
+        delivered = self.flush(timeout)
+        self.sink.close()
+        return delivered
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                lines, self._pending = self._pending, []
+                self._in_flight = len(lines)
+            try:
+                self.sink.send(lines)
+            except Exception as e:
+                logger.error(f"Error entregando registros de auditoría: {e}")
+            finally:
+                with self._condition:
+                    self._in_flight = 0
+                    self._condition.notify_all()
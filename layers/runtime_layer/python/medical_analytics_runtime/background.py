@@ -0,0 +1,117 @@
+"""
+Escrituras secundarias en segundo plano.
+
+Después de la escritura principal (el objeto de datos), los handlers hacían varias
+llamadas independientes una detrás de otra: metadatos, índices, checkpoints. Cada una
+espera un viaje completo a S3 (con KMS). BackgroundIO las lanza a la vez en un pool de
+hilos compartido por el contenedor:
+
+    with background.group() as tasks:
+        tasks.submit(storage.put_object, s3, bucket, metadata_key, body, 'application/json')
+        tasks.submit(index.save)
+    # Aquí ya terminaron todas; si alguna falló, su excepción se relanza al salir del bloque
+
+La escritura principal no pasa por aquí: sigue en el camino crítico y las tareas del
+grupo se lanzan solo cuando ya terminó. El handler no devuelve la respuesta hasta que el
+grupo terminó, por lo que el contenedor nunca se congela con escrituras a medias.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger()
+
+# Las tareas usan el pool de conexiones de los clientes (CLIENT_MAX_POOL_CONNECTIONS)
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 30.0
+
+
+class BackgroundIO:
+    """
+    Pool de hilos para escrituras secundarias, reutilizado entre invocaciones calientes.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, name='background-io'):
+        """
+        Args:
+            max_workers (int): Tareas en paralelo (compartidas por todos los grupos)
+            name (str): Prefijo del nombre de los hilos
+        """
+        self.max_workers = max_workers
+        self.name = name
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(max_workers=int(os.environ.get('BACKGROUND_IO_WORKERS', DEFAULT_WORKERS)))
+
+    def group(self, timeout=DEFAULT_TIMEOUT):
+        """
+        Grupo de tareas de una solicitud; al salir del bloque with se esperan todas.
+
+        Args:
+            timeout (float): Segundos máximos de espera al cerrar el grupo
+        """
+        return TaskGroup(self, timeout)
+
+    def submit(self, fn, *args, **kwargs):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor.submit(fn, *args, **kwargs)
+
+
+class TaskGroup:
+    """
+    Tareas lanzadas por una solicitud. Los grupos de solicitudes concurrentes (p. ej. los
+    archivos de un lote) comparten el pool pero se esperan por separado.
+    """
+
+    def __init__(self, io, timeout=DEFAULT_TIMEOUT):
+        self.io = io
+        self.timeout = timeout
+        self._futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Lanza fn(*args, **kwargs) en segundo plano.
+
+        Returns:
+            concurrent.futures.Future: Resultado de la tarea
+        """
+        future = self.io.submit(fn, *args, **kwargs)
+        self._futures.append(future)
+        return future
+
+    def wait(self):
+        """
+        Espera todas las tareas lanzadas hasta ahora.
+
+        Raises:
+            TimeoutError: Si alguna no terminó dentro del tiempo del grupo
+            Exception: El error de la primera tarea fallida (las demás se esperan igual)
+        """
+        futures, self._futures = self._futures, []
+        _, not_done = wait(futures, timeout=self.timeout)
+        if not_done:
+            raise TimeoutError(f"{len(not_done)} escrituras en segundo plano no terminaron en {self.timeout}s")
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.wait()
+            return False
+        # Ya hay un error en curso: esperar igual (sin ocultarlo) para no dejar escrituras a medias
+        try:
+            self.wait()
+        except Exception as e:
+            logger.error(f"Error en una escritura en segundo plano: {e}")
+        return False
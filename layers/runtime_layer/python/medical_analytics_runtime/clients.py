@@ -0,0 +1,89 @@
+"""
+Clientes de AWS perezosos, memoizados y con configuración común.
+
+Crear un cliente boto3 carga el modelo JSON del servicio (decenas de ms por cliente);
+hacerlo al importar el módulo lo suma a la fase de init de cada arranque en frío,
+aunque la invocación no use el servicio. lazy_client() devuelve un proxy que crea el
+cliente real en el primer uso y lo reutiliza durante la vida del contenedor.
+
+Todos los clientes comparten client_config(): pool de conexiones dimensionado a la
+concurrencia de la Lambda (CLIENT_MAX_POOL_CONNECTIONS), reintentos adaptativos,
+TCP keepalive y timeouts de conexión/lectura acotados. Así las escrituras concurrentes
+reutilizan conexiones TLS ya abiertas en lugar de esperar un hueco en el pool.
+"""
+import os
+import threading
+
+_clients = {}
+_lock = threading.Lock()
+
+# Valores por defecto; cada Lambda los ajusta con variables de entorno
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_CONNECT_TIMEOUT = 3  # segundos
+DEFAULT_READ_TIMEOUT = 30  # segundos; las partes de 8 MiB caben con holgura
+
+
+def client_config():
+    """
+    Configuración de botocore común a todos los clientes.
+
+    Returns:
+        botocore.config.Config: Pool, reintentos adaptativos, keepalive y timeouts
+    """
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=int(os.environ.get('CLIENT_MAX_POOL_CONNECTIONS', DEFAULT_MAX_POOL_CONNECTIONS)),
+        retries={
+            'mode': 'adaptive',  # Reintentos estándar más limitación de tasa del lado del cliente
+            'max_attempts': int(os.environ.get('CLIENT_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+        },
+        tcp_keepalive=True,
+        connect_timeout=float(os.environ.get('CLIENT_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)),
+        read_timeout=float(os.environ.get('CLIENT_READ_TIMEOUT', DEFAULT_READ_TIMEOUT))
+    )
+
+
+def get_client(service_name):
+    """
+    Devuelve el cliente del servicio, creándolo la primera vez (seguro entre hilos).
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                import boto3  # Se importa aquí para no cargar boto3 si el contenedor nunca lo usa
+                client = boto3.client(service_name, config=client_config())
+                _clients[service_name] = client
+    return client
+
+
+def reset_clients():
+    """
+    Descarta los clientes memoizados (pruebas y cambios de credenciales).
+    """
+    with _lock:
+        _clients.clear()
+
+
+class LazyClient:
+    """
+    Proxy de un cliente boto3 que lo construye en el primer acceso a un atributo.
+    Permite mantener el uso habitual a nivel de módulo (s3.put_object(...),
+    s3.exceptions.NoSuchKey) sin pagar la creación durante el init.
+    """
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+
+    def __getattr__(self, name):
+        return getattr(get_client(self.service_name), name)
+
+    def __repr__(self):
+        return f"LazyClient({self.service_name!r})"
+
+
+def lazy_client(service_name):
+    return LazyClient(service_name)
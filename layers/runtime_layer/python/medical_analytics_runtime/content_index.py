@@ -0,0 +1,77 @@
+"""
+Índice de contenido de los libros cargados: SHA-256 -> objeto bajo raw/excel/.
+
+Cada entrada es un JSON en raw/excel/_index/{sha256}.json. La primera carga de un
+contenido la reclama con una escritura condicional (IfNoneMatch); las siguientes
+reciben la entrada existente y se tratan como duplicadas. file_processor y
+excel_converter reclaman el mismo hash de forma independiente y coinciden en el
+dueño aunque dos cargas idénticas lleguen a la vez.
+"""
+import datetime
+import json
+import logging
+
+from botocore.exceptions import ClientError
+
+from medical_analytics_runtime import storage
+
+logger = logging.getLogger()
+
+INDEX_PREFIX = 'raw/excel/_index'
+CONFLICT_CODES = ('PreconditionFailed', 'ConditionalRequestConflict')
+
+
+def index_key(sha256):
+    return f"{INDEX_PREFIX}/{sha256}.json"
+
+
+def lookup(client, bucket, sha256):
+    """
+    Busca un SHA-256 en el índice.
+
+    Returns:
+        dict: Entrada del índice, o None si el contenido no se ha cargado
+    """
+    try:
+        return json.loads(storage.get_object(client, bucket, index_key(sha256)))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+            raise
+        return None
+
+
+def claim(client, bucket, sha256, s3_key, size, request_id):
+    """
+    Registra s3_key como dueño de un SHA-256 si nadie lo ha reclamado.
+
+    Args:
+        client: Cliente S3
+        bucket (str): Bucket del índice
+        sha256 (str): Hash del contenido
+        s3_key (str): Objeto que contiene el contenido
+        size (int): Tamaño del objeto en bytes
+        request_id (str): ID de la carga que creó el objeto
+
+    Returns:
+        dict: Entrada del dueño; su s3_key es distinto de s3_key si el contenido ya existía
+    """
+    entry = {
+        'sha256': sha256,
+        's3_key': s3_key,
+        'size': size,
+        'request_id': request_id,
+        'timestamp': datetime.datetime.utcnow().isoformat()
+    }
+    try:
+        # Sin compresión: el índice se consulta por clave exacta y cada entrada ocupa unos pocos bytes
+        storage.put_object(
+            client, bucket, index_key(sha256), json.dumps(entry), 'application/json', codec='none',
+            IfNoneMatch='*'
+        )
+        return entry
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in CONFLICT_CODES:
+            raise
+    owner = lookup(client, bucket, sha256)
+    logger.info(f"El contenido {sha256} ya pertenece a s3://{bucket}/{owner['s3_key']}")
+    return owner
@@ -0,0 +1,203 @@
+"""
+Claves de idempotencia para solicitudes HTTP que escriben datos.
+
+Cuando el navegador reintenta después de un 504 de API Gateway, la Lambda original
+puede seguir ejecutándose (o haber terminado). Con el encabezado Idempotency-Key, la
+primera solicitud reclama la clave con una escritura condicional; al terminar guarda
+su respuesta con un TTL. Las repeticiones devuelven la respuesta guardada sin volver
+a decodificar ni escribir en S3; si la primera aún está en curso reciben 409.
+
+Stores disponibles (misma semántica):
+- DynamoDBIdempotencyStore: tabla con escrituras condicionales y TTL en expires_at.
+- LocalIdempotencyStore: stand-in en memoria para pruebas y desarrollo.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from medical_analytics_runtime.clients import get_client
+
+logger = logging.getLogger()
+
+HEADER_NAME = 'Idempotency-Key'
+DEFAULT_TTL_SECONDS = 24 * 3600
+# Tiempo máximo que una solicitud mantiene la clave reclamada (mayor que el timeout de la Lambda)
+DEFAULT_LOCK_SECONDS = 120
+VALID_KEY = re.compile(r'^[\x21-\x7e]{1,255}$')
+
+IN_PROGRESS = 'IN_PROGRESS'
+COMPLETED = 'COMPLETED'
+
+
+class DynamoDBIdempotencyStore:
+    """
+    Registros de idempotencia en DynamoDB (clave idempotency_key, TTL expires_at).
+    """
+
+    def __init__(self, table_name, client=None):
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client('dynamodb')
+        return self._client
+
+    def claim(self, key, now, lock_seconds, ttl_seconds):
+        """
+        Reclama la clave si no existe, expiró o su solicitud en curso quedó abandonada.
+
+        Returns:
+            dict: None si se reclamó; en otro caso el registro existente
+        """
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    'idempotency_key': {'S': key},
+                    'status': {'S': IN_PROGRESS},
+                    'locked_until': {'N': str(int(now + lock_seconds))},
+                    'expires_at': {'N': str(int(now + ttl_seconds))}
+                },
+                ConditionExpression=(
+                    'attribute_not_exists(idempotency_key) OR expires_at < :now '
+                    'OR (#status = :in_progress AND locked_until < :now)'
+                ),
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':now': {'N': str(int(now))}, ':in_progress': {'S': IN_PROGRESS}}
+            )
+            return None
+        except self.client.exceptions.ConditionalCheckFailedException:
+            item = self.client.get_item(
+                TableName=self.table_name, Key={'idempotency_key': {'S': key}}, ConsistentRead=True
+            ).get('Item', {})
+            record = {'status': item.get('status', {}).get('S', IN_PROGRESS)}
+            if 'response' in item:
+                record['response'] = json.loads(item['response']['S'])
+            return record
+
+    def complete(self, key, response, now, ttl_seconds):
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                'idempotency_key': {'S': key},
+                'status': {'S': COMPLETED},
+                'response': {'S': json.dumps(response)},
+                'expires_at': {'N': str(int(now + ttl_seconds))}
+            }
+        )
+
+    def release(self, key):
+        self.client.delete_item(TableName=self.table_name, Key={'idempotency_key': {'S': key}})
+
+
+class LocalIdempotencyStore:
+    """
+    Stand-in local de DynamoDBIdempotencyStore: registros en memoria protegidos por un lock.
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, now, lock_seconds, ttl_seconds):
+        with self._lock:
+            record = self._records.get(key)
+            abandoned = record and record['status'] == IN_PROGRESS and record['locked_until'] < now
+            if record is None or record['expires_at'] < now or abandoned:
+                self._records[key] = {
+                    'status': IN_PROGRESS, 'locked_until': now + lock_seconds, 'expires_at': now + ttl_seconds
+                }
+                return None
+            return {field: value for field, value in record.items() if field in ('status', 'response')}
+
+    def complete(self, key, response, now, ttl_seconds):
+        with self._lock:
+            self._records[key] = {
+                'status': COMPLETED, 'response': json.loads(json.dumps(response)), 'expires_at': now + ttl_seconds
+            }
+
+    def release(self, key):
+        with self._lock:
+            self._records.pop(key, None)
+
+
+class Idempotency:
+    """
+    Ejecuta una solicitud una sola vez por clave y reutiliza su respuesta.
+    """
+
+    def __init__(self, store, ttl_seconds=DEFAULT_TTL_SECONDS, lock_seconds=DEFAULT_LOCK_SECONDS):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+
+    @classmethod
+    def from_env(cls):
+        """
+        IDEMPOTENCY_TABLE usa DynamoDB; sin ella (o con IDEMPOTENCY_STORE=local) los
+        registros quedan en memoria del contenedor.
+        """
+        table_name = os.environ.get('IDEMPOTENCY_TABLE')
+        if os.environ.get('IDEMPOTENCY_STORE') == 'local' or not table_name:
+            store = LocalIdempotencyStore()
+        else:
+            store = DynamoDBIdempotencyStore(table_name)
+        return cls(store, ttl_seconds=int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', DEFAULT_TTL_SECONDS)))
+
+    def run(self, key, process, conflict_response):
+        """
+        Ejecuta process() si la clave no se ha usado; en otro caso devuelve la respuesta guardada.
+
+        Args:
+            key (str): Clave de idempotencia (con el prefijo de la ruta)
+            process (callable): Procesa la solicitud y devuelve la respuesta HTTP
+            conflict_response (callable): Respuesta cuando la solicitud original sigue en curso
+
+        Returns:
+            dict: Respuesta HTTP (las repeticiones llevan Idempotent-Replayed: true)
+        """
+        record = self.store.claim(key, time.time(), self.lock_seconds, self.ttl_seconds)
+        if record is not None:
+            if record['status'] == COMPLETED:
+                logger.info(f"Solicitud repetida con clave de idempotencia {key}; se devuelve la respuesta guardada")
+                response = dict(record['response'])
+                response['headers'] = {**response.get('headers', {}), 'Idempotent-Replayed': 'true'}
+                return response
+            return conflict_response()
+
+        try:
+            response = process()
+        except Exception:
+            self.store.release(key)
+            raise
+        try:
+            if response.get('statusCode', 500) >= 500:
+                # Los errores del servidor no se guardan: el reintento debe volver a procesarse
+                self.store.release(key)
+            else:
+                self.store.complete(key, response, time.time(), self.ttl_seconds)
+        except Exception as e:
+            # La carga ya se hizo; sin registro, un reintento se procesará otra vez al vencer el bloqueo
+            logger.error(f"Error guardando la respuesta de la clave de idempotencia {key}: {e}")
+        return response
+
+
+def get_idempotency_key(event):
+    """
+    Valor del encabezado Idempotency-Key (sin distinguir mayúsculas), o None.
+
+    Raises:
+        ValueError: Si la clave no es ASCII imprimible de 1 a 255 caracteres
+    """
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == HEADER_NAME.lower()), None)
+    if value is None:
+        return None
+    if not VALID_KEY.match(value):
+        raise ValueError(f"{HEADER_NAME} debe tener entre 1 y 255 caracteres ASCII imprimibles")
+    return value
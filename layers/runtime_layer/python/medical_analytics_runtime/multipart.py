@@ -0,0 +1,144 @@
+"""
+Escritura de objetos S3 por partes con memoria acotada.
+
+S3MultipartWriter acumula bytes hasta completar una parte y la envía con upload_part;
+los objetos que caben en una parte se escriben con un único put_object. Con
+max_in_flight > 0 las partes se suben desde hilos en segundo plano mientras quien
+escribe sigue produciendo datos (p. ej. descargando la siguiente página de la API);
+la memoria queda acotada por part_size x (max_in_flight + 1).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Tamaño mínimo de parte que admite S3 (salvo la última)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3MultipartWriter:
+    """
+    Escritor de objetos S3 con memoria acotada.
+
+    Usar como context manager para abortar la carga multiparte si ocurre un error.
+    """
+
+    def __init__(self, client, bucket, key, part_size=MIN_PART_SIZE, max_in_flight=0, **object_args):
+        """
+        Args:
+            client: Cliente S3 de boto3
+            bucket (str): Bucket de destino
+            key (str): Clave del objeto
+            part_size (int): Bytes por parte (mínimo 5 MiB)
+            max_in_flight (int): Partes que pueden subirse en segundo plano (0 = síncrono)
+            **object_args: Argumentos de create_multipart_upload/put_object (ContentType, Metadata...)
+        """
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.object_args = object_args
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight) if max_in_flight > 0 else None
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+
+    def write(self, data):
+        """
+        Agrega bytes al objeto, enviando a S3 cada parte que se completa.
+        """
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+
+    def close(self):
+        """
+        Envía lo que quede en el búfer y completa el objeto.
+        """
+        if self._upload_id is None:
+            self.client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self.object_args)
+        else:
+            if self._buffer:
+                self._submit_part(bytes(self._buffer))
+            self._wait_parts()
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': sorted(self._parts, key=lambda part: part['PartNumber'])}
+            )
+        self._buffer = bytearray()
+        self._shutdown()
+
+    def abort(self):
+        """
+        Cancela la carga multiparte en curso, si existe.
+        """
+        try:
+            self._wait_parts()
+        except Exception:
+            pass  # La carga se aborta de todos modos
+        if self._upload_id is not None:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+        self._shutdown()
+
+    def _submit_part(self, data):
+        if self._upload_id is None:
+            upload = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.object_args)
+            self._upload_id = upload['UploadId']
+        part_number = len(self._parts) + len(self._futures) + 1
+        if self._executor is None:
+            self._upload_part(part_number, data)
+            return
+
+        # Esperar un hueco: como máximo max_in_flight partes en memoria además del búfer
+        self._slots.acquire()
+        self._futures = [future for future in self._futures if not self._collect(future)]
+        future = self._executor.submit(self._upload_part, part_number, data)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _upload_part(self, part_number, data):
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        part = {'PartNumber': part_number, 'ETag': response['ETag']}
+        if self._executor is None:
+            self._parts.append(part)
+        return part
+
+    def _collect(self, future):
+        """
+        Registra la parte de un envío terminado (relanza su error). Devuelve False si sigue en curso.
+        """
+        if not future.done():
+            return False
+        self._parts.append(future.result())
+        return True
+
+    def _wait_parts(self):
+        futures, self._futures = self._futures, []
+        for future in futures:
+            self._parts.append(future.result())
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,70 @@
+"""
+Límite de tasa por host (token bucket) compartido por los hilos de un contenedor.
+
+Con varias páginas descargándose en paralelo, la concurrencia por sí sola no garantiza
+respetar el límite de solicitudes por segundo de la API de origen. Cada host tiene un
+RateLimiter: acquire() reserva un token y, si no hay disponibles, espera lo necesario
+para que las solicitudes salgan a la tasa configurada (con ráfagas de hasta burst).
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Token bucket seguro entre hilos.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            rate (float): Solicitudes por segundo (0 o menos desactiva el límite)
+            burst (int): Solicitudes que pueden salir seguidas antes de aplicar la tasa
+            clock (callable): Reloj monotónico (reemplazable en pruebas)
+            sleep (callable): Espera en segundos (reemplazable en pruebas)
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Reserva un token, esperando si hace falta.
+
+        Returns:
+            float: Segundos de espera
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # El token se reserva aunque falte: quien llega después espera detrás de este
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+def host_limiter(url, rate, burst=1):
+    """
+    RateLimiter del host de la URL, compartido por todas las solicitudes del contenedor.
+    """
+    host = urlparse(url).netloc
+    limiter = _limiters.get(host)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(host)
+            if limiter is None:
+                limiter = _limiters[host] = RateLimiter(rate, burst)
+    return limiter
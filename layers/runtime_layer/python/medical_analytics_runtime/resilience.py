@@ -0,0 +1,341 @@
+"""
+Reintentos con backoff y circuit breaker para llamadas a servicios externos.
+
+RetryPolicy reintenta las operaciones que fallan con RetryableError: espera con backoff
+exponencial y jitter completo (los contenedores no reintentan al mismo tiempo), respeta
+el Retry-After de las respuestas 429/503 y no espera más allá del tiempo que le queda a
+la Lambda.
+
+CircuitBreaker evita insistir contra un servicio caído. Su estado vive en un store
+compartido entre invocaciones y contenedores:
+- closed: las llamadas pasan; los fallos consecutivos se cuentan.
+- open: tras failure_threshold fallos, las invocaciones fallan de inmediato
+  (CircuitOpenError) durante reset_seconds.
+- half_open: vencido ese plazo, una sola invocación prueba el servicio; si funciona el
+  circuito se cierra y si falla vuelve a abrirse. Si la prueba falla por un error local
+  (que no dice nada del servicio), release_probe() la devuelve para que otra invocación
+  pruebe de inmediato.
+
+Stores disponibles (misma semántica, escrituras condicionales sobre un número de versión):
+- DynamoDBCircuitStore: tabla con clave circuit_name.
+- LocalCircuitStore: stand-in en memoria para pruebas y desarrollo.
+"""
+import datetime
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+
+from medical_analytics_runtime.clients import get_client
+
+logger = logging.getLogger()
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_SECONDS = 300
+# Tiempo que una invocación conserva la prueba half_open. Debe superar el timeout de la
+# Lambda que prueba (si no, otra invocación puede reclamar la prueba con la primera en curso):
+# cada función lo fija con CIRCUIT_PROBE_SECONDS según su timeout
+DEFAULT_PROBE_SECONDS = 120
+# Intentos de actualizar el estado cuando otra invocación lo modificó
+MAX_STATE_ATTEMPTS = 3
+
+
+class RetryableError(Exception):
+    """Fallo transitorio: la operación puede reintentarse (opcionalmente después de retry_after segundos)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: la llamada no se intenta."""
+
+    def __init__(self, name, retry_at):
+        retry_at_text = datetime.datetime.utcfromtimestamp(retry_at).isoformat()
+        super().__init__(f"Circuito {name} abierto hasta {retry_at_text}")
+        self.name = name
+        self.retry_at = retry_at
+
+
+class RetryPolicy:
+    """
+    Reintentos con backoff exponencial, jitter completo y Retry-After.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=20.0, max_retry_after=60.0,
+                 sleep=time.sleep, rand=random.random, clock=time.monotonic):
+        """
+        Args:
+            max_attempts (int): Intentos en total (incluido el primero)
+            base_delay (float): Espera máxima antes del primer reintento, en segundos
+            max_delay (float): Tope de la espera exponencial
+            max_retry_after (float): Si el servicio pide esperar más que esto, no se reintenta
+            sleep, rand, clock: Reemplazables en pruebas
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._sleep = sleep
+        self._random = rand
+        self._clock = clock
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Espera antes del reintento número attempt: aleatoria entre 0 y base_delay * 2^(attempt-1)
+        (con tope max_delay), y nunca menor que el Retry-After del servicio.
+        """
+        backoff = self._random() * min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return max(backoff, retry_after or 0)
+
+    def run(self, operation, deadline=None):
+        """
+        Ejecuta operation() reintentando los RetryableError.
+
+        Args:
+            operation (callable): Operación sin argumentos
+            deadline (float, opcional): Instante (del reloj monotónico) después del cual no se reintenta
+
+        Returns:
+            El resultado de operation()
+
+        Raises:
+            RetryableError: El último error si se agotan los intentos o el tiempo
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return operation()
+            except RetryableError as e:
+                if attempt == self.max_attempts:
+                    raise
+                if e.retry_after is not None and e.retry_after > self.max_retry_after:
+                    logger.warning(f"El servicio pide esperar {e.retry_after:.0f}s; no se reintenta")
+                    raise
+                wait = self.delay(attempt, e.retry_after)
+                if deadline is not None and self._clock() + wait >= deadline:
+                    logger.warning('No queda tiempo para otro reintento')
+                    raise
+                logger.warning(f"Intento {attempt} de {self.max_attempts} fallido ({e}); reintento en {wait:.2f}s")
+                self._sleep(wait)
+
+
+def parse_retry_after(value, now=None):
+    """
+    Segundos indicados por un encabezado Retry-After (número de segundos o fecha HTTP), o None.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(retry_at.timestamp() - now, 0.0)
+
+
+class DynamoDBCircuitStore:
+    """
+    Estado de los circuitos en DynamoDB (clave circuit_name).
+    """
+
+    def __init__(self, table_name, client=None):
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client('dynamodb')
+        return self._client
+
+    def load(self, name):
+        item = self.client.get_item(
+            TableName=self.table_name, Key={'circuit_name': {'S': name}}, ConsistentRead=True
+        ).get('Item')
+        if not item:
+            return initial_state()
+        return {
+            'state': item['state']['S'],
+            'failures': int(item['failures']['N']),
+            'opened_until': float(item['opened_until']['N']),
+            'probe_until': float(item['probe_until']['N']),
+            'version': int(item['version']['N'])
+        }
+
+    def save(self, name, state, expected_version):
+        """
+        Guarda el estado si nadie lo modificó desde la versión leída.
+
+        Returns:
+            bool: False si otra invocación lo cambió antes
+        """
+        condition = 'attribute_not_exists(circuit_name)' if expected_version == 0 else 'version = :expected'
+        values = {} if expected_version == 0 else {':expected': {'N': str(expected_version)}}
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    'circuit_name': {'S': name},
+                    'state': {'S': state['state']},
+                    'failures': {'N': str(state['failures'])},
+                    'opened_until': {'N': str(state['opened_until'])},
+                    'probe_until': {'N': str(state['probe_until'])},
+                    'version': {'N': str(expected_version + 1)}
+                },
+                ConditionExpression=condition,
+                **({'ExpressionAttributeValues': values} if values else {})
+            )
+            return True
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+
+class LocalCircuitStore:
+    """
+    Stand-in local de DynamoDBCircuitStore: estado en memoria protegido por un lock.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def load(self, name):
+        with self._lock:
+            return dict(self._states.get(name) or initial_state())
+
+    def save(self, name, state, expected_version):
+        with self._lock:
+            if (self._states.get(name) or initial_state())['version'] != expected_version:
+                return False
+            self._states[name] = {**state, 'version': expected_version + 1}
+            return True
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker con estado compartido entre invocaciones.
+    """
+
+    def __init__(self, store, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_seconds=DEFAULT_RESET_SECONDS,
+                 probe_seconds=DEFAULT_PROBE_SECONDS, clock=time.time):
+        """
+        Args:
+            store: DynamoDBCircuitStore o LocalCircuitStore
+            name (str): Servicio protegido (p. ej. api:host)
+            failure_threshold (int): Fallos consecutivos que abren el circuito
+            reset_seconds (int): Tiempo abierto antes de permitir una prueba
+            probe_seconds (int): Tiempo que una invocación conserva la prueba half_open
+            clock (callable): Reloj en segundos epoch (reemplazable en pruebas)
+        """
+        self.store = store
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.probe_seconds = probe_seconds
+        self._clock = clock
+        # probe_until de la prueba half_open reclamada por esta invocación, si la hay
+        self._probe_until = None
+
+    @classmethod
+    def from_env(cls, name):
+        """
+        CIRCUIT_BREAKER_TABLE usa DynamoDB; sin ella (o con CIRCUIT_BREAKER_STORE=local)
+        el estado queda en memoria del contenedor. CIRCUIT_PROBE_SECONDS debe superar el
+        timeout de la función.
+        """
+        table_name = os.environ.get('CIRCUIT_BREAKER_TABLE')
+        if os.environ.get('CIRCUIT_BREAKER_STORE') == 'local' or not table_name:
+            store = LocalCircuitStore()
+        else:
+            store = DynamoDBCircuitStore(table_name)
+        return cls(
+            store,
+            name,
+            failure_threshold=int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD)),
+            reset_seconds=int(os.environ.get('CIRCUIT_RESET_SECONDS', DEFAULT_RESET_SECONDS)),
+            probe_seconds=int(os.environ.get('CIRCUIT_PROBE_SECONDS', DEFAULT_PROBE_SECONDS))
+        )
+
+    def before_call(self):
+        """
+        Comprueba que la llamada puede intentarse; vencido el plazo de un circuito abierto,
+        reclama la prueba half_open para esta invocación.
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto o otra invocación lo está probando
+        """
+        self._probe_until = None
+        state = self.store.load(self.name)
+        now = self._clock()
+        if state['state'] == CLOSED:
+            return
+        if state['state'] == OPEN and now < state['opened_until']:
+            raise CircuitOpenError(self.name, state['opened_until'])
+        if state['state'] == HALF_OPEN and now < state['probe_until']:
+            raise CircuitOpenError(self.name, state['probe_until'])
+
+        probe = {**state, 'state': HALF_OPEN, 'probe_until': now + self.probe_seconds}
+        if not self.store.save(self.name, probe, state['version']):
+            # Otra invocación reclamó la prueba primero
+            raise CircuitOpenError(self.name, now + self.probe_seconds)
+        self._probe_until = probe['probe_until']
+        logger.info(f"Circuito {self.name} en prueba (half_open)")
+
+    def record_success(self):
+        """
+        Cierra el circuito y reinicia el contador de fallos (sin escribir si ya estaba así).
+        """
+        self._update(lambda state, now: None if state['state'] == CLOSED and not state['failures'] else initial_state())
+
+    def record_failure(self):
+        """
+        Cuenta un fallo; abre el circuito al llegar al umbral o si falló la prueba half_open.
+        """
+        def transition(state, now):
+            failures = state['failures'] + 1
+            if state['state'] == HALF_OPEN or failures >= self.failure_threshold:
+                logger.warning(f"Circuito {self.name} abierto por {self.reset_seconds}s tras {failures} fallos")
+                return {**state, 'state': OPEN, 'failures': failures, 'opened_until': now + self.reset_seconds}
+            return {**state, 'failures': failures}
+
+        self._update(transition)
+
+    def release_probe(self):
+        """
+        Devuelve la prueba half_open de esta invocación sin contar un fallo: el circuito
+        queda abierto con el plazo vencido y la siguiente invocación puede probar de
+        inmediato. No hace nada si esta invocación no tiene la prueba.
+        """
+        probe_until, self._probe_until = self._probe_until, None
+        if probe_until is None:
+            return
+
+        def transition(state, now):
+            if state['state'] != HALF_OPEN or state['probe_until'] != probe_until:
+                return None
+            logger.info(f"Prueba del circuito {self.name} liberada tras un error local")
+            return {**state, 'state': OPEN, 'opened_until': now, 'probe_until': 0.0}
+
+        self._update(transition)
+
+    def _update(self, transition):
+        for _ in range(MAX_STATE_ATTEMPTS):
+            state = self.store.load(self.name)
+            new_state = transition(state, self._clock())
+            if new_state is None or self.store.save(self.name, new_state, state['version']):
+                return
+        logger.warning(f"No se pudo actualizar el estado del circuito {self.name}: cambia continuamente")
+
+
+def initial_state():
+    return {'state': CLOSED, 'failures': 0, 'opened_until': 0.0, 'probe_until': 0.0, 'version': 0}
@@ -0,0 +1,214 @@
+"""
+Escritura y lectura de objetos S3 con compresión transparente.
+
+Los cuerpos de texto (JSON, NDJSON, CSV) se comprimen con zstd (si el paquete
+zstandard está disponible) o gzip antes de subirlos. El objeto queda con:
+- extensión .zst / .gz agregada a la clave (Athena y Glue detectan la compresión por ella),
+- ContentEncoding con el códec y ContentType del contenido original,
+- metadatos compression y uncompressed-size.
+
+get_object() descomprime según el ContentEncoding, por lo que los lectores no
+necesitan saber cómo se escribió el objeto. Los cuerpos binarios (Excel, Parquet)
+y los muy pequeños se escriben sin cambios.
+
+open_writer() hace lo mismo en streaming: comprime lo que se escribe con un
+compresor incremental y lo sube por partes (multipart.S3MultipartWriter).
+"""
+import gzip
+import os
+import zlib
+
+from medical_analytics_runtime.multipart import MIN_PART_SIZE, S3MultipartWriter
+
+try:
+    import zstandard
+except ImportError:  # Capa sin zstandard: se usa gzip
+    zstandard = None
+
+# Tipos de contenido que se comprimen (sin parámetros como charset)
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+
+# Por debajo de este tamaño la compresión no compensa el costo de CPU
+MIN_COMPRESS_BYTES = 1024
+
+EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+
+def default_codec():
+    """
+    Códec configurado en STORAGE_COMPRESSION (zstd, gzip o none); por defecto zstd si
+    está disponible y gzip en otro caso.
+    """
+    codec = os.environ.get('STORAGE_COMPRESSION', 'zstd').lower()
+    if codec == 'zstd' and zstandard is None:
+        return 'gzip'
+    return codec
+
+
+def compress(data, codec):
+    """
+    Comprime bytes con el códec indicado.
+    """
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"Códec de compresión no soportado: {codec}")
+
+
+def decompress(data, encoding):
+    """
+    Descomprime bytes según el ContentEncoding del objeto (sin encoding se devuelven igual).
+    """
+    if not encoding or encoding == 'identity':
+        return data
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise ValueError('El objeto está comprimido con zstd y zstandard no está instalado')
+        # stream_reader admite tramas sin tamaño de contenido (escritas en streaming)
+        return zstandard.ZstdDecompressor().stream_reader(data).read()
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    raise ValueError(f"ContentEncoding no soportado: {encoding}")
+
+
+def is_compressible(content_type):
+    return (content_type or '').split(';')[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def compressed_key(key, codec):
+    """
+    Agrega la extensión del códec a la clave (raw/api/x.json -> raw/api/x.json.zst).
+    """
+    extension = EXTENSIONS[codec]
+    return key if key.endswith(extension) else key + extension
+
+
+def put_object(client, bucket, key, body, content_type, codec=None, metadata=None, **kwargs):
+    """
+    Sube un objeto, comprimiéndolo si su tipo de contenido es de texto.
+
+    Args:
+        client: Cliente S3 de boto3
+        bucket (str): Bucket de destino
+        key (str): Clave sin la extensión de compresión
+        body (bytes|str): Contenido sin comprimir
+        content_type (str): Tipo del contenido original
+        codec (str, opcional): zstd, gzip o none (por defecto default_codec())
+        metadata (dict, opcional): Metadatos del objeto
+        **kwargs: Argumentos adicionales de put_object
+
+    Returns:
+        str: Clave con la que se guardó el objeto
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    codec = codec or default_codec()
+    metadata = dict(metadata or {})
+
+    if codec != 'none' and is_compressible(content_type) and len(body) >= MIN_COMPRESS_BYTES:
+        metadata.update({'compression': codec, 'uncompressed-size': str(len(body))})
+        kwargs['ContentEncoding'] = codec
+        key = compressed_key(key, codec)
+        body = compress(body, codec)
+
+    client.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type, Metadata=metadata, **kwargs)
+    return key
+
+
+def get_object(client, bucket, key):
+    """
+    Descarga un objeto y devuelve su contenido descomprimido.
+
+    Returns:
+        bytes: Contenido original del objeto
+    """
+    response = client.get_object(Bucket=bucket, Key=key)
+    return decompress(response['Body'].read(), response.get('ContentEncoding'))
+
+
+def open_writer(client, bucket, key, content_type, codec=None, metadata=None,
+                part_size=MIN_PART_SIZE, max_in_flight=0, **kwargs):
+    """
+    Abre un escritor en streaming que comprime el contenido y lo sube por partes.
+
+    Args:
+        client: Cliente S3 de boto3
+        bucket (str): Bucket de destino
+        key (str): Clave sin la extensión de compresión
+        content_type (str): Tipo del contenido original
+        codec (str, opcional): zstd, gzip o none (por defecto default_codec())
+        metadata (dict, opcional): Metadatos del objeto
+        part_size (int): Bytes comprimidos por parte
+        max_in_flight (int): Partes que se suben en segundo plano mientras se sigue escribiendo
+        **kwargs: Argumentos adicionales de create_multipart_upload
+
+    Returns:
+        CompressedWriter: Escritor con write(), close(), abort() y la clave final en .key
+    """
+    codec = codec or default_codec()
+    metadata = dict(metadata or {})
+    if codec != 'none' and is_compressible(content_type):
+        metadata['compression'] = codec
+        kwargs['ContentEncoding'] = codec
+        key = compressed_key(key, codec)
+    else:
+        codec = 'none'
+    writer = S3MultipartWriter(
+        client, bucket, key, part_size=part_size, max_in_flight=max_in_flight,
+        ContentType=content_type, Metadata=metadata, **kwargs
+    )
+    return CompressedWriter(writer, codec)
+
+
+class CompressedWriter:
+    """
+    Comprime incrementalmente lo que se escribe y lo pasa a un S3MultipartWriter.
+    """
+
+    def __init__(self, writer, codec):
+        self.writer = writer
+        self.key = writer.key
+        self.bytes_in = 0
+        if codec == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        elif codec == 'gzip':
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+        else:
+            self._compressor = None
+
+    @property
+    def bytes_written(self):
+        return self.writer.bytes_written
+
+    def write(self, data):
+        self.bytes_in += len(data)
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        if data:
+            self.writer.write(data)
+
+    def close(self):
+        if self._compressor is not None:
+            self.writer.write(self._compressor.flush())
+        self.writer.close()
+
+    def abort(self):
+        self.writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+            return False
+        try:
+            self.close()
+        except Exception:
+            # Sin completar la carga multiparte, sus partes quedarían cobrándose hasta el ciclo de vida
+            self.abort()
+            raise
+        return False
@@ -13,6 +13,10 @@ from aws_cdk import (
     aws_cloudwatch as cloudwatch,
     aws_cloudwatch_actions as cloudwatch_actions,
     aws_logs as logs,
+    aws_kinesisfirehose as firehose,
+    aws_dynamodb as dynamodb,
+    aws_stepfunctions as sfn,
+    aws_stepfunctions_tasks as tasks,
     CfnOutput
 )
 from constructs import Construct
@@ -21,6 +25,17 @@ import tempfile
 import uuid
 import json
 
+# Margen de la prueba half_open del circuit breaker sobre el timeout de la función
+CIRCUIT_PROBE_MARGIN_SECONDS = 60
+
+
+def circuit_probe_seconds(timeout: Duration) -> str:
+    """
+    CIRCUIT_PROBE_SECONDS de una función: su timeout más un margen, para que la prueba
+    half_open no venza mientras la invocación que la reclamó sigue en curso.
+    """
+    return str(int(timeout.to_seconds()) + CIRCUIT_PROBE_MARGIN_SECONDS)
+
 class IngestionStack(Stack):
     """
     Stack para la capa de ingesta de datos del sistema de analítica médica.
@@ -38,6 +53,7 @@ class IngestionStack(Stack):
         error_topic: sns.Topic,
         pandas_layer: lambda_.LayerVersion,
         common_layer: lambda_.LayerVersion,
+        runtime_layer: lambda_.LayerVersion,
         **kwargs
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
@@ -49,6 +65,19 @@ class IngestionStack(Stack):
         self.ingestion_role = ingestion_role
         self.pandas_layer = pandas_layer
         self.common_layer = common_layer
+        self.runtime_layer = runtime_layer
+
+        # 0. Delivery stream de Firehose para la auditoría con búfer de ambas Lambdas
+        self.audit_stream = self._create_audit_stream()
+        
+        # 0.1 Tabla de contadores para agregar las notificaciones de error por ventana
+        self.error_digest_table = self._create_error_digest_table()
+        
+        # 0.2 Tabla de idempotencia de las cargas (Idempotency-Key)
+        self.idempotency_table = self._create_idempotency_table()
+        
+        # 0.3 Estado del circuit breaker de la API de origen, compartido entre invocaciones
+        self.circuit_breaker_table = self._create_circuit_breaker_table()
 
         # 1. Implementación de Componente de Ingesta API
         api_lambda = self._create_api_ingestion_lambda(storage_bucket.bucket_name)
@@ -56,6 +85,9 @@ class IngestionStack(Stack):
         # 2. EventBridge para ejecución programada de la ingesta API
         self._create_api_ingestion_schedule(api_lambda)
         
+        # 2.1 Backfill histórico de la API por shards de fechas (Step Functions)
+        self.api_backfill = self._create_api_backfill(storage_bucket.bucket_name)
+        
         # 3. API Gateway para Carga de Archivos con secreto para la API key
         api_gateway, api_key_secret = self._create_upload_api()
         
@@ -68,8 +100,35 @@ class IngestionStack(Stack):
         # 5. Integración de API Gateway con Lambda
         self._integrate_api_with_lambda(api_gateway, file_processor_lambda)
         
+        # 5.1 Conversión de los libros Excel a Parquet en cleaned/
+        excel_converter_lambda = self._create_excel_converter_lambda(
+            storage_bucket.bucket_name,
+            error_topic.topic_arn
+        )
+        
+        # 5.2 Procesamiento posterior y conversión de cargas bajo raw/excel/ (evento ObjectCreated)
+        self._create_upload_event_rule(file_processor_lambda, excel_converter_lambda)
+        
+        # 5.3 Permitir a las Lambdas entregar registros de auditoría a Firehose
+        self._grant_audit_stream()
+        
+        # 5.4 Permitir a las Lambdas actualizar los contadores de errores
+        self._grant_error_digest_table()
+        
+        # 5.5 Permitir a file_processor reclamar y guardar claves de idempotencia
+        self._grant_idempotency_table()
+        
+        # 5.6 Permitir a api_ingestion leer y actualizar el estado del circuit breaker
+        self._grant_circuit_breaker_table()
+        
+        # 5.7 Permitir a api_ingestion eliminar los Parquet parciales de una ejecución fallida
+        self._grant_parquet_cleanup()
+        
+        # 5.8 Permitir a file_processor eliminar las cargas directas de contenido ya cargado
+        self._grant_duplicate_cleanup()
+        
         # 6. Implementar monitoreo y alarmas para las funciones Lambda
-        self._setup_monitoring(api_lambda, file_processor_lambda)
+        self._setup_monitoring(api_lambda, file_processor_lambda, excel_converter_lambda)
         
         # Guardar referencias para uso externo
         self.api_gateway_url = api_gateway.url
@@ -78,6 +137,253 @@ class IngestionStack(Stack):
         CfnOutput(self, "ApiEndpoint", value=f"{api_gateway.url}")
         CfnOutput(self, "GetGeneratedApiKeyCommand", value="aws apigateway get-api-keys --name-query medical-analytics-api-key --include-values --query 'items[0].value' --output text")
 
+    def _create_audit_stream(self) -> firehose.CfnDeliveryStream:
+        """
+        Crea el delivery stream de Kinesis Data Firehose para la auditoría.
+        Agrupa los registros por tiempo (5 min) o tamaño (5 MB) en objetos NDJSON
+        comprimidos con GZIP bajo audit/, en lugar de un objeto S3 por evento.
+        """
+        # Rol que asume Firehose para escribir en el bucket encriptado
+        firehose_role = iam.Role(
+            self,
+            "AuditFirehoseRole",
+            assumed_by=iam.ServicePrincipal("firehose.amazonaws.com"),
+            description="Rol de Firehose para entregar los registros de auditoría en S3"
+        )
+        firehose_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "s3:AbortMultipartUpload",
+                    "s3:GetBucketLocation",
+                    "s3:GetObject",
+                    "s3:ListBucket",
+                    "s3:ListBucketMultipartUploads",
+                    "s3:PutObject"
+                ],
+                resources=[
+                    self.bucket.bucket_arn,
+                    self.bucket.arn_for_objects("audit/*"),
+                    # Registros que Firehose no pudo entregar (error_output_prefix)
+                    self.bucket.arn_for_objects("audit_errors/*")
+                ]
+            )
+        )
+        firehose_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["kms:Encrypt", "kms:Decrypt", "kms:GenerateDataKey"],
+                resources=[self.encryption_key_arn]
+            )
+        )
+        
+        return firehose.CfnDeliveryStream(
+            self,
+            "AuditDeliveryStream",
+            delivery_stream_name="medical-analytics-audit",
+            delivery_stream_type="DirectPut",
+            extended_s3_destination_configuration=firehose.CfnDeliveryStream.ExtendedS3DestinationConfigurationProperty(
+                bucket_arn=self.bucket.bucket_arn,
+                role_arn=firehose_role.role_arn,
+                prefix="audit/year=!{timestamp:yyyy}/month=!{timestamp:MM}/day=!{timestamp:dd}/",
+                error_output_prefix="audit_errors/!{firehose:error-output-type}/year=!{timestamp:yyyy}/month=!{timestamp:MM}/day=!{timestamp:dd}/",
+                buffering_hints=firehose.CfnDeliveryStream.BufferingHintsProperty(
+                    interval_in_seconds=300,
+                    size_in_m_bs=5
+                ),
+                compression_format="GZIP",
+                encryption_configuration=firehose.CfnDeliveryStream.EncryptionConfigurationProperty(
+                    kms_encryption_config=firehose.CfnDeliveryStream.KMSEncryptionConfigProperty(
+                        awskms_key_arn=self.encryption_key_arn
+                    )
+                )
+            )
+        )
+
+    def _grant_audit_stream(self) -> None:
+        """
+        Permite a las Lambdas (rol de ingesta compartido) enviar registros al stream de auditoría.
+        La política se crea en este stack (y no en el rol del stack de almacenamiento)
+        para evitar dependencias cíclicas entre stacks.
+        """
+        iam.Policy(
+            self,
+            "AuditStreamWritePolicy",
+            statements=[
+                iam.PolicyStatement(
+                    actions=["firehose:PutRecord", "firehose:PutRecordBatch"],
+                    resources=[self.audit_stream.attr_arn]
+                )
+            ],
+            roles=[self.ingestion_role, self.excel_converter_role]
+        )
+
+    def _create_error_digest_table(self) -> dynamodb.Table:
+        """
+        Crea la tabla de contadores de errores por huella y ventana.
+        Los contenedores calientes comparten los contadores para publicar un solo
+        resumen SNS por huella y ventana; las entradas expiran por TTL.
+        """
+        return dynamodb.Table(
+            self,
+            "ErrorDigestTable",
+            table_name="medical-analytics-error-digests",
+            partition_key=dynamodb.Attribute(name="digest_key", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY  # Solo contadores temporales
+        )
+
+    def _create_idempotency_table(self) -> dynamodb.Table:
+        """
+        Crea la tabla de idempotencia de las cargas: la primera solicitud reclama la
+        Idempotency-Key con una escritura condicional y guarda su respuesta; los
+        registros expiran por TTL.
+        """
+        return dynamodb.Table(
+            self,
+            "IdempotencyTable",
+            table_name="medical-analytics-idempotency",
+            partition_key=dynamodb.Attribute(name="idempotency_key", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY  # Solo respuestas temporales
+        )
+
+    def _create_circuit_breaker_table(self) -> dynamodb.Table:
+        """
+        Crea la tabla con el estado del circuit breaker de la API de origen: mientras
+        está abierto, las ejecuciones programadas fallan sin llamar a la API.
+        """
+        return dynamodb.Table(
+            self,
+            "CircuitBreakerTable",
+            table_name="medical-analytics-circuit-breakers",
+            partition_key=dynamodb.Attribute(name="circuit_name", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY  # Solo estado operativo
+        )
+
+    def _grant_error_digest_table(self) -> None:
+        """
+        Permite a las Lambdas leer e incrementar los contadores de errores.
+        """
+        iam.Policy(
+            self,
+            "ErrorDigestTablePolicy",
+            statements=[
+                iam.PolicyStatement(
+                    actions=["dynamodb:UpdateItem", "dynamodb:GetItem"],
+                    resources=[self.error_digest_table.table_arn]
+                )
+            ],
+            roles=[self.ingestion_role, self.excel_converter_role]
+        )
+
+    def _grant_idempotency_table(self) -> None:
+        """
+        Permite a file_processor (rol de ingesta) reclamar, guardar y liberar claves de idempotencia.
+        """
+        iam.Policy(
+            self,
+            "IdempotencyTablePolicy",
+            statements=[
+                iam.PolicyStatement(
+                    actions=["dynamodb:PutItem", "dynamodb:GetItem", "dynamodb:DeleteItem"],
+                    resources=[self.idempotency_table.table_arn]
+                )
+            ],
+            roles=[self.ingestion_role]
+        )
+
+    def _grant_circuit_breaker_table(self) -> None:
+        """
+        Permite a api_ingestion (rol de ingesta) leer y reemplazar el estado del circuito.
+        """
+        iam.Policy(
+            self,
+            "CircuitBreakerTablePolicy",
+            statements=[
+                iam.PolicyStatement(
+                    actions=["dynamodb:GetItem", "dynamodb:PutItem"],
+                    resources=[self.circuit_breaker_table.table_arn]
+                )
+            ],
+            roles=[self.ingestion_role]
+        )
+
+    def _grant_parquet_cleanup(self) -> None:
+        """
+        Permite a api_ingestion (rol de ingesta) eliminar objetos bajo raw/parquet/, solo para
+        descartar los archivos ya subidos cuando la ejecución falla a mitad de camino.
+        """
+        iam.Policy(
+            self,
+            "ParquetCleanupPolicy",
+            statements=[
+                iam.PolicyStatement(
+                    actions=["s3:DeleteObject"],
+                    resources=[self.bucket.arn_for_objects("raw/parquet/*")]
+                )
+            ],
+            roles=[self.ingestion_role]
+        )
+
+    def _grant_duplicate_cleanup(self) -> None:
+        """
+        Permite a file_processor (rol de ingesta) eliminar libros bajo raw/excel/, solo para
+        descartar las cargas directas cuyo SHA-256 ya pertenece a otro objeto del índice.
+        """
+        iam.Policy(
+            self,
+            "DuplicateCleanupPolicy",
+            statements=[
+                iam.PolicyStatement(
+                    actions=["s3:DeleteObject"],
+                    resources=[self.bucket.arn_for_objects("raw/excel/*")]
+                )
+            ],
+            roles=[self.ingestion_role]
+        )
+
+    def _api_ingestion_environment(self, bucket_name: str) -> dict:
+        """
+        Variables de entorno de la ingesta API (las comparten la ejecución programada y el backfill).
+        """
+        return {
+            "BUCKET_NAME": bucket_name,
+            "API_ENDPOINT": "https://api.ejemplo.com/datos-medicos",  # Reemplazar con URL real
+            "API_KEY": "dev-temp-api-key",  # Valor temporal para desarrollo
+            "ERROR_TOPIC_ARN": self.error_topic.topic_arn,
+            "AUDIT_STREAM_NAME": self.audit_stream.ref,
+            "STORAGE_COMPRESSION": "zstd",  # zstandard viene en la capa común; sin él se usa gzip
+            "ALERT_STATE_TABLE": self.error_digest_table.table_name,
+            "ALERT_WINDOW_SECONDS": "300",  # Un resumen SNS por huella de error cada 5 minutos
+            "API_PAGINATION": "auto",  # Encabezado Link o cursor del cuerpo
+            "API_PAGE_SIZE": "1000",
+            "MULTIPART_PART_SIZE": str(8 * 1024 * 1024),
+            "API_MAX_CONCURRENCY": "4",  # Páginas en paralelo (offset); link/cursor descargan la siguiente por adelantado
+            "API_RATE_LIMIT": "10",  # Solicitudes por segundo a la API de origen
+            "API_CONNECT_TIMEOUT": "5",
+            "CIRCUIT_BREAKER_TABLE": self.circuit_breaker_table.table_name,
+            "CIRCUIT_FAILURE_THRESHOLD": "3",  # Ejecuciones fallidas seguidas que abren el circuito
+            "CIRCUIT_RESET_SECONDS": "300",
+            # Ingesta incremental: solo registros con updated_at posterior a la marca del checkpoint,
+            # con 15 minutos de solapamiento para los que llegan tarde
+            "API_WATERMARK_FIELD": "updated_at",
+            "API_WATERMARK_PARAM": "updated_since",
+            "API_WATERMARK_TYPE": "timestamp",
+            "API_WATERMARK_OVERLAP": "900",
+            # Captura de cambios: índice id -> hash del contenido en raw/api/_cdc/; solo se
+            # escriben los registros nuevos o modificados y las eliminaciones como tombstones
+            "API_RECORD_KEY": "id",
+            "API_CDC_SHARDS": "64",
+            # Además del NDJSON crudo, Parquet en raw/parquet/source=/year=/month=/day=
+            "API_OUTPUT_FORMATS": "ndjson,parquet",
+            "API_SOURCE_NAME": "api-cliente",
+            "PARQUET_COMPRESSION": "zstd",
+            "PARQUET_TARGET_FILE_MB": "128",  # Tamaño cómodo para Athena/Glue
+            "PARQUET_ROW_GROUP_ROWS": "100000",
+        }
+
     def _create_api_ingestion_lambda(self, bucket_name: str) -> lambda_.Function:
         """
         Crea la función Lambda para ingesta desde la API.
@@ -109,6 +415,7 @@ class IngestionStack(Stack):
         
         # Lambda function con tracing activado y configuración mejorada
         # Ahora incluyendo las capas (layers) para las dependencias
+        timeout = Duration.seconds(60)
         lambda_fn = lambda_.Function(
             self, 
             "ApiIngestionFunction",
@@ -116,18 +423,16 @@ class IngestionStack(Stack):
             runtime=lambda_.Runtime.PYTHON_3_9,
             code=lambda_.Code.from_asset("lambda/api_ingestion"),
             handler="index.handler",
-            timeout=Duration.seconds(60),
-            memory_size=256,
+            timeout=timeout,
+            memory_size=512,  # pyarrow y el row group en construcción (hasta 100.000 filas)
             environment={
-                "BUCKET_NAME": bucket_name,
-                "API_ENDPOINT": "https://api.ejemplo.com/datos-medicos",  # Reemplazar con URL real
-                "API_KEY": "dev-temp-api-key",  # Valor temporal para desarrollo
-                "ERROR_TOPIC_ARN": self.error_topic.topic_arn
+                **self._api_ingestion_environment(bucket_name),
+                "CIRCUIT_PROBE_SECONDS": circuit_probe_seconds(timeout)
             },
             role=self.ingestion_role,
             tracing=lambda_.Tracing.ACTIVE,  # Habilitar AWS X-Ray
             log_retention=logs.RetentionDays.ONE_MONTH,
-            layers=[self.common_layer]  # Añadir capa con dependencias comunes
+            layers=[self.pandas_layer, self.common_layer, self.runtime_layer]  # pyarrow, dependencias comunes y código compartido
         )
         
         # No necesitamos dar permisos para Secrets Manager por ahora
@@ -140,9 +445,41 @@ class IngestionStack(Stack):
         
         return lambda_fn
 
+    def _create_api_backfill(self, bucket_name: str) -> "ApiBackfill":
+        """
+        Crea la máquina de estados de backfill con la misma configuración que la ingesta programada.
+        """
+        max_concurrency = 4
+        environment = {
+            **self._api_ingestion_environment(bucket_name),
+            # Los shards corren en paralelo: el límite de la API se reparte entre ellos
+            "API_RATE_LIMIT": f"{10 / max_concurrency:g}",
+            "API_BACKFILL_SINCE_PARAM": "updated_since",
+            "API_BACKFILL_UNTIL_PARAM": "updated_until",
+            "API_BACKFILL_SHARD_DAYS": "1",
+        }
+        backfill = ApiBackfill(
+            self,
+            "ApiBackfill",
+            code_path="lambda/api_ingestion",
+            environment=environment,
+            role=self.ingestion_role,
+            layers=[self.pandas_layer, self.common_layer, self.runtime_layer],
+            max_concurrency=max_concurrency
+        )
+        CfnOutput(
+            self,
+            "ApiBackfillStateMachineArn",
+            value=backfill.state_machine.state_machine_arn,
+            description='Backfill de la API: iniciar con {"start": "2024-01-01", "end": "2024-07-01"}'
+        )
+        return backfill
+
     def _create_api_ingestion_schedule(self, lambda_fn: lambda_.Function) -> None:
         """
         Configura la ejecución programada de la función de ingesta API.
+        Cada ejecución pide solo los cambios desde la marca de agua del checkpoint
+        (raw/api/_checkpoints/), no el conjunto completo.
         """
         # Regla para 9:00 AM UTC
         events.Rule(
@@ -212,8 +549,8 @@ class IngestionStack(Stack):
             description="API para carga de archivos Excel con datos médicos",
             default_cors_preflight_options=apigw.CorsOptions(
                 allow_origins=["*"],  # En producción, limitar a dominio de CloudFront
-                allow_methods=["GET", "POST", "OPTIONS"],
-                allow_headers=["Content-Type", "X-Amz-Date", "Authorization", "X-Api-Key", "Origin", "Accept"],
+                allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+                allow_headers=["Content-Type", "X-Amz-Date", "Authorization", "X-Api-Key", "Origin", "Accept", "Idempotency-Key"],
                 allow_credentials=False,  # No se puede usar True con allow_origins=["*"]
                 max_age=Duration.seconds(300)
             ),
@@ -280,12 +617,123 @@ class IngestionStack(Stack):
             memory_size=256,
             environment={
                 "BUCKET_NAME": bucket_name,
-                "ERROR_TOPIC_ARN": topic_arn
+                "ERROR_TOPIC_ARN": topic_arn,
+                "PRESIGNED_URL_EXPIRATION": "900",  # 15 minutos para completar la carga directa
+                "MAX_UPLOAD_BYTES": str(100 * 1024 * 1024),
+                "MULTIPART_PART_SIZE": str(8 * 1024 * 1024),  # Tamaño de parte de las sesiones de carga
+                "BATCH_MAX_FILES": "50",
+                "BATCH_MAX_WORKERS": "8",  # Escrituras concurrentes a S3 por lote
+                "ALERT_STATE_TABLE": self.error_digest_table.table_name,
+                "ALERT_WINDOW_SECONDS": "300",  # Un resumen SNS por huella de error cada 5 minutos
+                "CLIENT_MAX_POOL_CONNECTIONS": "10",  # Hilos del lote más la auditoría y SNS
+                "IDEMPOTENCY_TABLE": self.idempotency_table.table_name,
+                "IDEMPOTENCY_TTL_SECONDS": str(24 * 3600),  # Ventana en la que se reconocen los reintentos
+                "AUDIT_STREAM_NAME": self.audit_stream.ref
             },
             role=self.ingestion_role,
             tracing=lambda_.Tracing.ACTIVE,  # Habilitar AWS X-Ray
             log_retention=logs.RetentionDays.ONE_MONTH,
-            layers=[self.pandas_layer, self.common_layer]  # Añadir capas con dependencias
+            # Sin la capa de pandas: file_processor no la importa y solo alargaría el arranque en frío
+            layers=[self.common_layer, self.runtime_layer]
+        )
+        
+        return lambda_fn
+
+    def _create_excel_converter_lambda(self, bucket_name: str, topic_arn: str) -> lambda_.Function:
+        """
+        Crea la función Lambda que convierte los libros de raw/excel/ a Parquet
+        tipado y comprimido en cleaned/ (particiones Hive por fecha de carga).
+        """
+        # Crear grupo de logs con retención configurada
+        log_group = logs.LogGroup(
+            self,
+            "ExcelConverterLogGroup",
+            log_group_name="/aws/lambda/medical-analytics-excel-converter",
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_MONTH
+        )
+        
+        # Rol propio: lectura de raw/excel/ y escritura en cleaned/ (el rol de ingesta solo accede a raw/)
+        self.excel_converter_role = iam.Role(
+            self,
+            "ExcelConverterRole",
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            description="Rol para la conversión de archivos Excel a Parquet",
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole"),
+                iam.ManagedPolicy.from_aws_managed_policy_name("AWSXRayDaemonWriteAccess")
+            ]
+        )
+        self.excel_converter_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["s3:GetObject"],
+                resources=[self.bucket.arn_for_objects("raw/excel/*")]
+            )
+        )
+        self.excel_converter_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["s3:PutObject"],
+                resources=[self.bucket.arn_for_objects("cleaned/*")]
+            )
+        )
+        # Índice de contenido: el conversor reclama el SHA-256 del libro y omite los duplicados
+        self.excel_converter_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["s3:PutObject"],
+                resources=[self.bucket.arn_for_objects("raw/excel/_index/*")]
+            )
+        )
+        # Registro de esquemas de plantillas (ListBucket para que una entrada ausente o un
+        # duplicado ya eliminado de raw/excel/ respondan NoSuchKey)
+        self.excel_converter_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["s3:GetObject"],
+                resources=[self.bucket.arn_for_objects("cleaned/_schemas/*")]
+            )
+        )
+        self.excel_converter_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["s3:ListBucket"],
+                resources=[self.bucket.bucket_arn],
+                conditions={"StringLike": {"s3:prefix": ["cleaned/_schemas/*", "raw/excel/*"]}}
+            )
+        )
+        self.excel_converter_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["kms:Decrypt", "kms:GenerateDataKey"],
+                resources=[self.encryption_key_arn]
+            )
+        )
+        self.excel_converter_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["sns:Publish"],
+                resources=[topic_arn]
+            )
+        )
+        
+        # Incluye la capa de pandas (pandas, openpyxl, pyarrow) para leer Excel y escribir Parquet
+        lambda_fn = lambda_.Function(
+            self,
+            "ExcelConverterFunction",
+            function_name="medical-analytics-excel-converter",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            code=lambda_.Code.from_asset("lambda/excel_converter"),
+            handler="index.handler",
+            timeout=Duration.minutes(5),
+            memory_size=512,  # Pico estable (~175 MB) por la lectura por lotes; el resto da margen de CPU
+            environment={
+                "BUCKET_NAME": bucket_name,
+                "ERROR_TOPIC_ARN": topic_arn,
+                "PARQUET_COMPRESSION": "zstd",
+                "ALERT_STATE_TABLE": self.error_digest_table.table_name,
+                "ALERT_WINDOW_SECONDS": "300",  # Un resumen SNS por huella de error cada 5 minutos
+                "CLIENT_MAX_POOL_CONNECTIONS": "10",  # upload_file sube hasta 10 partes en paralelo
+                "AUDIT_STREAM_NAME": self.audit_stream.ref
+            },
+            role=self.excel_converter_role,
+            tracing=lambda_.Tracing.ACTIVE,  # Habilitar AWS X-Ray
+            log_retention=logs.RetentionDays.ONE_MONTH,
+            layers=[self.pandas_layer, self.common_layer, self.runtime_layer]
         )
         
         return lambda_fn
@@ -307,7 +755,7 @@ class IngestionStack(Stack):
                     "statusCode": "200",
                     "responseParameters": {
                         "method.response.header.Access-Control-Allow-Origin": "'*'",
-                        "method.response.header.Access-Control-Allow-Headers": "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,Origin,Accept'",
+                        "method.response.header.Access-Control-Allow-Headers": "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,Origin,Accept,Idempotency-Key'",
                         "method.response.header.Access-Control-Allow-Methods": "'GET,POST,OPTIONS'"
                     }
                 },
@@ -316,7 +764,7 @@ class IngestionStack(Stack):
                     "selectionPattern": ".*[Bad Request].*",
                     "responseParameters": {
                         "method.response.header.Access-Control-Allow-Origin": "'*'",
-                        "method.response.header.Access-Control-Allow-Headers": "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,Origin,Accept'",
+                        "method.response.header.Access-Control-Allow-Headers": "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,Origin,Accept,Idempotency-Key'",
                         "method.response.header.Access-Control-Allow-Methods": "'GET,POST,OPTIONS'"
                     }
                 },
@@ -325,56 +773,124 @@ class IngestionStack(Stack):
                     "selectionPattern": ".*[Error].*",
                     "responseParameters": {
                         "method.response.header.Access-Control-Allow-Origin": "'*'",
-                        "method.response.header.Access-Control-Allow-Headers": "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,Origin,Accept'",
+                        "method.response.header.Access-Control-Allow-Headers": "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,Origin,Accept,Idempotency-Key'",
                         "method.response.header.Access-Control-Allow-Methods": "'GET,POST,OPTIONS'"
                     }
                 }
             ]
         )
         
+        # Respuestas del método compartidas por los recursos de carga
+        method_responses=[
+            apigw.MethodResponse(
+                status_code="200",
+                response_parameters={
+                    "method.response.header.Access-Control-Allow-Origin": True,
+                    "method.response.header.Access-Control-Allow-Headers": True,
+                    "method.response.header.Access-Control-Allow-Methods": True
+                },
+                response_models={
+                    "application/json": apigw.Model.EMPTY_MODEL
+                }
+            ),
+            apigw.MethodResponse(
+                status_code="400",
+                response_parameters={
+                    "method.response.header.Access-Control-Allow-Origin": True,
+                    "method.response.header.Access-Control-Allow-Headers": True,
+                    "method.response.header.Access-Control-Allow-Methods": True
+                },
+                response_models={
+                    "application/json": apigw.Model.ERROR_MODEL
+                }
+            ),
+            apigw.MethodResponse(
+                status_code="500",
+                response_parameters={
+                    "method.response.header.Access-Control-Allow-Origin": True,
+                    "method.response.header.Access-Control-Allow-Headers": True,
+                    "method.response.header.Access-Control-Allow-Methods": True
+                },
+                response_models={
+                    "application/json": apigw.Model.ERROR_MODEL
+                }
+            )
+        ]
+        
         # Agregar método POST con integración
         upload_resource.add_method(
             "POST",
             upload_integration,
             api_key_required=True,
-            method_responses=[
-                apigw.MethodResponse(
-                    status_code="200",
-                    response_parameters={
-                        "method.response.header.Access-Control-Allow-Origin": True,
-                        "method.response.header.Access-Control-Allow-Headers": True,
-                        "method.response.header.Access-Control-Allow-Methods": True
-                    },
-                    response_models={
-                        "application/json": apigw.Model.EMPTY_MODEL
-                    }
-                ),
-                apigw.MethodResponse(
-                    status_code="400",
-                    response_parameters={
-                        "method.response.header.Access-Control-Allow-Origin": True,
-                        "method.response.header.Access-Control-Allow-Headers": True,
-                        "method.response.header.Access-Control-Allow-Methods": True
-                    },
-                    response_models={
-                        "application/json": apigw.Model.ERROR_MODEL
-                    }
-                ),
-                apigw.MethodResponse(
-                    status_code="500",
-                    response_parameters={
-                        "method.response.header.Access-Control-Allow-Origin": True,
-                        "method.response.header.Access-Control-Allow-Headers": True,
-                        "method.response.header.Access-Control-Allow-Methods": True
-                    },
-                    response_models={
-                        "application/json": apigw.Model.ERROR_MODEL
-                    }
-                )
-            ]
+            method_responses=method_responses
+        )
+        
+        # Recurso /upload/url: devuelve una URL prefirmada para subir directamente a S3
+        upload_url_resource = upload_resource.add_resource("url")
+        upload_url_resource.add_method(
+            "POST",
+            upload_integration,
+            api_key_required=True,
+            method_responses=method_responses
+        )
+        
+        # Recurso /upload/batch: varios archivos por solicitud, escritos en S3 en paralelo
+        upload_batch_resource = upload_resource.add_resource("batch")
+        upload_batch_resource.add_method(
+            "POST",
+            upload_integration,
+            api_key_required=True,
+            method_responses=method_responses
+        )
+        
+        # Recurso /upload/session: cargas multiparte reanudables directas a S3
+        # POST crea la sesión, GET lista las partes confirmadas y DELETE la cancela
+        session_resource = upload_resource.add_resource("session")
+        for http_method in ["GET", "POST", "DELETE"]:
+            session_resource.add_method(
+                http_method,
+                upload_integration,
+                api_key_required=True,
+                method_responses=method_responses
+            )
+        
+        # /upload/session/parts (URLs prefirmadas por parte) y /upload/session/complete
+        for path_part in ["parts", "complete"]:
+            session_resource.add_resource(path_part).add_method(
+                "POST",
+                upload_integration,
+                api_key_required=True,
+                method_responses=method_responses
+            )
+
+    def _create_upload_event_rule(self, *lambda_fns: lambda_.Function) -> None:
+        """
+        Dispara el procesamiento posterior a la carga y la conversión a Parquet
+        cuando se crea un objeto bajo raw/excel/.
+        Se usa EventBridge en lugar de notificaciones del bucket para no crear
+        dependencias cíclicas con el stack de almacenamiento.
+        """
+        events.Rule(
+            self,
+            "RawExcelObjectCreatedRule",
+            description="Procesa y convierte a Parquet los archivos Excel subidos a S3",
+            event_pattern=events.EventPattern(
+                source=["aws.s3"],
+                detail_type=["Object Created"],
+                detail={
+                    "bucket": {"name": [self.bucket.bucket_name]},
+                    "object": {"key": [{"prefix": "raw/excel/"}]}
+                }
+            ),
+            targets=[targets.LambdaFunction(lambda_fn) for lambda_fn in lambda_fns]
         )
 
-    def _setup_monitoring(self, api_lambda: lambda_.Function, file_processor_lambda: lambda_.Function) -> None:
+    def _setup_monitoring(
+        self,
+        api_lambda: lambda_.Function,
+        file_processor_lambda: lambda_.Function,
+        excel_converter_lambda: lambda_.Function
+    ) -> None:
         """
         Configura monitoreo y alarmas para las funciones Lambda.
         """
@@ -426,3 +942,169 @@ class IngestionStack(Stack):
         file_duration_alarm.add_alarm_action(
             cloudwatch_actions.SnsAction(self.error_topic)
         )
+        
+        # Alarma para errores en la conversión de Excel a Parquet
+        converter_errors_alarm = cloudwatch.Alarm(
+            self,
+            "ExcelConverterErrorsAlarm",
+            metric=excel_converter_lambda.metric_errors(),
+            threshold=1,
+            evaluation_periods=1,
+            alarm_description="Alarma por errores en la conversión de Excel a Parquet",
+            alarm_name="MedicalAnalytics-ExcelConverter-Errors"
+        )
+        
+        # Asociar acción de alarma (notificación SNS)
+        converter_errors_alarm.add_alarm_action(
+            cloudwatch_actions.SnsAction(self.error_topic)
+        )
+
+
+class ApiBackfill(Construct):
+    """
+    Backfill histórico de la API del cliente con Step Functions.
+
+    La ingesta programada corre en una Lambda de 60 segundos, que no alcanza para meses de
+    historia. Esta máquina de estados divide el rango en shards de fechas (paso plan), los
+    ingesta en un Map con concurrencia acotada (cada shard en su propia invocación de hasta
+    15 minutos) y combina los manifiestos de los shards (paso merge). La lógica de los tres
+    pasos está en lambda/api_ingestion/backfill.py y se puede ejecutar localmente.
+
+    Entrada de la ejecución: {"start": "2024-01-01", "end": "2024-07-01", "shard_days": 1}
+    (shard_days es opcional). El backfill_id es el nombre de la ejecución, salvo que la
+    entrada traiga uno: repetir una ejecución incompleta con el mismo backfill_id solo
+    ingesta los shards que faltan.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        *,
+        code_path: str,
+        environment: dict,
+        role: iam.IRole,
+        layers: list,
+        max_concurrency: int = 4
+    ) -> None:
+        """
+        Args:
+            code_path: Código de la Lambda de ingesta API (handler index.backfill_handler)
+            environment: Variables de entorno de la ingesta
+            role: Rol de ejecución de la Lambda
+            layers: Capas de la Lambda
+            max_concurrency: Shards que se ingestan a la vez
+        """
+        super().__init__(scope, construct_id)
+
+        timeout = Duration.minutes(15)
+        self.function = lambda_.Function(
+            self,
+            "Function",
+            function_name="medical-analytics-api-backfill",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            code=lambda_.Code.from_asset(code_path),
+            handler="index.backfill_handler",
+            timeout=timeout,
+            memory_size=1024,
+            # Comparte el circuito con la ingesta programada: su prueba half_open dura más que un shard
+            environment={**environment, "CIRCUIT_PROBE_SECONDS": circuit_probe_seconds(timeout)},
+            role=role,
+            tracing=lambda_.Tracing.ACTIVE,
+            log_retention=logs.RetentionDays.ONE_MONTH,
+            layers=layers
+        )
+
+        # 1. Plan: shards pendientes del rango (la entrada completa viaja en "input")
+        plan = tasks.LambdaInvoke(
+            self,
+            "PlanShards",
+            lambda_function=self.function,
+            payload=sfn.TaskInput.from_object({
+                "action": "plan",
+                "execution_name": sfn.JsonPath.string_at("$$.Execution.Name"),
+                "input": sfn.JsonPath.entire_payload
+            }),
+            payload_response_only=True
+        )
+
+        # 2. Un shard por iteración; los errores se reintentan y, agotados, el shard queda
+        #    sin manifiesto (el paso merge lo reporta como faltante)
+        ingest_shard = tasks.LambdaInvoke(
+            self,
+            "IngestShard",
+            lambda_function=self.function,
+            payload=sfn.TaskInput.from_object({
+                "action": "ingest",
+                "backfill_id": sfn.JsonPath.string_at("$.backfill_id"),
+                "shard": sfn.JsonPath.object_at("$.shard")
+            }),
+            payload_response_only=True
+        )
+        # Una respuesta 4xx de la API no cambia al reintentar. Step Functions compara el nombre
+        # exacto del error: ApiUnavailableError (subclase, API caída) se reintenta con States.ALL
+        ingest_shard.add_retry(errors=["ApiFetchError"], max_attempts=0)
+        # Con el circuito abierto se espera a que venza su plazo (CIRCUIT_RESET_SECONDS)
+        ingest_shard.add_retry(
+            errors=["CircuitOpenError"],
+            interval=Duration.minutes(5),
+            max_attempts=2,
+            backoff_rate=1
+        )
+        ingest_shard.add_retry(
+            errors=["States.ALL"],
+            interval=Duration.seconds(30),
+            max_attempts=3,
+            backoff_rate=2
+        )
+        ingest_shard.add_catch(sfn.Pass(self, "ShardFailed"), result_path="$.error")
+
+        shards = sfn.Map(
+            self,
+            "IngestShards",
+            items_path="$.shards",
+            max_concurrency=max_concurrency,
+            item_selector={
+                "backfill_id": sfn.JsonPath.string_at("$.backfill_id"),
+                "shard": sfn.JsonPath.object_at("$$.Map.Item.Value")
+            },
+            # El resultado de cada shard queda en su manifiesto de S3, no en el estado
+            result_path=sfn.JsonPath.DISCARD
+        )
+        shards.item_processor(ingest_shard)
+
+        # 3. Merge: manifiesto combinado del backfill
+        merge = tasks.LambdaInvoke(
+            self,
+            "MergeManifests",
+            lambda_function=self.function,
+            payload=sfn.TaskInput.from_object({
+                "action": "merge",
+                "backfill_id": sfn.JsonPath.string_at("$.backfill_id"),
+                "start": sfn.JsonPath.string_at("$.start"),
+                "end": sfn.JsonPath.string_at("$.end"),
+                "shard_days": sfn.JsonPath.number_at("$.shard_days")
+            }),
+            payload_response_only=True
+        )
+
+        complete = sfn.Choice(self, "BackfillComplete").when(
+            sfn.Condition.string_equals("$.status", "succeeded"),
+            sfn.Succeed(self, "BackfillSucceeded")
+        ).otherwise(
+            sfn.Fail(
+                self,
+                "BackfillIncomplete",
+                error="BackfillIncomplete",
+                cause="Hay shards sin completar; repetir la ejecución con el mismo backfill_id"
+            )
+        )
+
+        self.state_machine = sfn.StateMachine(
+            self,
+            "StateMachine",
+            state_machine_name="medical-analytics-api-backfill",
+            definition_body=sfn.DefinitionBody.from_chainable(plan.next(shards).next(merge).next(complete)),
+            timeout=Duration.hours(24),
+            tracing_enabled=True
+        )
@@ -28,10 +28,12 @@ class LambdaLayerStack(Stack):
         # Crear Lambda Layers para dependencias externas
         self.pandas_layer = self._create_pandas_layer()
         self.common_layer = self._create_common_layer()
+        self.runtime_layer = self._create_runtime_layer()
         
         # Outputs
         CfnOutput(self, "PandasLayerArn", value=self.pandas_layer.layer_version_arn)
         CfnOutput(self, "CommonLayerArn", value=self.common_layer.layer_version_arn)
+        CfnOutput(self, "RuntimeLayerArn", value=self.runtime_layer.layer_version_arn)
 
     def _create_pandas_layer(self) -> lambda_.LayerVersion:
         """
@@ -78,3 +80,20 @@ class LambdaLayerStack(Stack):
             removal_policy=RemovalPolicy.RETAIN,
             description="Layer con dependencias comunes como boto3, requests, etc."
         )
+
+    def _create_runtime_layer(self) -> lambda_.LayerVersion:
+        """
+        Crea un Lambda Layer con el código compartido por las funciones (medical_analytics_runtime).
+        Es Python puro, por lo que se empaqueta directamente desde el directorio sin construcción previa.
+        """
+        return lambda_.LayerVersion(
+            self,
+            "RuntimeLayer",
+            code=lambda_.Code.from_asset("layers/runtime_layer"),
+            compatible_runtimes=[
+                lambda_.Runtime.PYTHON_3_9,
+                lambda_.Runtime.PYTHON_3_8
+            ],
+            removal_policy=RemovalPolicy.RETAIN,
+            description="Layer con código compartido: auditoría, clientes AWS y utilidades de S3"
+        )
@@ -55,7 +55,17 @@ class StorageStack(Stack):
             encryption_key=encryption_key,
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
             enforce_ssl=True,
-            removal_policy=RemovalPolicy.RETAIN
+            removal_policy=RemovalPolicy.RETAIN,
+            # Publicar eventos en EventBridge para disparar el procesamiento de cargas directas
+            event_bridge_enabled=True,
+            # Permitir cargas directas desde el navegador mediante URLs prefirmadas
+            cors=[s3.CorsRule(
+                allowed_methods=[s3.HttpMethods.POST, s3.HttpMethods.PUT],
+                allowed_origins=["*"],  # En producción, limitar a dominio de CloudFront
+                allowed_headers=["*"],
+                exposed_headers=["ETag"],  # El cliente necesita el ETag de cada parte multiparte
+                max_age=3000
+            )]
         )
 
         # Configurar política de ciclo de vida para mover versiones antiguas a almacenamiento más económico
@@ -75,6 +85,13 @@ class StorageStack(Stack):
             ]
         )
 
+        # Limpiar cargas multiparte abandonadas (sesiones de carga que nunca se completaron)
+        bucket.add_lifecycle_rule(
+            id="abort-incomplete-multipart-uploads",
+            enabled=True,
+            abort_incomplete_multipart_upload_after=Duration.days(7)
+        )
+
         # Crear estructura de carpetas en el bucket S3
         self._create_folder_structure(bucket)
 
@@ -138,7 +155,9 @@ class StorageStack(Stack):
                 actions=[
                     "s3:PutObject",
                     "s3:GetObject",
-                    "s3:ListBucket"
+                    "s3:ListBucket",
+                    "s3:ListMultipartUploadParts",
+                    "s3:AbortMultipartUpload"
                 ],
                 resources=[
                     bucket.arn_for_objects("raw/*"),
@@ -0,0 +1,432 @@
+import gzip
+import io
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+import pytest
+import requests
+import botocore.session
+import urllib3
+import zstandard
+from requests.structures import CaseInsensitiveDict
+
+from medical_analytics_runtime import storage
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Versión de botocore verificada con IfMatch/IfNoneMatch en PutObject (índice CDC y checkpoints)
+CONDITIONAL_PUT_BOTOCORE = (1, 35, 99)
+
+
+def FakeResponse(payload, status_code=200, links=None, headers=None, encoding=None,
+                 url="https://api.test/datos-medicos"):
+    """Respuesta HTTP de requests (con el cuerpo sin leer) para simular la API del cliente."""
+    body = b"" if payload is None else json.dumps(payload).encode()
+    if encoding == "gzip":
+        body = gzip.compress(body)
+    elif encoding == "zstd":
+        body = zstandard.ZstdCompressor().compress(body)
+
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response.headers = CaseInsensitiveDict({"Content-Type": "application/json", **(headers or {})})
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if links:
+        response.headers["Link"] = ", ".join(f'<{link["url"]}>; rel="{rel}"' for rel, link in links.items())
+    response.raw = urllib3.HTTPResponse(body=io.BytesIO(body), preload_content=False, decode_content=False)
+    return response
+
+
+def read_ndjson(aws, bucket, body):
+    """Registros del objeto NDJSON indicado en la respuesta del handler."""
+    s3_key = json.loads(body)["s3_location"].split(f"s3://{bucket}/", 1)[1]
+    lines = storage.get_object(aws.client("s3"), bucket, s3_key).decode().splitlines()
+    return s3_key, [json.loads(line) for line in lines]
+
+
+def test_ingestion_writes_compressed_payload(aws, bucket, api_ingestion, context, monkeypatch):
+    """Verifica que los datos de la API se guarden como NDJSON comprimido y se lean de forma transparente."""
+    records = [{"numdoc_paciente": str(i), "diagnostico": "E11 Diabetes"} for i in range(200)]
+    monkeypatch.setattr(api_ingestion.session, "get", lambda *args, **kwargs: FakeResponse(records))
+
+    response = api_ingestion.handler({}, context)
+
+    assert response["statusCode"] == 200
+    s3_key, stored = read_ndjson(aws, bucket, response["body"])
+    assert s3_key.endswith("_data.ndjson.zst") or s3_key.endswith("_data.ndjson.gz")
+    assert stored == records
+
+
+def test_ingestion_follows_cursor_and_link_pagination(aws, bucket, api_ingestion, context, monkeypatch):
+    """Verifica que se recorran las páginas por cursor y por encabezado Link, en orden."""
+    pages = {
+        None: {"data": [{"id": i} for i in range(0, 3)], "next_cursor": "c2"},
+        "c2": {"data": [{"id": i} for i in range(3, 6)], "next_cursor": "c3"},
+        "c3": {"data": [{"id": i} for i in range(6, 8)], "next_cursor": None},
+    }
+    calls = []
+
+    def fake_get(url, params=None, **kwargs):
+        calls.append((url, params))
+        if url.endswith("/enlace"):
+            return FakeResponse([{"id": 8}])
+        payload = pages[(params or {}).get("cursor")]
+        links = {"next": {"url": "https://api.test/enlace"}} if payload["next_cursor"] is None else {}
+        return FakeResponse(payload, links=links)
+
+    monkeypatch.setattr(api_ingestion.session, "get", fake_get)
+
+    response = api_ingestion.handler({}, context)
+
+    assert response["statusCode"] == 200
+    _, stored = read_ndjson(aws, bucket, response["body"])
+    assert [record["id"] for record in stored] == list(range(9))
+    assert [(params or {}).get("cursor") for _, params in calls] == [None, "c2", "c3", None]
+
+
+def test_offset_pagination_stops_on_short_page(api_ingestion):
+    """Verifica la paginación offset/limit: termina con la primera página incompleta."""
+    config = api_ingestion.PaginationConfig(mode="offset", page_size=2)
+    data = list(range(5))
+    requested = []
+
+    def fetch(url, params):
+        requested.append(urlencode(params))
+        return FakeResponse(data[params["offset"]:params["offset"] + params["limit"]])
+
+    assert list(api_ingestion.iter_pages(fetch, "https://api.test", config)) == [[0, 1], [2, 3], [4]]
+    assert requested == ["limit=2&offset=0", "limit=2&offset=2", "limit=2&offset=4"]
+
+
+def test_concurrent_offset_pages_keep_order_and_bound_parallelism(api_ingestion):
+    """Verifica que las páginas offset se pidan en paralelo (hasta el máximo) y se entreguen en orden."""
+    config = api_ingestion.PaginationConfig(mode="offset", page_size=10)
+    data = list(range(95))
+    lock = threading.Lock()
+    in_flight = [0, 0]  # actuales, máximo
+
+    def fetch(url, params):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        # Las primeras páginas tardan más: sin reordenar llegarían al final
+        time.sleep(0.05 if params["offset"] < 30 else 0.01)
+        with lock:
+            in_flight[0] -= 1
+        return FakeResponse(data[params["offset"]:params["offset"] + params["limit"]])
+
+    pages = list(api_ingestion.iter_pages(fetch, "https://api.test", config, max_concurrency=4))
+
+    assert [record for page in pages for record in page] == data
+    assert len(pages) == 10
+    assert 1 < in_flight[1] <= 4
+
+
+def test_incremental_ingestion_advances_watermark_after_write(aws, bucket, api_ingestion, context, monkeypatch):
+    """Verifica que se pidan solo los cambios (con solapamiento) y que la marca avance solo tras escribir."""
+    monkeypatch.setattr(
+        api_ingestion, "WATERMARK", api_ingestion.WatermarkConfig("updated_at", "updated_since", overlap=900)
+    )
+    batches = [
+        [{"id": 1, "updated_at": "2024-05-01T10:00:00Z"}, {"id": 2, "updated_at": "2024-05-01T12:30:00Z"}],
+        [{"id": 3, "updated_at": "2024-05-01T13:00:00+02:00"}],
+    ]
+    requested = []
+
+    def fake_get(url, params=None, **kwargs):
+        requested.append(dict(params or {}))
+        if not batches:
+            raise api_ingestion.requests.exceptions.ConnectionError("API caída")
+        return FakeResponse(batches.pop(0))
+
+    monkeypatch.setattr(api_ingestion.session, "get", fake_get)
+    store = api_ingestion.CheckpointStore(aws.client("s3"), bucket, "https://api.test/datos-medicos", api_ingestion.WATERMARK)
+
+    assert api_ingestion.handler({}, context)["statusCode"] == 200
+    assert requested[0] == {}
+    assert store.load()["watermark"] == "2024-05-01T12:30:00+00:00"
+
+    assert api_ingestion.handler({}, context)["statusCode"] == 200
+    assert requested[1] == {"updated_since": "2024-05-01T12:15:00+00:00"}
+    # 13:00+02:00 (11:00 UTC) es anterior a la marca: se escribe pero no la hace retroceder
+    assert store.load()["watermark"] == "2024-05-01T12:30:00+00:00"
+
+    # Una ejecución fallida no mueve la marca
+    assert api_ingestion.handler({}, context)["statusCode"] == 500
+    assert requested[-1] == {"updated_since": "2024-05-01T12:15:00+00:00"}
+    assert store.load()["watermark"] == "2024-05-01T12:30:00+00:00"
+
+
+def test_checkpoint_advance_is_conditional(aws, bucket, api_ingestion):
+    """Verifica que una ejecución concurrente no haga retroceder la marca de agua."""
+    config = api_ingestion.WatermarkConfig("seq", "since", kind="sequence", overlap=10)
+    first = api_ingestion.CheckpointStore(aws.client("s3"), bucket, "https://api.test/x", config)
+    second = api_ingestion.CheckpointStore(aws.client("s3"), bucket, "https://api.test/x", config)
+
+    assert first.load() is None and second.load() is None
+    assert first.advance(500, request_id="a")
+    # second leyó antes de que first escribiera: su escritura condicional falla, relee y no retrocede
+    assert not second.advance(300, request_id="b")
+    assert second.advance(700, request_id="b")
+    assert first.load()["watermark"] == 700
+    assert config.request_params(700) == {"since": 690}
+
+
+def test_fetch_retries_with_retry_after_and_circuit_opens_on_outage(aws, bucket, api_ingestion, context, monkeypatch):
+    """Verifica el Retry-After de un 429 y que, con la API caída, el circuito abierto evite llamarla."""
+    waits = []
+    monkeypatch.setattr(api_ingestion, "RETRY_POLICY", api_ingestion.RetryPolicy(max_attempts=3, sleep=waits.append))
+    responses = [FakeResponse(None, status_code=429, headers={"Retry-After": "7"}), FakeResponse([{"id": 1}])]
+    calls = []
+
+    def fake_get(url, params=None, **kwargs):
+        calls.append(url)
+        if responses:
+            return responses.pop(0)
+        raise api_ingestion.requests.exceptions.ConnectTimeout("sin conexión")
+
+    monkeypatch.setattr(api_ingestion.session, "get", fake_get)
+
+    assert api_ingestion.handler({}, context)["statusCode"] == 200
+    assert waits[0] >= 7
+
+    # Tres ejecuciones fallidas (3 intentos cada una) abren el circuito
+    for _ in range(api_ingestion.breaker.failure_threshold):
+        assert api_ingestion.handler({}, context)["statusCode"] == 500
+    calls.clear()
+
+    response = api_ingestion.handler({}, context)
+    assert response["statusCode"] == 503
+    assert json.loads(response["body"])["type"] == "CircuitOpenError"
+    assert calls == []
+
+
+def test_half_open_probe_released_on_local_error(aws, bucket, api_ingestion, context, monkeypatch):
+    """Verifica que una prueba half_open que falla por un error local libere la prueba sin contar un fallo."""
+    breaker = api_ingestion.breaker
+    now = [1000.0]
+    monkeypatch.setattr(breaker, "_clock", lambda: now[0])
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    now[0] += breaker.reset_seconds + 1
+
+    def fail_locally(*args, **kwargs):
+        raise OSError("No queda espacio en /tmp")
+
+    monkeypatch.setattr(api_ingestion, "ingest_pages", fail_locally)
+
+    assert api_ingestion.handler({}, context)["statusCode"] == 500
+    state = breaker.store.load(breaker.name)
+    assert (state["state"], state["failures"], state["opened_until"]) == ("open", breaker.failure_threshold, now[0])
+    # La siguiente invocación prueba la API de inmediato en lugar de esperar probe_seconds
+    breaker.before_call()
+    assert breaker.store.load(breaker.name)["state"] == "half_open"
+
+
+def test_compressed_response_and_not_modified_skip_write(aws, bucket, api_ingestion, context, monkeypatch):
+    """Verifica la descompresión en streaming y que un 304 a la solicitud condicional no escriba en S3."""
+    records = [{"id": i, "diagnostico": "I10 Hipertensión esencial"} for i in range(500)]
+    requests_headers = []
+
+    def fake_get(url, params=None, headers=None, **kwargs):
+        requests_headers.append(headers)
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(None, status_code=304)
+        return FakeResponse(records, headers={"ETag": '"v1"'}, encoding="zstd")
+
+    monkeypatch.setattr(api_ingestion.session, "get", fake_get)
+    assert "zstd" in api_ingestion.session.headers["Accept-Encoding"]
+
+    response = api_ingestion.handler({}, context)
+    assert response["statusCode"] == 200
+    assert read_ndjson(aws, bucket, response["body"])[1] == records
+    stored = aws.client("s3").list_objects_v2(Bucket=bucket, Prefix="raw/api/")["KeyCount"]
+
+    response = api_ingestion.handler({}, context)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["records_processed"] == 0
+    assert requests_headers[1]["If-None-Match"] == '"v1"'
+    assert aws.client("s3").list_objects_v2(Bucket=bucket, Prefix="raw/api/")["KeyCount"] == stored
+
+
+def test_parquet_output_is_partitioned_with_contract_schema(aws, bucket, api_ingestion, context, monkeypatch, tmp_path):
+    """Verifica la salida Parquet: partición por fuente y fecha, esquema del contrato y estadísticas por row group."""
+    import pyarrow.parquet as pq
+
+    records = [
+        {
+            "id": str(i),
+            "numdoc_paciente": f"{i:05d}",
+            "fecha_folio": f"2024-03-{1 + (249 - i) % 28:02d}T08:00:00Z",
+            "presion_sistolica": "120" if i % 2 else 118.5,
+            "diagnostico": "I10 Hipertensión esencial",
+            **({"campo_nuevo": "valor"} if i == 0 else {}),
+        }
+        for i in range(250)
+    ]
+    monkeypatch.setattr(api_ingestion.session, "get", lambda *args, **kwargs: FakeResponse(records))
+    monkeypatch.setattr(api_ingestion, "PARQUET_ENABLED", True)
+    monkeypatch.setattr(api_ingestion, "PARQUET_ROW_GROUP_ROWS", 100)
+
+    response = api_ingestion.handler({}, context)
+
+    assert response["statusCode"] == 200
+    keys = [obj["Key"] for obj in aws.client("s3").list_objects_v2(Bucket=bucket, Prefix="raw/parquet/")["Contents"]]
+    assert len(keys) == 1
+    assert keys[0].startswith("raw/parquet/source=api/year=")
+    assert "/month=" in keys[0] and "/day=" in keys[0]
+
+    local = str(tmp_path / "salida.parquet")
+    aws.client("s3").download_file(bucket, keys[0], local)
+    metadata = pq.read_metadata(local)
+    assert metadata.num_rows == 250 and metadata.num_row_groups == 3
+    fecha = metadata.schema.names.index("fecha_folio")
+    stats = metadata.row_group(0).column(fecha).statistics
+    assert stats.has_min_max and stats.min <= stats.max
+
+    table = pq.read_table(local)
+    assert table.schema.names == [
+        "id", "numdoc_paciente", "nombre_paciente", "fecha_folio", "diagnostico", "presion_sistolica",
+        "presion_diastolica", "updated_at", "extra", "request_id", "ingested_at",
+    ]
+    assert str(table.schema.field("id").type) == "int64"
+    assert str(table.schema.field("presion_sistolica").type) == "double"
+    rows = table.to_pylist()
+    assert {row["presion_sistolica"] for row in rows} == {120.0, 118.5}
+    assert json.loads(next(row["extra"] for row in rows if row["id"] == 0)) == {"campo_nuevo": "valor"}
+
+
+def test_parquet_writer_failed_upload_keeps_original_error_and_cleans_tmp(api_ingestion):
+    """Verifica que si falla la subida de un archivo se propague ese error y no quede nada en /tmp."""
+    import datetime
+
+    class FailingS3:
+        def upload_file(self, *args, **kwargs):
+            raise RuntimeError("S3 no disponible")
+
+        def delete_object(self, **kwargs):
+            pass
+
+    writer = api_ingestion.PartitionedParquetWriter(
+        FailingS3(), "bucket", "api", "prueba", "req-1", datetime.datetime(2024, 3, 1), row_group_rows=10
+    )
+    with pytest.raises(RuntimeError, match="S3 no disponible"):
+        with writer:
+            writer.write([{"id": i, "fecha_folio": "2024-03-01T08:00:00Z"} for i in range(25)])
+    assert not os.path.exists(writer._tmp_dir)
+
+
+def test_failed_ndjson_commit_removes_uploaded_parquet(aws, bucket, api_ingestion, context, monkeypatch):
+    """Verifica que si falla el cierre del NDJSON se eliminen los Parquet que ya se habían subido."""
+    records = [{"id": i, "fecha_folio": "2024-03-01T08:00:00Z"} for i in range(250)]
+    monkeypatch.setattr(api_ingestion.session, "get", lambda *args, **kwargs: FakeResponse(records))
+    monkeypatch.setattr(api_ingestion, "PARQUET_ENABLED", True)
+    monkeypatch.setattr(api_ingestion, "PARQUET_ROW_GROUP_ROWS", 100)
+    monkeypatch.setattr(api_ingestion, "PARQUET_TARGET_FILE_BYTES", 1)  # Cada row group se sube al escribirlo
+    uploaded = []
+    real_roll = api_ingestion.PartitionedParquetWriter._roll
+
+    def roll(writer):
+        real_roll(writer)
+        uploaded.extend(writer.keys[len(uploaded):])
+
+    def fail_close(writer):
+        raise RuntimeError("S3 rechazó CompleteMultipartUpload")
+
+    monkeypatch.setattr(api_ingestion.PartitionedParquetWriter, "_roll", roll)
+    monkeypatch.setattr(storage.CompressedWriter, "close", fail_close)
+
+    assert api_ingestion.handler({}, context)["statusCode"] == 500
+
+    assert len(uploaded) >= 2  # Había Parquet subidos antes de cerrar el NDJSON
+    assert aws.client("s3").list_objects_v2(Bucket=bucket, Prefix="raw/parquet/")["KeyCount"] == 0
+
+
+def test_change_index_writes_only_deltas_and_tombstones(aws, bucket, api_ingestion, context, monkeypatch):
+    """Verifica que con el índice CDC se escriban solo inserciones y cambios, y las eliminaciones como tombstones."""
+    monkeypatch.setattr(api_ingestion, "CDC", api_ingestion.CdcConfig(("id",), shards=4))
+    changed = [{"id": i, "diagnostico": "I10 Hipertensión" if i == 7 else "E11 Diabetes"} for i in range(50) if i != 3]
+    changed.append({"id": 50, "diagnostico": "J45 Asma"})
+    snapshots = [[{"id": i, "diagnostico": "E11 Diabetes"} for i in range(50)], changed, list(reversed(changed))]
+    monkeypatch.setattr(api_ingestion.session, "get", lambda *args, **kwargs: FakeResponse(snapshots.pop(0)))
+
+    first = json.loads(api_ingestion.handler({}, context)["body"])
+    assert first["changes"] == {"insert": 50, "update": 0, "unchanged": 0, "delete": 0}
+    assert len(read_ndjson(aws, bucket, json.dumps(first))[1]) == 50
+
+    second = json.loads(api_ingestion.handler({}, context)["body"])
+    assert second["changes"] == {"insert": 1, "update": 1, "unchanged": 48, "delete": 1}
+    assert sorted(record["id"] for record in read_ndjson(aws, bucket, json.dumps(second))[1]) == [7, 50]
+    objects = aws.client("s3").list_objects_v2(Bucket=bucket, Prefix="raw/api/")["Contents"]
+    [tombstones_key] = [obj["Key"] for obj in objects if "_tombstones.ndjson" in obj["Key"]]
+    tombstones = storage.get_object(aws.client("s3"), bucket, tombstones_key)
+    assert [json.loads(line)["key"] for line in tombstones.decode().splitlines()] == ["3"]
+
+    # Sin cambios: no se escribe ningún objeto de datos
+    third = json.loads(api_ingestion.handler({}, context)["body"])
+    assert third["changes"] == {"insert": 0, "update": 0, "unchanged": 50, "delete": 0}
+    assert third["s3_location"] is None
+
+
+def test_common_layer_botocore_accepts_conditional_puts():
+    """Verifica que la capa común fije un botocore cuyo PutObject acepta las escrituras condicionales."""
+    for path in ("layers/common_layer/requirements.txt", "layers/common_layer/python_dir/requirements.txt"):
+        with open(os.path.join(ROOT_DIR, path)) as f:
+            pins = dict(line.strip().split("==") for line in f if "==" in line)
+        # Con un botocore anterior el cliente falla con ParamValidationError antes de enviar la solicitud
+        assert tuple(int(part) for part in pins["botocore"].split(".")) >= CONDITIONAL_PUT_BOTOCORE, path
+        assert pins["boto3"] == pins["botocore"], path
+    members = botocore.session.get_session().get_service_model("s3").operation_model("PutObject").input_shape.members
+    assert {"IfMatch", "IfNoneMatch"} <= set(members)
+
+
+def test_backfill_plan_splits_range_into_half_open_shards(api_ingestion):
+    """Verifica que el plan cubra el rango sin huecos ni solapamientos y que el último shard quede recortado."""
+    shards = api_ingestion.backfill.plan_shards("2024-01-01", "2024-01-08T12:00:00Z", shard_days=2)
+
+    assert [shard["shard_id"] for shard in shards] == ["0000", "0001", "0002", "0003"]
+    assert shards[0]["start"] == "2024-01-01T00:00:00+00:00"
+    assert all(a["end"] == b["start"] for a, b in zip(shards, shards[1:]))
+    assert shards[-1]["end"] == "2024-01-08T12:00:00+00:00"
+    with pytest.raises(ValueError):
+        api_ingestion.backfill.plan_shards("2024-01-01", "2030-01-01", shard_days=1)
+
+
+def test_backfill_runs_shards_locally_and_resumes_missing_ones(aws, bucket, api_ingestion, context, monkeypatch):
+    """Verifica el backfill local: shards en paralelo, manifiesto combinado y reanudación de los shards fallidos."""
+    requested = []
+    failing = {"2024-01-02T00:00:00+00:00"}
+
+    def fake_get(url, params=None, **kwargs):
+        requested.append(params["updated_since"])
+        if params["updated_since"] in failing:
+            return FakeResponse({"error": "no disponible"}, status_code=400)
+        day = params["updated_since"][:10]
+        return FakeResponse([{"id": f"{day}-{i}", "fecha_folio": day} for i in range(10)])
+
+    monkeypatch.setattr(api_ingestion.session, "get", fake_get)
+    event = {"backfill_id": "historia-2024", "start": "2024-01-01", "end": "2024-01-04", "shard_days": 1}
+
+    result = api_ingestion.backfill.run_locally(api_ingestion.backfill_handler, event, context, max_concurrency=3)
+    assert result["status"] == "incomplete"
+    assert result["missing_shards"] == ["0001"]
+    assert result["records"] == 20
+
+    failing.clear()
+    requested.clear()
+    result = api_ingestion.backfill.run_locally(api_ingestion.backfill_handler, event, context)
+    assert requested == ["2024-01-02T00:00:00+00:00"]  # Solo el shard que faltaba
+    assert result == {
+        "backfill_id": "historia-2024", "status": "succeeded", "shards_total": 3, "shards_completed": 3,
+        "missing_shards": [], "records": 30,
+    }
+    manifest = json.loads(storage.get_object(aws.client("s3"), bucket, "raw/api/_backfills/historia-2024/manifest.json"))
+    assert [key.rsplit("/", 1)[1].split("_")[0] for key in manifest["objects"]] == [
+        "historia-2024-0000", "historia-2024-0001", "historia-2024-0002"
+    ]
+    # El backfill no mueve el checkpoint de la ingesta programada
+    assert aws.client("s3").list_objects_v2(Bucket=bucket, Prefix="raw/api/_checkpoints/")["KeyCount"] == 0
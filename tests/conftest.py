@@ -0,0 +1,96 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Código compartido de las Lambdas (se despliega como Lambda Layer en /opt/python)
+sys.path.insert(0, os.path.join(ROOT_DIR, "layers", "runtime_layer", "python"))
+
+# Credenciales y región ficticias para que boto3 nunca apunte a una cuenta real
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+TEST_BUCKET = "medical-analytics-test"
+
+
+class FakeContext:
+    """Contexto Lambda mínimo para invocar los handlers en pruebas."""
+    function_name = "test-function"
+    function_version = "$LATEST"
+    aws_request_id = "test-lambda-request-id"
+
+
+def load_lambda_module(function_dir):
+    """
+    Carga lambda/{function_dir}/index.py como módulo independiente.
+    Todas las Lambdas usan el nombre index.py, por lo que se registran con un nombre único.
+    """
+    lambda_path = os.path.join(ROOT_DIR, "lambda", function_dir)
+    spec = importlib.util.spec_from_file_location(f"{function_dir}_index", os.path.join(lambda_path, "index.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, lambda_path)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(lambda_path)
+    return module
+
+
+@pytest.fixture
+def audit_dir(tmp_path, monkeypatch):
+    """Directorio del stand-in local de auditoría (en lugar de Firehose)."""
+    directory = tmp_path / "audit"
+    monkeypatch.setenv("AUDIT_SINK", "local")
+    monkeypatch.setenv("AUDIT_LOCAL_DIR", str(directory))
+    return directory
+
+
+@pytest.fixture
+def aws(monkeypatch, audit_dir):
+    """Entorno AWS simulado con moto y el bucket de datos creado."""
+    from moto import mock_aws
+    import boto3
+    from medical_analytics_runtime.clients import reset_clients
+
+    monkeypatch.setenv("BUCKET_NAME", TEST_BUCKET)
+    # Los clientes memoizados de las Lambdas deben crearse dentro de cada simulación
+    reset_clients()
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=TEST_BUCKET)
+        yield boto3
+    reset_clients()
+
+
+@pytest.fixture
+def bucket():
+    return TEST_BUCKET
+
+
+@pytest.fixture
+def context():
+    return FakeContext()
+
+
+@pytest.fixture
+def file_processor(aws):
+    """Módulo de la Lambda file_processor cargado dentro del entorno simulado."""
+    return load_lambda_module("file_processor")
+
+
+@pytest.fixture
+def excel_converter(aws, tmp_path, monkeypatch):
+    """Módulo de la Lambda excel_converter cargado dentro del entorno simulado."""
+    monkeypatch.setenv("SCHEMA_CACHE_DIR", str(tmp_path / "schema-registry"))
+    return load_lambda_module("excel_converter")
+
+
+@pytest.fixture
+def api_ingestion(aws, monkeypatch):
+    """Módulo de la Lambda api_ingestion cargado dentro del entorno simulado."""
+    monkeypatch.setenv("API_ENDPOINT", "https://api.test/datos-medicos")
+    monkeypatch.setenv("API_RETRY_BASE_DELAY", "0")  # Reintentos sin espera
+    return load_lambda_module("api_ingestion")
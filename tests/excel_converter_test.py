@@ -0,0 +1,179 @@
+import datetime
+import io
+import json
+import sys
+
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+WORKBOOK_KEY = "raw/excel/2024-03-05/20240305T101500Z_abc_campana.xlsx"
+
+
+def build_workbook(rows, headers=("NUMDOC_PACIENTE", "FECHA_FOLIO", "NOMBRE_PACIENTE", "DIAGNÓSTICO")):
+    """Genera un libro .xlsx en memoria con los encabezados y filas dados."""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(list(headers))
+    for row in rows:
+        sheet.append(list(row))
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def object_created(bucket, key):
+    return {"source": "aws.s3", "detail": {"bucket": {"name": bucket}, "object": {"key": key}}}
+
+
+def read_parquet(aws, bucket, key):
+    body = aws.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read()
+    return pq.ParquetFile(io.BytesIO(body))
+
+
+def test_workbook_converted_to_partitioned_parquet(aws, bucket, excel_converter, context):
+    """Verifica que el libro se convierta a Parquet tipado y comprimido en particiones Hive de cleaned/."""
+    content = build_workbook([
+        ("0012345", "05/03/2024", " Ana Pérez ", "J45 Asma"),
+        ("0012345", datetime.datetime(2024, 3, 6, 8, 30), "Ana Pérez", "I10 Hipertensión"),
+        ("998877", "no es fecha", "Luis Gómez", ""),
+        (None, None, None, None),
+    ])
+    aws.client("s3").put_object(Bucket=bucket, Key=WORKBOOK_KEY, Body=content)
+
+    result = excel_converter.handler(object_created(bucket, WORKBOOK_KEY), context)
+
+    outputs = result["converted"][0]["outputs"]
+    assert outputs["diagnosticos"] == (
+        "cleaned/diagnosticos/year=2024/month=03/day=05/20240305T101500Z_abc_campana.parquet"
+    )
+    diagnosticos = read_parquet(aws, bucket, outputs["diagnosticos"])
+    assert diagnosticos.schema_arrow.equals(excel_converter.DIAGNOSTICOS_SCHEMA)
+    assert diagnosticos.metadata.row_group(0).column(0).compression == "ZSTD"
+    assert diagnosticos.metadata.row_group(0).column(0).statistics.has_min_max
+
+    rows = diagnosticos.read().to_pylist()
+    assert [r["numdoc_paciente"] for r in rows] == ["0012345", "0012345", "998877"]
+    assert [r["fecha_folio"].date().isoformat() for r in rows[:2]] == ["2024-03-05", "2024-03-06"]
+    assert rows[2]["fecha_folio"] is None
+    assert rows[2]["diagnostico"] is None
+
+    pacientes = read_parquet(aws, bucket, outputs["pacientes"]).read().to_pylist()
+    assert [(p["numdoc_paciente"], p["nombre_paciente"]) for p in pacientes] == [
+        ("0012345", "Ana Pérez"), ("998877", "Luis Gómez")
+    ]
+
+
+def test_workbook_missing_columns_is_rejected(aws, bucket, excel_converter, context):
+    """Verifica que un libro sin las columnas requeridas se rechace sin escribir en cleaned/."""
+    content = build_workbook([("1", "x")], headers=("NUMDOC_PACIENTE", "OTRA"))
+    aws.client("s3").put_object(Bucket=bucket, Key=WORKBOOK_KEY, Body=content)
+
+    result = excel_converter.handler(object_created(bucket, WORKBOOK_KEY), context)
+
+    assert result == {"converted": [], "rejected": [WORKBOOK_KEY]}
+    assert aws.client("s3").list_objects_v2(Bucket=bucket, Prefix="cleaned/")["KeyCount"] == 0
+
+
+def test_internal_index_objects_are_ignored(excel_converter, bucket, context):
+    """Verifica que el índice de deduplicación bajo raw/excel/_index/ no se intente convertir."""
+    result = excel_converter.handler(object_created(bucket, "raw/excel/_index/abc.json"), context)
+
+    assert result == {"converted": [], "rejected": []}
+
+
+def test_duplicate_direct_upload_not_converted_twice(aws, bucket, excel_converter, file_processor, context):
+    """Verifica que una carga directa de un contenido ya cargado no genere otra salida en cleaned/."""
+    s3 = aws.client("s3")
+    content = build_workbook([("0012345", "05/03/2024", "Ana Pérez", "J45 Asma")])
+    s3.put_object(Bucket=bucket, Key=WORKBOOK_KEY, Body=content)
+    file_processor.handler(object_created(bucket, WORKBOOK_KEY), context)
+    excel_converter.handler(object_created(bucket, WORKBOOK_KEY), context)
+    outputs = [obj["Key"] for obj in s3.list_objects_v2(Bucket=bucket, Prefix="cleaned/")["Contents"]]
+
+    # El conversor y file_processor reciben el mismo evento; el orden no está garantizado
+    duplicate_key = "raw/excel/2024-03-06/20240306T090000Z_def_copia.xlsx"
+    s3.put_object(Bucket=bucket, Key=duplicate_key, Body=content)
+    converted = excel_converter.handler(object_created(bucket, duplicate_key), context)
+    file_processor.handler(object_created(bucket, duplicate_key), context)
+    converted_again = excel_converter.handler(object_created(bucket, duplicate_key), context)
+
+    assert converted == converted_again == {"converted": [], "rejected": []}
+    assert [obj["Key"] for obj in s3.list_objects_v2(Bucket=bucket, Prefix="cleaned/")["Contents"]] == outputs
+    assert s3.list_objects_v2(Bucket=bucket, Prefix="raw/excel/2024-03-06/")["KeyCount"] == 0
+
+
+def test_reader_yields_bounded_batches_with_projected_columns(excel_converter, tmp_path):
+    """Verifica que el lector genere lotes del tamaño pedido solo con las columnas del esquema."""
+    path = tmp_path / "libro.xlsx"
+    path.write_bytes(build_workbook(
+        [(f"Extra {i}", 1000 + i, "2024-03-05", f"Paciente {i}", "J45") for i in range(25)],
+        headers=("OBSERVACIONES", "Numdoc Paciente", "Fecha Folio", "NOMBRE_PACIENTE", "Diagnóstico")
+    ))
+
+    batches = list(excel_converter.iter_record_batches(
+        str(path), excel_converter.WORKBOOK_SCHEMA, lambda header: {"numdoc_paciente": 1, "fecha_folio": 2}, batch_size=10
+    ))
+
+    assert [batch.num_rows for batch in batches] == [10, 10, 5]
+    assert batches[0].schema.equals(excel_converter.WORKBOOK_SCHEMA)
+    assert batches[0].column("numdoc_paciente")[0].as_py() == "1000"
+    assert batches[2].column("fecha_folio")[4].as_py() == datetime.datetime(2024, 3, 5)
+    assert batches[0].column("diagnostico").null_count == 10
+
+
+def test_row_parser_matches_public_iter_rows(excel_converter, tmp_path, monkeypatch):
+    """Verifica que el recorrido con RowParser y el de iter_rows() produzcan los mismos lotes."""
+    reader = sys.modules[excel_converter.iter_record_batches.__module__]
+    path = tmp_path / "libro.xlsx"
+    path.write_bytes(build_workbook(
+        [
+            ("0012345", datetime.datetime(2024, 3, 5, 8, 30), "Ana Pérez", "J45 Asma", 120.5),
+            (None, None, None, None, None),
+            (998877.0, "06/03/2024", None, "I10", "130,5"),
+            ("0012345", "no es fecha", "Ana Pérez", None),
+        ],
+        headers=("NUMDOC_PACIENTE", "FECHA_FOLIO", "NOMBRE_PACIENTE", "DIAGNOSTICO", "PAS")
+    ))
+    positions = {"numdoc_paciente": 0, "fecha_folio": 1, "nombre_paciente": 2, "diagnostico": 3, "presion_sistolica": 4}
+
+    def read(use_row_parser):
+        monkeypatch.setattr(reader, "USE_ROW_PARSER", use_row_parser)
+        return pa.Table.from_batches(list(excel_converter.iter_record_batches(
+            str(path), excel_converter.WORKBOOK_SCHEMA, lambda header: positions, batch_size=2
+        )))
+
+    fast, public = read(True), read(False)
+
+    assert fast.num_rows == 3
+    assert fast.equals(public)
+
+
+def test_template_headers_resolved_by_alias_and_similarity(excel_converter):
+    """Verifica la resolución de encabezados de distintas plantillas hacia los mismos campos."""
+    header = ("Identificación", "Nombres y apellidos", "Fecha atención", "Dx", "TA sist", "Presion Diastolic", "Sede")
+
+    mapping = excel_converter.get_schema_registry().resolve(header)["columns"]
+
+    assert mapping == {
+        "numdoc_paciente": 0, "nombre_paciente": 1, "fecha_folio": 2, "diagnostico": 3,
+        "presion_sistolica": 4, "presion_diastolica": 5
+    }
+
+
+def test_known_template_resolved_from_cache(aws, bucket, excel_converter, tmp_path):
+    """Verifica que una plantilla conocida se resuelva desde la caché local sin volver a consultar S3."""
+    header = ("NUMDOC", "Nombre", "Fecha", "Diagnóstico", "PAS")
+    registry = excel_converter.get_schema_registry()
+
+    entry = registry.resolve(header)
+    stored = aws.client("s3").get_object(Bucket=bucket, Key=f"cleaned/_schemas/v1/{entry['fingerprint']}.json")
+    assert json.loads(stored["Body"].read())["columns"]["presion_sistolica"] == 4
+    assert entry["dtypes"]["fecha_folio"] == "timestamp[ms]"
+
+    # Un contenedor nuevo con la misma caché en /tmp no llama a S3
+    cold = excel_converter.SchemaRegistry(
+        None, bucket, excel_converter.WORKBOOK_SCHEMA, excel_converter.COLUMN_ALIASES,
+        excel_converter.REQUIRED_FIELDS, cache_dir=str(tmp_path / "schema-registry")
+    )
+    assert cold.resolve(header) == entry
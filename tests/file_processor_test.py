@@ -0,0 +1,229 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+
+
+def list_workbooks(aws, bucket):
+    """Claves de libros cargados bajo raw/excel/, sin el índice interno."""
+    objects = aws.client("s3").list_objects_v2(Bucket=bucket, Prefix="raw/excel/").get("Contents", [])
+    return [obj["Key"] for obj in objects if "/_" not in obj["Key"]]
+
+
+def test_upload_url_returns_presigned_post_under_raw_excel(file_processor, context):
+    """Verifica que /upload/url devuelva una política POST bajo raw/excel/{fecha}/."""
+    event = {
+        "resource": "/upload/url",
+        "body": json.dumps({"filename": "campaña 1.xlsx", "size": 2048})
+    }
+
+    response = file_processor.handler(event, context)
+    body = json.loads(response["body"])
+
+    assert response["statusCode"] == 200
+    assert body["s3_key"].startswith("raw/excel/")
+    assert body["s3_key"].endswith("_campa_a 1.xlsx")
+    assert body["fields"]["key"] == body["s3_key"]
+    assert "policy" in body["fields"]
+
+
+def test_upload_url_rejects_non_excel_files(file_processor, context):
+    """Verifica que solo se generen URLs para archivos Excel."""
+    event = {"resource": "/upload/url", "body": json.dumps({"filename": "datos.csv"})}
+
+    response = file_processor.handler(event, context)
+
+    assert response["statusCode"] == 400
+
+
+def test_object_created_event_logs_activity(aws, bucket, audit_dir, file_processor, context):
+    """Verifica que el evento ObjectCreated registre la auditoría en el sink con búfer y no en S3."""
+    s3 = aws.client("s3")
+    key = "raw/excel/2024-01-01/20240101T000000Z_abc_datos.xlsx"
+    s3.put_object(Bucket=bucket, Key=key, Body=b"contenido", Metadata={"request-id": "abc"})
+    event = {
+        "source": "aws.s3",
+        "detail-type": "Object Created",
+        "detail": {"bucket": {"name": bucket}, "object": {"key": key}}
+    }
+
+    result = file_processor.handler(event, context)
+
+    assert result == {"processed": [key]}
+    file_processor.audit.close()
+    records = [
+        json.loads(line)
+        for path in audit_dir.rglob("*.ndjson.gz")
+        for line in gzip.open(path, "rt")
+    ]
+    assert [(r["action"], r["s3_key"], r["request_id"]) for r in records] == [("file_upload", key, "abc")]
+    assert s3.list_objects_v2(Bucket=bucket, Prefix="logs/")["KeyCount"] == 0
+
+
+def test_upload_session_can_resume_and_complete(aws, bucket, file_processor, context):
+    """Verifica el ciclo de una sesión multiparte: crear, subir parte, reanudar y completar."""
+    s3 = aws.client("s3")
+    size = file_processor.MULTIPART_PART_SIZE + 10
+    created = json.loads(file_processor.handler({
+        "resource": "/upload/session",
+        "httpMethod": "POST",
+        "body": json.dumps({"filename": "grande.xlsx", "size": size})
+    }, context)["body"])
+    assert created["total_parts"] == 2
+    session = {"s3_key": created["s3_key"], "upload_id": created["upload_id"]}
+
+    urls = json.loads(file_processor.handler({
+        "resource": "/upload/session/parts",
+        "httpMethod": "POST",
+        "body": json.dumps({**session, "part_numbers": [1, 2]})
+    }, context)["body"])["urls"]
+    assert set(urls) == {"1", "2"}
+
+    # Simula que solo la primera parte llegó antes de perder la conexión
+    first = s3.upload_part(Bucket=bucket, Key=session["s3_key"], UploadId=session["upload_id"],
+                           PartNumber=1, Body=b"a" * file_processor.MULTIPART_PART_SIZE)
+    status = json.loads(file_processor.handler({
+        "resource": "/upload/session",
+        "httpMethod": "GET",
+        "queryStringParameters": session
+    }, context)["body"])
+    assert [p["part_number"] for p in status["parts"]] == [1]
+
+    second = s3.upload_part(Bucket=bucket, Key=session["s3_key"], UploadId=session["upload_id"],
+                            PartNumber=2, Body=b"b" * 10)
+    response = file_processor.handler({
+        "resource": "/upload/session/complete",
+        "httpMethod": "POST",
+        "body": json.dumps({**session, "parts": [
+            {"part_number": 2, "etag": second["ETag"]},
+            {"part_number": 1, "etag": first["ETag"]}
+        ]})
+    }, context)
+
+    assert response["statusCode"] == 200
+    assert s3.head_object(Bucket=bucket, Key=session["s3_key"])["ContentLength"] == size
+
+
+def test_upload_session_rejects_keys_outside_raw_excel(file_processor, context):
+    """Verifica que no se pueda operar sobre claves fuera de raw/excel/."""
+    response = file_processor.handler({
+        "resource": "/upload/session/parts",
+        "httpMethod": "POST",
+        "body": json.dumps({"s3_key": "curated/x.xlsx", "upload_id": "abc", "part_numbers": [1]})
+    }, context)
+
+    assert response["statusCode"] == 400
+
+
+def test_base64_upload_streams_large_files_in_parts(aws, bucket, file_processor, context):
+    """Verifica que la carga Base64 se decodifique en streaming hacia una carga multiparte."""
+    content = os.urandom(file_processor.STREAM_PART_SIZE + 1234)
+    event = {"body": json.dumps({"file": base64.b64encode(content).decode(), "filename": "grande.xlsx"})}
+
+    response = file_processor.handler(event, context)
+
+    assert response["statusCode"] == 200
+    s3_key = json.loads(response["body"])["s3_key"]
+    assert s3_key.startswith("raw/excel/")
+    stored = aws.client("s3").get_object(Bucket=bucket, Key=s3_key)
+    assert stored["Body"].read() == content
+    assert stored["ContentType"] == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    # Un duplicado se detecta en la misma pasada y sus partes ya subidas se descartan
+    duplicate = json.loads(file_processor.handler(event, context)["body"])
+    assert duplicate["duplicate"] is True
+    assert duplicate["s3_key"] == s3_key
+    assert list_workbooks(aws, bucket) == [s3_key]
+    assert not aws.client("s3").list_multipart_uploads(Bucket=bucket).get("Uploads")
+
+
+def test_decoded_chunks_match_b64decode_with_json_escapes(file_processor):
+    """Verifica la decodificación por bloques, incluidos escapes JSON partidos entre bloques."""
+    content = os.urandom(10000)
+    encoded = base64.b64encode(content).decode().replace("/", "\\/")
+    body = json.dumps({"filename": "a.xlsx"})[:-1] + ', "file": "' + encoded + '"}'
+
+    metadata, start, end = file_processor.split_file_field(body)
+    decoded = b"".join(file_processor.iter_decoded_chunks(body, start, end, chunk_chars=7))
+
+    assert metadata == {"filename": "a.xlsx", "file": ""}
+    assert decoded == content
+
+
+def test_base64_upload_rejects_invalid_base64(file_processor, context):
+    """Verifica que un Base64 inválido devuelva 400."""
+    response = file_processor.handler({"body": json.dumps({"file": "abc", "filename": "a.xlsx"})}, context)
+
+    assert response["statusCode"] == 400
+
+
+def test_duplicate_base64_upload_points_to_existing_object(aws, bucket, file_processor, context):
+    """Verifica que un contenido ya cargado no se vuelva a escribir en S3."""
+    event = {"body": json.dumps({"file": base64.b64encode(b"mismo contenido").decode(), "filename": "a.xlsx"})}
+
+    first = json.loads(file_processor.handler(event, context)["body"])
+    second = json.loads(file_processor.handler(event, context)["body"])
+
+    assert second["duplicate"] is True
+    assert second["s3_key"] == first["s3_key"]
+    assert len(list_workbooks(aws, bucket)) == 1
+
+
+def test_upload_url_short_circuits_known_hash(aws, bucket, file_processor, context):
+    """Verifica que /upload/url no emita URL si el cliente envía un SHA-256 ya indexado, sin revelar la clave."""
+    key = "raw/excel/2024-01-01/20240101T000000Z_abc_datos.xlsx"
+    aws.client("s3").put_object(Bucket=bucket, Key=key, Body=b"contenido", Metadata={"request-id": "abc"})
+    file_processor.handler({
+        "source": "aws.s3",
+        "detail": {"bucket": {"name": bucket}, "object": {"key": key}}
+    }, context)
+
+    response = file_processor.handler({
+        "resource": "/upload/url",
+        "body": json.dumps({"filename": "otra.xlsx", "sha256": hashlib.sha256(b"contenido").hexdigest()})
+    }, context)
+    body = json.loads(response["body"])
+
+    assert body["duplicate"] is True
+    assert body["original_request_id"] == "abc"
+    assert "s3_key" not in body
+    assert "upload_url" not in body
+
+
+def test_batch_upload_returns_per_file_results(aws, bucket, file_processor, context):
+    """Verifica que /upload/batch escriba varios archivos y devuelva el resultado de cada uno."""
+    files = [
+        {"file": base64.b64encode(f"archivo {i}".encode()).decode(), "filename": f"campaña_{i}.xlsx"}
+        for i in range(5)
+    ]
+    files.append({"file": "abc", "filename": "corrupto.xlsx"})
+
+    response = file_processor.handler({"resource": "/upload/batch", "body": json.dumps({"files": files})}, context)
+    body = json.loads(response["body"])
+
+    assert response["statusCode"] == 200
+    assert (body["total"], body["succeeded"], body["failed"]) == (6, 5, 1)
+    assert [r["index"] for r in body["results"]] == list(range(6))
+    assert body["results"][-1]["status"] == 400
+    assert len(list_workbooks(aws, bucket)) == 5
+
+
+def test_idempotent_upload_replays_cached_response_without_decoding(aws, bucket, file_processor, context, monkeypatch):
+    """Verifica que un reintento con la misma Idempotency-Key devuelva la respuesta guardada sin volver a subir."""
+    event = {
+        "headers": {"idempotency-key": "carga-123"},
+        "body": json.dumps({"file": base64.b64encode(b"contenido reintentado").decode(), "filename": "a.xlsx"})
+    }
+    first = file_processor.handler(event, context)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("El reintento no debe decodificar el archivo")
+
+    monkeypatch.setattr(file_processor, "iter_decoded_chunks", fail)
+    second = file_processor.handler(event, context)
+
+    assert second["body"] == first["body"]
+    assert second["headers"]["Idempotent-Replayed"] == "true"
+    assert len(list_workbooks(aws, bucket)) == 1
+    assert file_processor.handler({**event, "headers": {"Idempotency-Key": "mal clave"}}, context)["statusCode"] == 400
@@ -1,9 +1,11 @@
+import json
 import pytest
 import aws_cdk as cdk
 from aws_cdk.assertions import Template, Match
 
 from medical_analytics.storage_stack import StorageStack
 from medical_analytics.ingestion_stack import IngestionStack
+from medical_analytics.lambda_layer_stack import LambdaLayerStack
 
 def test_api_ingestion_lambda_created():
     """Verifica que se cree la función Lambda para ingesta desde API."""
@@ -148,3 +150,178 @@ def test_sns_topic_created():
         "DisplayName": "Errores de Ingesta de Datos Médicos",
         "TopicName": "medical-analytics-errors"
     })
+
+def _create_ingestion_template():
+    """Sintetiza el stack de ingesta con todas sus dependencias."""
+    app = cdk.App()
+    layer_stack = LambdaLayerStack(app, "TestLayers")
+    storage_stack = StorageStack(app, "TestStorage")
+    ingestion_stack = IngestionStack(
+        app,
+        "TestIngestion",
+        storage_bucket=storage_stack.bucket,
+        storage_key_arn=storage_stack.encryption_key_arn,
+        ingestion_role=storage_stack.ingestion_role,
+        error_topic=storage_stack.create_error_topic("TestErrorTopic"),
+        pandas_layer=layer_stack.pandas_layer,
+        common_layer=layer_stack.common_layer,
+        runtime_layer=layer_stack.runtime_layer
+    )
+    return Template.from_stack(ingestion_stack)
+
+def test_direct_upload_resources_created():
+    """Verifica los recursos /upload/url, /upload/batch y /upload/session y la regla ObjectCreated para cargas directas a S3."""
+    template = _create_ingestion_template()
+    
+    template.has_resource_properties("AWS::ApiGateway::Resource", {
+        "PathPart": "url"
+    })
+    template.has_resource_properties("AWS::ApiGateway::Resource", {
+        "PathPart": "session"
+    })
+    template.has_resource_properties("AWS::ApiGateway::Resource", {
+        "PathPart": "batch"
+    })
+    template.has_resource_properties("AWS::Events::Rule", {
+        "EventPattern": {
+            "source": ["aws.s3"],
+            "detail-type": ["Object Created"],
+            "detail": Match.object_like({
+                "object": {"key": [{"prefix": "raw/excel/"}]}
+            })
+        }
+    })
+
+def test_audit_delivery_stream_created():
+    """Verifica el delivery stream de Firehose para la auditoría con búfer comprimido."""
+    template = _create_ingestion_template()
+    
+    template.has_resource_properties("AWS::KinesisFirehose::DeliveryStream", {
+        "DeliveryStreamName": "medical-analytics-audit",
+        "ExtendedS3DestinationConfiguration": Match.object_like({
+            "CompressionFormat": "GZIP",
+            "BufferingHints": {"IntervalInSeconds": 300, "SizeInMBs": 5}
+        })
+    })
+    # El rol de entrega escribe tanto la auditoría como los registros fallidos (error_output_prefix)
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyDocument": {
+            "Statement": Match.array_with([
+                Match.object_like({
+                    "Action": Match.array_with(["s3:PutObject"]),
+                    "Resource": Match.array_with([
+                        {"Fn::Join": ["", [Match.any_value(), "/audit/*"]]},
+                        {"Fn::Join": ["", [Match.any_value(), "/audit_errors/*"]]}
+                    ])
+                })
+            ])
+        }
+    })
+
+def test_excel_converter_writes_cleaned_parquet():
+    """Verifica la Lambda de conversión a Parquet y su disparo desde la regla de raw/excel/."""
+    template = _create_ingestion_template()
+    
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "medical-analytics-excel-converter",
+        "Runtime": "python3.9",
+        "Environment": {"Variables": Match.object_like({"PARQUET_COMPRESSION": "zstd"})}
+    })
+    template.has_resource_properties("AWS::Events::Rule", {
+        "EventPattern": Match.object_like({"detail-type": ["Object Created"]}),
+        "Targets": Match.array_with([Match.object_like({"Id": "Target1"})])
+    })
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyDocument": {
+            "Statement": Match.array_with([
+                Match.object_like({
+                    "Action": "s3:PutObject",
+                    "Resource": {"Fn::Join": ["", [Match.any_value(), "/cleaned/*"]]}
+                })
+            ])
+        }
+    })
+
+def test_file_processor_skips_pandas_layer():
+    """Verifica que file_processor solo cargue las capas que importa (arranque en frío)."""
+    template = _create_ingestion_template()
+    
+    functions = template.find_resources("AWS::Lambda::Function", {
+        "Properties": {"FunctionName": "medical-analytics-file-processor"}
+    })
+    (file_processor,) = functions.values()
+    assert len(file_processor["Properties"]["Layers"]) == 2
+
+def test_error_digest_table_created():
+    """Verifica la tabla de contadores con TTL que agrega las notificaciones de error."""
+    template = _create_ingestion_template()
+    
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TableName": "medical-analytics-error-digests",
+        "TimeToLiveSpecification": {"AttributeName": "expires_at", "Enabled": True}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "medical-analytics-api-ingestion",
+        "Environment": {"Variables": Match.object_like({"ALERT_WINDOW_SECONDS": "300"})}
+    })
+
+
+def test_circuit_breaker_table_created():
+    """Verifica la tabla de estado del circuit breaker y su configuración en la Lambda de ingesta API."""
+    template = _create_ingestion_template()
+    
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TableName": "medical-analytics-circuit-breakers",
+        "KeySchema": [{"AttributeName": "circuit_name", "KeyType": "HASH"}]
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "medical-analytics-api-ingestion",
+        "Environment": {"Variables": Match.object_like({"CIRCUIT_FAILURE_THRESHOLD": "3"})}
+    })
+
+
+def test_api_backfill_state_machine_fans_out_shards():
+    """Verifica la máquina de estados de backfill: plan, Map con concurrencia acotada y merge en la Lambda de backfill."""
+    template = _create_ingestion_template()
+    
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "medical-analytics-api-backfill",
+        "Handler": "index.backfill_handler",
+        "Timeout": 900,
+        # La prueba half_open del circuito compartido dura más que el timeout de cada función
+        "Environment": {"Variables": Match.object_like({
+            "API_BACKFILL_UNTIL_PARAM": "updated_until",
+            "CIRCUIT_PROBE_SECONDS": "960"
+        })}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "medical-analytics-api-ingestion",
+        "Environment": {"Variables": Match.object_like({"CIRCUIT_PROBE_SECONDS": "120"})}
+    })
+    template.has_resource_properties("AWS::StepFunctions::StateMachine", {
+        "StateMachineName": "medical-analytics-api-backfill"
+    })
+    
+    [state_machine] = template.find_resources("AWS::StepFunctions::StateMachine").values()
+    definition = json.loads("".join(
+        part for part in state_machine["Properties"]["DefinitionString"]["Fn::Join"][1] if isinstance(part, str)
+    ))
+    states = definition["States"]
+    assert definition["StartAt"] == "PlanShards"
+    assert states["IngestShards"]["Type"] == "Map"
+    assert states["IngestShards"]["MaxConcurrency"] == 4
+    assert states["IngestShards"]["ItemsPath"] == "$.shards"
+    # Cada iteración recibe el objeto del shard completo, no una cadena
+    assert states["IngestShards"]["ItemSelector"] == {
+        "backfill_id.$": "$.backfill_id",
+        "shard.$": "$$.Map.Item.Value"
+    }
+    shard_states = states["IngestShards"]["ItemProcessor"]["States"]
+    assert shard_states["IngestShard"]["Parameters"] == {
+        "action": "ingest",
+        "backfill_id.$": "$.backfill_id",
+        "shard.$": "$.shard"
+    }
+    assert [retry["ErrorEquals"] for retry in shard_states["IngestShard"]["Retry"]][-1] == ["States.ALL"]
+    assert shard_states["IngestShard"]["Catch"][0]["Next"] == "ShardFailed"
+    assert states["IngestShards"]["Next"] == "MergeManifests"
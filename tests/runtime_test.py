@@ -0,0 +1,267 @@
+import json
+import threading
+
+import pytest
+
+from medical_analytics_runtime import clients, storage
+from medical_analytics_runtime.alerts import DynamoDBStore, ErrorAggregator, LocalStore, message_template
+from medical_analytics_runtime.idempotency import DynamoDBIdempotencyStore, Idempotency
+from medical_analytics_runtime.audit import AuditLogger, FirehoseSink, LocalSink
+from medical_analytics_runtime.background import BackgroundIO
+from medical_analytics_runtime.ratelimit import RateLimiter
+from medical_analytics_runtime.resilience import CircuitBreaker, CircuitOpenError, DynamoDBCircuitStore
+
+
+class FlakyFirehose:
+    """Cliente Firehose que rechaza el primer registro en el primer intento."""
+
+    def __init__(self):
+        self.calls = []
+
+    def put_record_batch(self, DeliveryStreamName, Records):
+        self.calls.append([r["Data"] for r in Records])
+        if len(self.calls) == 1:
+            return {
+                "FailedPutCount": 1,
+                "RequestResponses": [{"ErrorCode": "ServiceUnavailableException"}] + [{}] * (len(Records) - 1)
+            }
+        return {"FailedPutCount": 0, "RequestResponses": [{}] * len(Records)}
+
+
+def test_audit_logger_delivers_in_background_and_retries_failed_records():
+    """Verifica que emit() no bloquee, flush() espere la entrega y solo se reintenten los rechazados."""
+    client = FlakyFirehose()
+    audit = AuditLogger(FirehoseSink("audit", client=client), source="test")
+
+    for i in range(3):
+        audit.emit("evento", numero=i)
+
+    assert audit.flush(timeout=5)
+    delivered = [line for call in client.calls for line in call]
+    assert len(delivered) == 4  # 3 registros + 1 reintento del rechazado
+    assert client.calls[1][0] == client.calls[0][0]  # El reintento sigue al lote rechazado
+    assert all(line.endswith(b"\n") for line in delivered)
+
+
+def test_audit_logger_from_env_only_uses_local_sink_when_asked(monkeypatch, tmp_path):
+    """Verifica que una Lambda sin AUDIT_STREAM_NAME falle al iniciar en lugar de auditar en /tmp."""
+    monkeypatch.delenv("AUDIT_SINK", raising=False)
+    monkeypatch.delenv("AUDIT_STREAM_NAME", raising=False)
+    monkeypatch.setenv("AUDIT_LOCAL_DIR", str(tmp_path))
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    assert isinstance(AuditLogger.from_env("test").sink, LocalSink)  # Desarrollo fuera de Lambda
+
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "medical-analytics-file-processor")
+    with pytest.raises(ValueError):
+        AuditLogger.from_env("test")
+
+    monkeypatch.setenv("AUDIT_SINK", "local")
+    assert isinstance(AuditLogger.from_env("test").sink, LocalSink)
+    monkeypatch.delenv("AUDIT_SINK")
+    monkeypatch.setenv("AUDIT_STREAM_NAME", "audit")
+    assert isinstance(AuditLogger.from_env("test").sink, FirehoseSink)
+
+
+@pytest.mark.parametrize("codec, extension", [("gzip", ".gz"), ("zstd", ".zst")])
+def test_storage_compresses_text_payloads_and_reads_them_back(aws, bucket, codec, extension):
+    """Verifica la compresión transparente de JSON: extensión, ContentEncoding y lectura descomprimida."""
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    s3 = aws.client("s3")
+    body = json.dumps([{"numdoc": str(i), "diagnostico": "I10 Hipertensión"} for i in range(500)])
+
+    key = storage.put_object(s3, bucket, "raw/api/datos.json", body, "application/json", codec=codec)
+
+    head = s3.head_object(Bucket=bucket, Key=key)
+    assert key == "raw/api/datos.json" + extension
+    assert head["ContentEncoding"] == codec
+    assert head["ContentLength"] * 5 < len(body.encode())
+    assert head["Metadata"]["uncompressed-size"] == str(len(body.encode()))
+    assert storage.get_object(s3, bucket, key) == body.encode()
+
+
+def test_storage_leaves_binary_and_small_payloads_uncompressed(aws, bucket):
+    """Verifica que Excel y cuerpos pequeños se escriban sin cambios en la clave ni en el contenido."""
+    s3 = aws.client("s3")
+
+    excel_key = storage.put_object(s3, bucket, "raw/excel/a.xlsx", b"PK" * 2000, "application/vnd.ms-excel")
+    small_key = storage.put_object(s3, bucket, "raw/api/meta.json", '{"ok": true}', "application/json")
+
+    assert (excel_key, small_key) == ("raw/excel/a.xlsx", "raw/api/meta.json")
+    assert "ContentEncoding" not in s3.head_object(Bucket=bucket, Key=excel_key)
+    assert storage.get_object(s3, bucket, small_key) == b'{"ok": true}'
+
+
+def test_streaming_writer_uploads_parts_in_background_in_order(aws, bucket):
+    """Verifica que open_writer comprima en streaming y ensamble en orden las partes subidas en segundo plano."""
+    s3 = aws.client("s3")
+    chunks = [bytes([i]) * (3 * 1024 * 1024) for i in range(5)]
+
+    with storage.open_writer(s3, bucket, "raw/api/datos.bin", "application/octet-stream", max_in_flight=2) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    with storage.open_writer(s3, bucket, "raw/api/datos.ndjson", "application/x-ndjson", codec="gzip") as ndjson:
+        ndjson.write(b'{"id": 1}\n' * 1000)
+
+    assert writer.key == "raw/api/datos.bin"
+    assert s3.get_object(Bucket=bucket, Key=writer.key)["Body"].read() == b"".join(chunks)
+    assert ndjson.key == "raw/api/datos.ndjson.gz"
+    assert storage.get_object(s3, bucket, ndjson.key) == b'{"id": 1}\n' * 1000
+
+
+def test_lazy_client_is_built_on_first_use_and_shared(aws, bucket):
+    """Verifica que el proxy no cree el cliente al importarse y que todos los usos compartan uno solo."""
+    s3 = clients.lazy_client("s3")
+    assert "s3" not in clients._clients
+
+    s3.put_object(Bucket=bucket, Key="raw/api/x.json", Body=b"{}")
+
+    assert clients._clients["s3"] is clients.get_client("s3")
+    assert s3.exceptions.NoSuchKey is clients.get_client("s3").exceptions.NoSuchKey
+
+
+def test_clients_share_tuned_config(aws, monkeypatch):
+    """Verifica el pool, los reintentos adaptativos, el keepalive y los timeouts de los clientes compartidos."""
+    monkeypatch.setenv("CLIENT_MAX_POOL_CONNECTIONS", "16")
+    clients.reset_clients()
+
+    config = clients.get_client("sns").meta.config
+
+    assert config.max_pool_connections == 16
+    assert config.retries["mode"] == "adaptive"
+    assert config.tcp_keepalive is True
+    assert (config.connect_timeout, config.read_timeout) == (clients.DEFAULT_CONNECT_TIMEOUT, clients.DEFAULT_READ_TIMEOUT)
+
+
+def test_error_aggregator_publishes_one_digest_per_fingerprint_and_window():
+    """Verifica que una ráfaga de errores repetidos en dos contenedores genere un solo resumen por huella."""
+    published = []
+    store = LocalStore()
+    containers = [
+        ErrorAggregator(store, "arn:topic", "file_processor", publisher=lambda *m: published.append(m))
+        for _ in range(2)
+    ]
+    trace = 'Traceback:\n  File "/var/task/index.py", line 90, in store_encoded_file\nKeyError'
+
+    for i in range(50):
+        containers[i % 2].report("KeyError", f"Fila {i} sin 'numdoc' en upload-{i}.xlsx", stack_trace=trace, request_id=str(i))
+    containers[0].report("TimeoutError", "Read timed out after 30 s")
+    assert all(aggregator.flush(timeout=5) for aggregator in containers)
+
+    subjects = sorted(subject for subject, _ in published)
+    assert subjects == ["Error file_processor: KeyError en index.py:store_encoded_file", "Error file_processor: TimeoutError en file_processor"]
+    assert sum(store._counts.values()) == 51
+    digest = json.loads(next(message for subject, message in published if "KeyError" in subject))
+    assert digest["message_template"] == "Fila <n> sin <str> en upload-<n>.xlsx"
+    assert "stack_trace" in digest
+
+
+def test_error_digest_store_counts_atomically_in_dynamodb(aws):
+    """Verifica el contador compartido de DynamoDB usado entre contenedores."""
+    dynamodb = aws.client("dynamodb")
+    dynamodb.create_table(
+        TableName="digests",
+        KeySchema=[{"AttributeName": "digest_key", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "digest_key", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST"
+    )
+    store = DynamoDBStore("digests", client=dynamodb)
+
+    assert store.increment("abc#1", 3, 100) == 3
+    assert store.increment("abc#1", 2, 200) == 5
+    assert (store.count("abc#1"), store.count("abc#0")) == (5, 0)
+    assert message_template("Timeout en 3f2a9c1e-0d4b-4c55-9a7e-1b2c3d4e5f60") == "Timeout en <uuid>"
+
+
+def test_idempotency_store_claims_with_conditional_writes(aws):
+    """Verifica el reclamo condicional, la respuesta en curso (409) y la liberación tras un error del servidor."""
+    dynamodb = aws.client("dynamodb")
+    dynamodb.create_table(
+        TableName="idempotency",
+        KeySchema=[{"AttributeName": "idempotency_key", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "idempotency_key", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST"
+    )
+    store = DynamoDBIdempotencyStore("idempotency", client=dynamodb)
+    runner = Idempotency(store)
+    conflict = lambda: {"statusCode": 409}
+
+    assert store.claim("upload:a", 1000, 60, 3600) is None
+    assert store.claim("upload:a", 1030, 60, 3600) == {"status": "IN_PROGRESS"}
+    assert store.claim("upload:a", 1061, 60, 3600) is None  # El bloqueo abandonado vence
+    store.release("upload:a")
+
+    assert runner.run("upload:b", lambda: {"statusCode": 500}, conflict) == {"statusCode": 500}
+    assert runner.run("upload:b", lambda: {"statusCode": 200, "body": "ok"}, conflict)["body"] == "ok"
+    replay = runner.run("upload:b", lambda: {"statusCode": 200, "body": "otra vez"}, conflict)
+    assert (replay["body"], replay["headers"]) == ("ok", {"Idempotent-Replayed": "true"})
+
+
+def test_rate_limiter_spaces_requests_after_burst():
+    """Verifica que, agotada la ráfaga, las solicitudes salgan a la tasa configurada."""
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+
+    limiter = RateLimiter(rate=4, burst=2, clock=lambda: now[0], sleep=sleep)
+
+    assert [limiter.acquire() for _ in range(4)] == [0.0, 0.0, 0.25, 0.5]
+    now[0] = 2.0  # El bucket se recarga hasta la ráfaga
+    assert limiter.acquire() == 0.0
+    assert waits == [0.25, 0.5]
+
+
+def test_circuit_breaker_state_persists_across_invocations(aws):
+    """Verifica closed -> open -> half_open (una sola prueba) -> closed con el estado en DynamoDB."""
+    aws.client("dynamodb").create_table(
+        TableName="circuits",
+        KeySchema=[{"AttributeName": "circuit_name", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "circuit_name", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    now = [1000.0]
+
+    def invocation():
+        # Cada invocación construye su breaker: solo el store es compartido
+        return CircuitBreaker(DynamoDBCircuitStore("circuits"), "api:test", failure_threshold=2,
+                              reset_seconds=60, clock=lambda: now[0])
+
+    for _ in range(2):
+        breaker = invocation()
+        breaker.before_call()
+        breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        invocation().before_call()
+
+    now[0] += 61
+    probe = invocation()
+    probe.before_call()
+    # Mientras una invocación prueba la API, las demás siguen fallando rápido
+    with pytest.raises(CircuitOpenError):
+        invocation().before_call()
+
+    probe.record_success()
+    invocation().before_call()
+    assert DynamoDBCircuitStore("circuits").load("api:test")["state"] == "closed"
+
+
+def test_background_group_overlaps_writes_and_reraises_first_error():
+    """Verifica que las tareas de un grupo corran a la vez y que el grupo las espere y relance su error."""
+    io = BackgroundIO(max_workers=3)
+    barrier = threading.Barrier(3, timeout=2)
+    with io.group() as tasks:
+        futures = [tasks.submit(barrier.wait) for _ in range(3)]  # Solo termina si las tres corren a la vez
+    assert all(future.done() for future in futures)
+
+    def fail():
+        raise ValueError("S3 no disponible")
+
+    finished = []
+    with pytest.raises(ValueError, match="S3 no disponible"):
+        with io.group() as tasks:
+            tasks.submit(fail)
+            tasks.submit(lambda: finished.append(True))
+    assert finished == [True]